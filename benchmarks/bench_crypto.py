@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+HMAC-CTR 密钥流 + XOR 微基准
+
+对比旧实现（bytes 反复拼接 + 逐字节生成器异或）与当前 _crypto 实现，
+并校验两者输出逐字节一致。
+
+用法: python benchmarks/bench_crypto.py
+"""
+
+import hashlib
+import hmac
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evm._crypto import hmac_ctr_keystream, xor_bytes  # noqa: E402
+
+SIZES = [1024, 64 * 1024, 1024 * 1024]
+
+
+def legacy_keystream(key: bytes, iv: bytes, length: int) -> bytes:
+    stream = b''
+    counter = 0
+    while len(stream) < length:
+        block = hmac.new(
+            key, iv + struct.pack('>I', counter), hashlib.sha256
+        ).digest()
+        stream += block
+        counter += 1
+    return stream[:length]
+
+
+def legacy_encrypt(key: bytes, iv: bytes, data: bytes) -> bytes:
+    keystream = legacy_keystream(key, iv, len(data))
+    return bytes(a ^ b for a, b in zip(data, keystream))
+
+
+def current_encrypt(key: bytes, iv: bytes, data: bytes) -> bytes:
+    return xor_bytes(data, hmac_ctr_keystream(key, iv, len(data)))
+
+
+def _time(fn, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    key, iv = os.urandom(32), os.urandom(16)
+    print(f"{'size':>10}  {'legacy':>10}  {'current':>10}  {'speedup':>8}")
+    for size in SIZES:
+        data = os.urandom(size)
+        if legacy_encrypt(key, iv, data) != current_encrypt(key, iv, data):
+            print(f"MISMATCH at {size} bytes", file=sys.stderr)
+            return 1
+        old = _time(legacy_encrypt, key, iv, data)
+        new = _time(current_encrypt, key, iv, data)
+        print(
+            f"{size:>10}  {old * 1000:>8.2f}ms  {new * 1000:>8.2f}ms  "
+            f"{old / new:>7.1f}x"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+分组查询微基准（100k 变量 / 500 个分组）
+
+对比旧实现（每次查询线性扫描全部 key 做 startswith / split）与
+ChangeTrackingDict 的分组索引，并校验两者结果一致。
+
+用法: python benchmarks/bench_groups.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evm._storage import ChangeTrackingDict  # noqa: E402
+
+N_KEYS = 100_000
+N_GROUPS = 500
+
+
+def build() -> ChangeTrackingDict:
+    data = {}
+    for i in range(N_KEYS):
+        if i % 10 == 0:
+            data[f'PLAIN_{i}'] = str(i)
+        else:
+            data[f'g{i % N_GROUPS}:VAR_{i}'] = str(i)
+    return ChangeTrackingDict(data)
+
+
+def legacy_group_keys(env: dict, group: str) -> list[str]:
+    prefix = f"{group}:"
+    return [k for k in env if k.startswith(prefix)]
+
+
+def legacy_group_counts(env: dict) -> dict[str, int]:
+    groups: dict[str, int] = {}
+    for key in env:
+        if ':' in key:
+            group = key.split(':', 1)[0]
+            groups[group] = groups.get(group, 0) + 1
+    return groups
+
+
+def _time(fn, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    env = build()
+    build_time = _time(lambda: ChangeTrackingDict(env).group_counts()) - _time(
+        lambda: ChangeTrackingDict(env)
+    )
+
+    if (legacy_group_keys(env, 'g7') != env.group_keys('g7')
+            or legacy_group_counts(env) != env.group_counts()):
+        print('MISMATCH', file=sys.stderr)
+        return 1
+
+    rows = [
+        ('list group', lambda: legacy_group_keys(env, 'g7'),
+         lambda: env.group_keys('g7')),
+        ('count groups', lambda: legacy_group_counts(env), env.group_counts),
+    ]
+
+    def delete_legacy():
+        copy = ChangeTrackingDict(env)
+        start = time.perf_counter()
+        for key in legacy_group_keys(copy, 'g7'):
+            del copy[key]
+        return time.perf_counter() - start
+
+    def delete_indexed():
+        copy = ChangeTrackingDict(env)
+        copy.group_counts()  # 构建索引（不计时）
+        start = time.perf_counter()
+        for key in copy.group_keys('g7'):
+            del copy[key]
+        return time.perf_counter() - start
+
+    print(f"{N_KEYS} keys / {N_GROUPS} groups "
+          f"(index build: {build_time * 1000:.1f}ms, on first group query)")
+    print(f"{'operation':>14}  {'scan':>10}  {'index':>10}  {'speedup':>8}")
+    for name, old_fn, new_fn in rows:
+        old, new = _time(old_fn), _time(new_fn)
+        print(f"{name:>14}  {old * 1000:>8.2f}ms  {new * 1000:>8.3f}ms  "
+              f"{old / new:>7.0f}x")
+    old = min(delete_legacy() for _ in range(5))
+    new = min(delete_indexed() for _ in range(5))
+    print(f"{'delete group':>14}  {old * 1000:>8.2f}ms  {new * 1000:>8.3f}ms  "
+          f"{old / new:>7.0f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
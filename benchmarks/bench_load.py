@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+.env 导入基准（1M 行）
+
+每种方式在独立子进程中把同一个 .env 文件导入空存储（--group bench），
+报告耗时和峰值 RSS（ru_maxrss）：
+- legacy: 旧实现 —— 整个文件解析为 dict，_apply_group_prefix 再复制一份，
+  然后 update 到存储
+- stream: load() —— iter_env_file 逐行解析，直接写入存储
+
+旧实现不识别 `export KEY=` 前缀，会把这些行当作无效 key 跳过，因此变量数略少。
+
+用法: python benchmarks/bench_load.py [行数]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+LEGACY = '''
+from evm._io import _parse_env_value, _validate_key_name
+loaded = {}
+with open(src, encoding='utf-8') as f:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#') and '=' in line:
+            key, raw = line.split('=', 1)
+            key = key.strip()
+            if _validate_key_name(key):
+                loaded[key] = _parse_env_value(raw)
+loaded = mgr._apply_group_prefix(loaded, 'bench')
+mgr._env_vars.update(loaded)
+mgr._save_env_vars()
+'''
+
+STREAM = '''
+mgr.load(src, format_type='env', group='bench')
+'''
+
+RUNNER = '''
+import json, resource, sys, time
+from evm.manager import EnvironmentManager
+src, store = sys.argv[1], sys.argv[2]
+mgr = EnvironmentManager(store)
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'base_kb': base, 'peak_kb': peak,
+                  'count': len(mgr._env_vars)}}))
+'''
+
+
+def write_env(path: Path, lines: int) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            if i % 1000 == 0:
+                f.write(f'# section {i // 1000}\n')
+            elif i % 97 == 0:
+                f.write(f'export EXPORTED_{i}="quoted value {i}"\n')
+            else:
+                f.write(f'VAR_{i}=value-{i}-{"x" * (i % 24)}\n')
+
+
+def run(kind: str, body: str, src: Path, tmp: Path) -> dict:
+    store = tmp / f'{kind}.json'
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), EVM_NO_AUTO_INSTALL='1')
+    proc = subprocess.run(
+        [sys.executable, '-c', RUNNER.format(body=body), str(src), str(store)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(proc.stdout)
+
+
+def main() -> None:
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        src = tmp / 'big.env'
+        write_env(src, lines)
+        print(f"{lines} lines, {src.stat().st_size / 1e6:.1f} MB\n")
+        print(f"{'':<8}{'time':>9}{'peak RSS':>12}{'over base':>12}{'vars':>10}")
+        results = {}
+        for kind, body in (('legacy', LEGACY), ('stream', STREAM)):
+            r = results[kind] = run(kind, body, src, tmp)
+            print(f"{kind:<8}{r['seconds']:>8.2f}s"
+                  f"{r['peak_kb'] / 1024:>10.0f}MB"
+                  f"{(r['peak_kb'] - r['base_kb']) / 1024:>10.0f}MB"
+                  f"{r['count']:>10}")
+        comments = (lines + 999) // 1000
+        assert results['stream']['count'] == lines - comments
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+重复构造 EnvironmentManager / refresh() 微基准（20k 变量）
+
+长驻进程（web worker）每个请求新建一个管理器，或在请求前调用 refresh()：
+- parse:   关闭进程级缓存（STORE_CACHE_SIZE = 0），每次构造都解析 env.json
+- cached:  签名未变时复用已解析的数据，只做 stat + 复制
+- refresh: 已有管理器调用 refresh()，存储未变化时只做 stat
+
+用法: python benchmarks/bench_refresh.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evm import _storage  # noqa: E402
+from evm.manager import EnvironmentManager  # noqa: E402
+
+N_KEYS = 20_000
+ROUNDS = 200
+
+
+def _time(fn, rounds: int = ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        env_file = Path(tmp) / 'env.json'
+        env_file.write_text(json.dumps({
+            f'VAR_{i}': f'value-{i}-' + 'x' * (i % 40) for i in range(N_KEYS)
+        }))
+        # 刚写入的文件不进缓存（见 STORE_CACHE_RACY_NS），把 mtime 回拨
+        old = time.time_ns() - 10 * _storage.STORE_CACHE_RACY_NS
+        os.utime(env_file, ns=(old, old))
+        path = str(env_file)
+        size_mb = env_file.stat().st_size / 1e6
+
+        size = _storage.STORE_CACHE_SIZE
+        _storage.STORE_CACHE_SIZE = 0
+        parse = _time(lambda: EnvironmentManager(path))
+        _storage.STORE_CACHE_SIZE = size
+
+        EnvironmentManager(path)
+        cached = _time(lambda: EnvironmentManager(path))
+        mgr = EnvironmentManager(path)
+        refresh = _time(mgr.refresh, ROUNDS * 10)
+        if EnvironmentManager(path).list_vars() != mgr.list_vars():
+            print('MISMATCH', file=sys.stderr)
+            return 1
+
+    print(f"{N_KEYS} keys, {size_mb:.1f} MB")
+    print(f"{'parse':>8}  {parse * 1000:>8.2f}ms / manager")
+    print(f"{'cached':>8}  {cached * 1000:>8.2f}ms / manager  ({parse / cached:.0f}x)")
+    print(f"{'refresh':>8}  {refresh * 1e6:>8.1f}us / call")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
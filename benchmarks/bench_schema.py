@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+validate_all 微基准（10k 变量 × 10k schema 定义）
+
+对比旧实现（每次调用重新读取 schema.json，逐值 re.match 原始正则串）
+与当前 CompiledSchema（按文件签名缓存，正则与格式校验函数预编译），
+并校验两者结果一致。
+
+用法: python benchmarks/bench_schema.py
+"""
+
+import json
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evm._schema import _SCHEMA_CACHE, FORMAT_PATTERNS, validate_ipv6  # noqa: E402
+from evm.manager import EnvironmentManager  # noqa: E402
+
+N = 10_000
+FORMATS = ['url', 'email', 'port', 'integer', 'boolean', 'path', 'ipv4', 'ipv6']
+VALUES = {
+    'url': 'https://example.com/x', 'email': 'a@example.com', 'port': '8080',
+    'integer': '-42', 'boolean': 'yes', 'path': '/usr/bin', 'ipv4': '10.0.0.1',
+    'ipv6': '::1',
+}
+
+
+def build(env_file: Path) -> tuple[dict, dict]:
+    schema: dict = {}
+    env_vars: dict = {}
+    for i in range(N):
+        key = f'VAR_{i}'
+        fmt = FORMATS[i % len(FORMATS)]
+        entry: dict = {'format': fmt, 'required': i % 3 == 0}
+        if i % 2:
+            # 每个 key 一个不同的正则，超出 re 模块内部缓存
+            entry['pattern'] = rf'^[\w:/.@~-]{{1,{64 + i}}}$'
+        schema[key] = entry
+        if i % 10:
+            env_vars[key] = VALUES[fmt] if i % 7 else 'bad value'
+    env_file.write_text(json.dumps(env_vars))
+    (env_file.parent / 'schema.json').write_text(json.dumps(schema))
+    return schema, env_vars
+
+
+def legacy_validate_all(schema_file: Path, env_vars: dict) -> dict:
+    with open(schema_file, encoding='utf-8') as f:
+        schema = json.load(f)
+    results = {}
+    for key, entry in schema.items():
+        if key not in env_vars:
+            required = entry.get('required', False)
+            results[key] = {
+                'valid': not required,
+                'errors': [f"Required variable '{key}' is not set"] if required else [],
+                'warnings': [] if required else ['Variable not set (not required)'],
+            }
+            continue
+        value = str(env_vars[key])
+        errors = []
+        fmt = entry.get('format')
+        if fmt == 'ipv6':
+            if not validate_ipv6(value):
+                errors.append(f"Value '{value}' does not match format 'ipv6'")
+        elif fmt in FORMAT_PATTERNS and not FORMAT_PATTERNS[fmt].match(value):
+            errors.append(f"Value '{value}' does not match format '{fmt}'")
+        pattern = entry.get('pattern')
+        if pattern and not re.match(pattern, value):
+            errors.append(f"Value '{value}' does not match pattern '{pattern}'")
+        results[key] = {'valid': not errors, 'errors': errors, 'warnings': []}
+    return results
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        env_file = Path(tmp) / 'env.json'
+        _, env_vars = build(env_file)
+        mgr = EnvironmentManager(str(env_file))
+        schema_file = mgr._get_schema_file()
+
+        if legacy_validate_all(schema_file, env_vars) != mgr.validate_all():
+            print('MISMATCH', file=sys.stderr)
+            return 1
+
+        old = _time(lambda: legacy_validate_all(schema_file, env_vars))
+
+        def cold():
+            _SCHEMA_CACHE.clear()
+            mgr.validate_all()
+
+        new_cold = _time(cold)
+        new_warm = _time(mgr.validate_all)
+
+    print(f"{N} keys / {N} schema entries")
+    print(f"  legacy          {old * 1000:>8.1f}ms")
+    print(f"  compiled (cold) {new_cold * 1000:>8.1f}ms  {old / new_cold:>5.1f}x")
+    print(f"  compiled (warm) {new_warm * 1000:>8.1f}ms  {old / new_warm:>5.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+值搜索微基准（search --value，子串模式）
+
+存储由 2000 个 PEM 证书风格的值（~2 KB base64）和 2000 个 JSON 配置组成。
+对比：
+- 全量扫描（casefold 全部值后逐条查找，阈值设为不启用索引）
+- 三元组索引：冷启动（新进程读取 env.trgm）与常驻进程（evm serve）中的重复查询
+
+并校验两种方式结果一致。
+
+用法: python benchmarks/bench_search.py
+"""
+
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evm.manager import EnvironmentManager  # noqa: E402
+
+N_CERTS = 2000
+N_CONFIGS = 2000
+QUERIES = ['mirror-17.internal', 'timeout_ms', 'no-such-value', '"region": "eu']
+
+
+def build(env_file: Path) -> None:
+    rng = random.Random(42)
+    data = {}
+    for i in range(N_CERTS):
+        body = base64.b64encode(rng.randbytes(1500)).decode()
+        data[f'certs:CERT_{i}'] = (
+            '-----BEGIN CERTIFICATE-----\n' + body + '\n-----END CERTIFICATE-----'
+        )
+    for i in range(N_CONFIGS):
+        data[f'configs:SERVICE_{i}'] = json.dumps({
+            'name': f'service-{i}',
+            'region': rng.choice(['us-east', 'eu-west', 'ap-south']),
+            'upstream': f'https://mirror-{i % 50}.internal:{8000 + i}',
+            'retries': rng.randint(1, 9),
+            'timeout_ms': rng.randint(100, 9000),
+        })
+    env_file.write_text(json.dumps(data, indent=2))
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        env_file = Path(tmp) / 'env.json'
+        build(env_file)
+        print(f"store: {env_file.stat().st_size / 1e6:.1f} MB, "
+              f"{N_CERTS + N_CONFIGS} variables")
+
+        def fresh_search(query: str) -> dict:
+            return EnvironmentManager(str(env_file)).search(query, search_value=True)
+
+        os.environ['EVM_TRIGRAM_MIN_BYTES'] = str(1 << 62)
+        scan = {q: timed(lambda q=q: fresh_search(q), 5) for q in QUERIES}
+
+        os.environ['EVM_TRIGRAM_MIN_BYTES'] = '0'
+        build_time, _ = timed(lambda: fresh_search(QUERIES[0]), 1)
+        index_file = env_file.with_suffix('.trgm')
+        print(f"index build + write: {build_time * 1000:.0f} ms "
+              f"({index_file.stat().st_size / 1e6:.1f} MB)\n")
+
+        resident = EnvironmentManager(str(env_file))
+        resident.search(QUERIES[0], search_value=True)
+
+        print(f"{'query':<22}{'scan':>10}{'cold index':>13}{'resident':>12}")
+        for q in QUERIES:
+            t_scan, expected = scan[q]
+            t_cold, cold = timed(lambda q=q: fresh_search(q), 5)
+            t_warm, warm = timed(
+                lambda q=q: resident.search(q, search_value=True), 50
+            )
+            assert cold == expected and warm == expected, q
+            print(f"{q!r:<22}{t_scan * 1000:>8.1f}ms{t_cold * 1000:>11.1f}ms"
+                  f"{t_warm * 1000:>10.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
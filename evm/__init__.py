@@ -24,9 +24,20 @@ from .exceptions import (
     SchemaError,
     StorageError,
     StoragePermissionError,
+    TemplateCycleError,
     ValidationError,
 )
-from .manager import EnvironmentManager
+
+
+def __getattr__(name: str):
+    # 延迟导入：`import evm` / `evm.cli` 不必加载 manager 及其依赖
+    if name == 'EnvironmentManager':
+        from .manager import EnvironmentManager
+
+        globals()['EnvironmentManager'] = EnvironmentManager
+        return EnvironmentManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     '__version__',
@@ -51,5 +62,6 @@ __all__ = [
     'DecryptionError',
     'ValidationError',
     'SchemaError',
+    'TemplateCycleError',
     'OperationCancelledError',
 ]
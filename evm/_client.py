@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+EVM 守护进程客户端
+
+EVM_DAEMON=1 时由 cli.main 调用：把命令行原样发给 `evm serve`，
+输出守护进程返回的 stdout/stderr 并以其退出码结束。
+只依赖标准库的 json/os/socket，避免导入管理器等重模块。
+
+协议（每个连接一次往返，均为单行 JSON）:
+  请求: {"argv": [...], "cwd": "...", "env": {"SHELL": "..."}}
+  响应: {"code": N, "stdout": "...", "stderr": "..."}
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Optional
+
+# 可以交给守护进程执行的命令：不依赖客户端的 stdin/tty/子进程
+DAEMON_COMMANDS = frozenset({
+    'set', 'get', 'delete', 'list',
+    'groups', 'setg', 'getg', 'deleteg', 'listg', 'move-group',
+    'search', 'rename', 'copy',
+    'info', 'diff', 'expand', 'validate', 'history', 'schema',
+    'inject', 'export',
+})
+
+# 守护进程需要沿用的客户端环境变量
+FORWARDED_ENV = ('SHELL',)
+
+# 全局选项中带参数的那些
+_GLOBAL_OPTS_WITH_VALUE = ('--env-file',)
+
+CLIENT_TIMEOUT = 30.0
+
+
+def default_socket_path(env_file: Optional[str] = None) -> str:
+    """守护进程 socket 路径：$EVM_SOCKET，否则为 <env_file>.sock
+
+    env_file 先解析符号链接（与守护进程的 Path.resolve() 一致），
+    经符号链接（如链接过去的 ~/.evm）访问同一存储时得到同一个 socket。
+    """
+    override = os.environ.get('EVM_SOCKET')
+    if override:
+        return override
+    if env_file is None:
+        env_file = os.path.join(os.path.expanduser('~'), '.evm', 'env.json')
+    return os.path.realpath(env_file) + '.sock'
+
+
+def _split_argv(argv: list[str]) -> tuple[Optional[str], Optional[str]]:
+    """从命令行中找出 --env-file 与子命令名（不做完整解析）"""
+    env_file = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in _GLOBAL_OPTS_WITH_VALUE:
+            if i + 1 < len(argv):
+                env_file = argv[i + 1]
+            i += 2
+            continue
+        if arg.startswith('--env-file='):
+            env_file = arg.split('=', 1)[1]
+        elif not arg.startswith('-'):
+            return env_file, arg
+        i += 1
+    return env_file, None
+
+
+def _recv_line(sock: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks)
+
+
+def try_daemon(argv: list[str]) -> Optional[int]:
+    """尝试通过守护进程执行命令
+
+    Returns:
+        退出码；命令不适合转发或守护进程不可用时返回 None（由调用方本地执行）
+    """
+    env_file, command = _split_argv(argv)
+    if command not in DAEMON_COMMANDS or '-h' in argv or '--help' in argv:
+        return None
+
+    request = {
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ},
+    }
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CLIENT_TIMEOUT)
+        try:
+            sock.connect(default_socket_path(env_file))
+        except OSError:
+            return None  # 守护进程未运行：本地执行
+        # 已连接后不再回退，避免同一命令被执行两次
+        try:
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            response = json.loads(_recv_line(sock))
+            code = int(response['code'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            sys.stderr.write(f"Error: evm daemon did not answer: {e}\n")
+            return 1
+    finally:
+        sock.close()
+
+    if response.get('stdout'):
+        sys.stdout.write(response['stdout'])
+        sys.stdout.flush()
+    if response.get('stderr'):
+        sys.stderr.write(response['stderr'])
+        sys.stderr.flush()
+    return code
+
+
+__all__ = ['DAEMON_COMMANDS', 'default_socket_path', 'try_daemon']
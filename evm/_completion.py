@@ -4,10 +4,13 @@ EVM Shell 补全脚本生成
 
 支持 bash, zsh, fish。
 M3: 为 get/delete/edit/expand/validate/rename/copy 等命令
-提供动态变量名补全（通过 evm list --json --quiet 获取 key 列表）。
+提供动态变量名补全（读取 evm 提交时维护的 env.keys / env.groups 索引）。
 """
 
+import os
+from collections.abc import Callable, Iterable
 from pathlib import Path
+from typing import Optional
 
 
 def generate_bash_completion(commands: list) -> str:
@@ -35,11 +38,23 @@ _evm_completions() {{
     local global_opts="--help --version --verbose --env-file --json --quiet --dry-run --force"
     local key_cmds="{key_cmds}"
 
-    # 动态获取变量名列表
-    _evm_keys() {{
-        evm list --json --quiet 2>/dev/null | \\
-            python3 -c "import sys,json; d=json.load(sys.stdin); print(' '.join(d.get('data',{{}}).keys()))" 2>/dev/null
+    # 变量名/分组名补全：读取 evm 提交时维护的索引文件
+    # （env.json → env.keys / env.groups，每行一个），只用 shell 内建命令
+    _evm_index() {{
+        local store="$HOME/.evm/env.json" word i
+        for ((i = 1; i < COMP_CWORD; i++)); do
+            [[ "${{COMP_WORDS[i]}}" == --env-file ]] && store="${{COMP_WORDS[i+1]}}"
+        done
+        store="${{store/#\\~/$HOME}}"
+        [[ "${{store##*/}}" == ?*.* ]] && store="${{store%.*}}"
+        local -a words=()
+        [[ -r "$store.$1" ]] && mapfile -t words < "$store.$1"
+        for word in "${{words[@]}}" "${{@:2}}"; do
+            [[ "$word" == "$cur"* ]] && COMPREPLY+=("$word")
+        done
     }}
+    _evm_keys() {{ _evm_index keys "$@"; }}
+    _evm_groups() {{ _evm_index groups "$@"; }}
 
     case "${{prev}}" in
         evm)
@@ -59,15 +74,11 @@ _evm_completions() {{
             return 0
             ;;
         get|delete|edit|expand|validate|rename|copy)
-            COMPREPLY=( $(compgen -W "$(_evm_keys) --secret --help" -- "${{cur}}") )
+            _evm_keys --secret --help
             return 0
             ;;
         setg|getg|deleteg|listg)
-            # 分组名补全（从现有 key 中提取分组前缀）
-            local groups
-            groups=$(evm groups --json --quiet 2>/dev/null | \\
-                python3 -c "import sys,json; d=json.load(sys.stdin); print(' '.join(d.get('data',{{}}).get('groups',{{}}).keys()))" 2>/dev/null)
-            COMPREPLY=( $(compgen -W "${{groups}} --help" -- "${{cur}}") )
+            _evm_groups --help
             return 0
             ;;
         export)
@@ -82,12 +93,16 @@ _evm_completions() {{
             COMPREPLY=( $(compgen -W "bash zsh fish" -- "${{cur}}") )
             return 0
             ;;
+        secrets)
+            COMPREPLY=( $(compgen -W "migrate" -- "${{cur}}") )
+            return 0
+            ;;
     esac
 
     # 如果前一个词是需要 key 补全的命令，尝试补全变量名
     for kc in ${{key_cmds}}; do
         if [[ "${{COMP_WORDS[1]}}" == "$kc" ]]; then
-            COMPREPLY=( $(compgen -W "$(_evm_keys)" -- "${{cur}}") )
+            _evm_keys
             return 0
         fi
     done
@@ -99,27 +114,54 @@ complete -F _evm_completions evm
 
 
 _EVM_LOAD_POSIX_TEMPLATE = '''# evm-load: inject EVM variables into the current shell
-# Usage: evm-load [--env-file PATH] [--group NAME] [--include-secrets] [--prefix PREFIX]
+# Usage: evm-load [--env-file PATH] [--group NAME] [--include-secrets] [--prefix PREFIX] [--expand]
+# Without --include-secrets/--expand, sources the cache written by
+# `evm inject --cached` while its header matches the store's
+# inode:size:mtime (no Python start).
 evm-load() {
-    local evf=""
+    local evf="" group="" prefix="" cacheable=1
     local -a rest=()
     while (($#)); do
         case "$1" in
-            --env-file)    evf="$2"; shift 2 ;;
+            --env-file)    evf="$2"; shift 2 || shift ;;
             --env-file=*)  evf="${1#--env-file=}"; shift ;;
-            *)             rest+=("$1"); shift ;;
+            --group|-g)    group="$2"; rest+=("$1" "$2"); shift 2 || shift ;;
+            --prefix)      prefix="$2"; rest+=("$1" "$2"); shift 2 || shift ;;
+            *)             cacheable=""; rest+=("$1"); shift ;;
         esac
     done
+    local store="${evf:-$HOME/.evm/env.json}" wal
+    if [[ "${store##*/}" == ?*.* ]]; then wal="${store%.*}.wal"; else wal="$store.wal"; fi
+    # Escape group/prefix like inject_cache_path(): % / - -> %25 %2F %2D
+    local g="${group//\\%/%25}" p="${prefix//\\%/%25}"
+    g="${g//\\//%2F}"; g="${g//-/%2D}"
+    p="${p//\\//%2F}"; p="${p//-/%2D}"
+    local cache="$store.inject-__SHELL__-$g-$p"
+    if [[ -n "$cacheable" && -f "$cache" ]]; then
+        # Same format as inject_cache_header(): GNU stat, then BSD stat
+        local -a files=("$store")
+        [[ -e "$wal" ]] && files+=("$wal")
+        local sig line
+        sig="$(command stat --printf '%i:%s:%.9Y;' -- "${files[@]}" 2>/dev/null \\
+            || command stat -n -f '%i:%z:%.9Fm;' -- "${files[@]}" 2>/dev/null)"
+        IFS= read -r line < "$cache"
+        if [[ -n "$sig" && "$line" == "__HEADER__$sig" ]]; then
+            . "$cache"
+            return
+        fi
+    fi
     local -a pre=()
     [[ -n "$evf" ]] && pre=(--env-file "$evf")
-    eval "$(evm "${pre[@]}" inject --shell __SHELL__ "${rest[@]}")"
+    eval "$(evm "${pre[@]}" inject --shell __SHELL__ --cached "${rest[@]}")"
 }
 '''
 
 
 def _evm_load_posix(shell: str) -> str:
     """Return the evm-load shell function for a POSIX shell (bash/zsh)."""
-    return _EVM_LOAD_POSIX_TEMPLATE.replace('__SHELL__', shell)
+    return _EVM_LOAD_POSIX_TEMPLATE.replace('__SHELL__', shell).replace(
+        '__HEADER__', INJECT_CACHE_HEADER
+    )
 
 
 def generate_zsh_completion(commands: list) -> str:
@@ -137,20 +179,29 @@ _evm() {{
         {chr(10).join(f"        '{c}:{c} command'" for c in commands)}
     )
 
-    # 动态获取变量名列表
+    # 变量名/分组名补全：读取 evm 提交时维护的索引文件
+    # （env.json → env.keys / env.groups，每行一个），只用 shell 内建命令
+    _evm_index() {{
+        local store="${{opt_args[--env-file]:-$HOME/.evm/env.json}}" line
+        store="${{store/#\\~/$HOME}}"
+        [[ "${{store:t}}" == ?*.* ]] && store="${{store%.*}}"
+        reply=()
+        [[ -r "$store.$1" ]] || return
+        while IFS= read -r line; do
+            reply+=("$line")
+        done < "$store.$1"
+    }}
+
     _evm_keys() {{
-        local keys
-        keys=(${{(f)"$(evm list --json --quiet 2>/dev/null | \\
-            python3 -c "import sys,json; d=json.load(sys.stdin); print('\\n'.join(d.get('data',{{}}).keys()))" 2>/dev/null)"}})
-        _describe 'variable' keys
+        local -a reply
+        _evm_index keys
+        _describe 'variable' reply
     }}
 
-    # 动态获取分组名列表
     _evm_groups() {{
-        local groups
-        groups=(${{(f)"$(evm groups --json --quiet 2>/dev/null | \\
-            python3 -c "import sys,json; d=json.load(sys.stdin); print('\\n'.join(d.get('data',{{}}).get('groups',{{}}).keys()))" 2>/dev/null)"}})
-        _describe 'group' groups
+        local -a reply
+        _evm_index groups
+        _describe 'group' reply
     }}
 
     _arguments -C \\
@@ -233,14 +284,29 @@ def generate_fish_completion(commands: list) -> str:
 
     # Dynamic variable name completion helper
     lines.append('# Dynamic variable name completion')
+    lines.append('# Reads the env.keys / env.groups index evm keeps next to the store (builtins only)')
+    lines.append('function __evm_index')
+    lines.append('    set -l store ~/.evm/env.json')
+    lines.append('    set -l tokens (commandline -opc)')
+    lines.append('    set -l i (contains -i -- --env-file $tokens)')
+    lines.append('    and set -q tokens[(math $i + 1)]')
+    lines.append('    and set store $tokens[(math $i + 1)]')
+    lines.append("    set store (string replace -r '^~' $HOME -- $store)")
+    lines.append("    set store (string replace -r '([^/])\\.[^./]*$' '$1' -- $store)")
+    lines.append('    test -r "$store.$argv[1]"; or return')
+    lines.append('    while read -l line')
+    lines.append('        echo $line')
+    lines.append('    end < "$store.$argv[1]"')
+    lines.append('end')
+    lines.append('')
     lines.append('function __evm_keys')
-    lines.append('    evm list --json --quiet 2>/dev/null | python3 -c "import sys,json; d=json.load(sys.stdin); [print(k) for k in d.get(\'data\',{})]" 2>/dev/null')
+    lines.append('    __evm_index keys')
     lines.append('end')
     lines.append('')
 
     # Dynamic group name completion helper
     lines.append('function __evm_groups')
-    lines.append('    evm groups --json --quiet 2>/dev/null | python3 -c "import sys,json; d=json.load(sys.stdin); [print(k) for k in d.get(\'data\',{}).get(\'groups\',{})]" 2>/dev/null')
+    lines.append('    __evm_index groups')
     lines.append('end')
     lines.append('')
 
@@ -256,6 +322,7 @@ def generate_fish_completion(commands: list) -> str:
     lines.append("complete -c evm -n '__fish_seen_subcommand_from completion' -xa 'bash zsh fish'")
     lines.append("complete -c evm -n '__fish_seen_subcommand_from history' -s n -l limit -d 'Number of entries' -x")
     lines.append("complete -c evm -n '__fish_seen_subcommand_from schema' -xa 'set get delete validate list'")
+    lines.append("complete -c evm -n '__fish_seen_subcommand_from secrets' -xa 'migrate'")
     lines.append('')
 
     # Variable name completion for relevant commands
@@ -272,15 +339,41 @@ def generate_fish_completion(commands: list) -> str:
 
     # evm-load: inject EVM variables into the current shell
     lines.append('# evm-load: inject EVM variables into the current shell')
-    lines.append('# Usage: evm-load [--env-file PATH] [--group NAME] [--include-secrets] [--prefix PREFIX]')
+    lines.append('# Usage: evm-load [--env-file PATH] [--group NAME] [--include-secrets] [--prefix PREFIX] [--expand]')
+    lines.append('# Without --include-secrets/--expand, sources the cache written by')
+    lines.append("# `evm inject --cached` while its header matches the store's")
+    lines.append('# inode:size:mtime (no Python start).')
     lines.append('function evm-load')
-    lines.append('    argparse --ignore-unknown --name=evm-load \'e/env-file=\' -- $argv')
+    lines.append('    argparse --ignore-unknown --name=evm-load \'e/env-file=\' \'g/group=\' \'prefix=\' -- $argv')
     lines.append('    or return')
+    lines.append('    set -l store ~/.evm/env.json')
+    lines.append('    set -l pre')
     lines.append('    if set -q _flag_env_file')
-    lines.append('        evm --env-file $_flag_env_file inject --shell fish $argv | source')
-    lines.append('    else')
-    lines.append('        evm inject --shell fish $argv | source')
+    lines.append('        set store $_flag_env_file')
+    lines.append('        set pre --env-file $_flag_env_file')
+    lines.append('    end')
+    lines.append('    set -l opts')
+    lines.append('    set -q _flag_group; and set opts $opts --group $_flag_group')
+    lines.append('    set -q _flag_prefix; and set opts $opts --prefix $_flag_prefix')
+    # 分组/前缀按 inject_cache_path 转义（% / - → %25 %2F %2D）
+    lines.append('    set -l g (string replace -a "%" "%25" -- "$_flag_group" | string replace -a / %2F | string replace -a -- - %2D)')
+    lines.append('    set -l p (string replace -a "%" "%25" -- "$_flag_prefix" | string replace -a / %2F | string replace -a -- - %2D)')
+    lines.append('    set -l cache "$store.inject-fish-$g-$p"')
+    lines.append("    set -l wal (string replace -r '([^/])\\.[^./]*$' '$1.wal' -- $store)")
+    lines.append('    test "$wal" = "$store"; and set wal "$store.wal"')
+    # 与 inject_cache_header() 同一格式；用外部 stat（path mtime 需要 fish ≥3.5）
+    lines.append('    if test (count $argv) -eq 0 -a -f "$cache"')
+    lines.append('        set -l files $store')
+    lines.append('        test -e "$wal"; and set files $files $wal')
+    lines.append("        set -l sig (command stat --printf '%i:%s:%.9Y;' -- $files 2>/dev/null")
+    lines.append("            or command stat -n -f '%i:%z:%.9Fm;' -- $files 2>/dev/null)")
+    lines.append('        read -l line < $cache')
+    lines.append(f'        if test -n "$sig" -a "$line" = "{INJECT_CACHE_HEADER}$sig"')
+    lines.append('            source "$cache"')
+    lines.append('            return')
+    lines.append('        end')
     lines.append('    end')
+    lines.append('    evm $pre inject --shell fish --cached $opts $argv | source')
     lines.append('end')
 
     return '\n'.join(lines) + '\n'
@@ -316,11 +409,26 @@ def get_rc_path(shell: str):
 
 
 def integration_block(shell: str) -> str:
-    """生成要追加到 rc 文件的标记块文本。"""
+    """生成要追加到 rc 文件的标记块文本。
+
+    优先 source `evm init` 写下的缓存脚本（不启动 Python），
+    缓存不存在时回退为 eval。
+    """
+    cache = f'$HOME/.evm/init.{shell}'
+    if shell == 'fish':
+        line = (
+            f'if test -r "{cache}"; source "{cache}"; '
+            f'else; eval "$(evm init {shell})"; end'
+        )
+    else:
+        line = (
+            f'if [ -r "{cache}" ]; then . "{cache}"; '
+            f'else eval "$(evm init {shell})"; fi'
+        )
     return (
         f'\n{INTEGRATION_MARKER_START}\n'
         f'# Auto-added by evm. Remove with: evm init {shell} --uninstall\n'
-        f'eval "$(evm init {shell})"\n'
+        f'{line}\n'
         f'{INTEGRATION_MARKER_END}\n'
     )
 
@@ -337,6 +445,234 @@ def is_integration_installed(shell: str) -> bool:
     return INTEGRATION_MARKER_START in content
 
 
+def get_integration_stamp_path() -> Path:
+    """返回 shell 集成检查的 stamp 文件路径（~/.evm/shell-integration.stamp）。"""
+    return Path.home() / '.evm' / 'shell-integration.stamp'
+
+
+def _rc_signature(rc: Path) -> Optional[str]:
+    """rc 文件的 stamp 行：路径 + mtime_ns + size + evm 版本；文件不存在返回 None。
+
+    带上版本号，升级 evm 后 stamp 失配，启动检查走一次慢路径
+    （改写旧版标记块、重新生成 init 缓存）。
+    """
+    from . import __version__
+
+    try:
+        st = os.stat(rc)
+    except OSError:
+        return None
+    return f'{rc}\t{st.st_mtime_ns}\t{st.st_size}\t{__version__}'
+
+
+def _record_integration_stamp(rc: Path) -> None:
+    """把 rc 文件当前签名写入 stamp（同一 rc 的旧行被替换）。
+
+    stamp 只是缓存，写失败时静默忽略，下次照常读 rc 文件。
+    """
+    signature = _rc_signature(rc)
+    if signature is None:
+        return
+    stamp = get_integration_stamp_path()
+    prefix = f'{rc}\t'
+    try:
+        lines = [
+            line for line in stamp.read_text(encoding='utf-8').splitlines()
+            if not line.startswith(prefix)
+        ]
+    except OSError:
+        lines = []
+    lines.append(signature)
+    try:
+        stamp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = stamp.with_name(f'{stamp.name}.{os.getpid()}.tmp')
+        tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        os.replace(tmp, stamp)
+    except OSError:
+        pass
+
+
+def integration_stamp_current(shell: str) -> bool:
+    """rc 文件签名（含 evm 版本）是否已记录在 stamp 中。
+
+    只需一次 stat() 加读取 stamp，不读 rc 全文。为 True 时标记块已安装、
+    已是当前版本的块，init 缓存也已由当前版本检查过。
+    """
+    rc = get_rc_path(shell)
+    if rc is None:
+        return False
+    signature = _rc_signature(rc)
+    if signature is None:
+        return False
+    try:
+        stamped = get_integration_stamp_path().read_text(encoding='utf-8')
+    except OSError:
+        return False
+    return signature in stamped.splitlines()
+
+
+def is_integration_installed_cached(shell: str) -> bool:
+    """带 stamp 缓存的 is_integration_installed。
+
+    stamp 记录已确认含标记块的 rc 文件的 (路径, mtime, size, evm 版本)。
+    签名一致时不读 rc 全文；rc 被修改（包括 uninstall）或 evm 升级后
+    签名失配，重新读取 rc，把旧版标记块改写为当前块，并刷新 stamp。
+    """
+    if integration_stamp_current(shell):
+        return True
+    if not is_integration_installed(shell):
+        return False
+    upgrade_integration(shell)
+    rc = get_rc_path(shell)
+    if rc is not None:
+        _record_integration_stamp(rc)
+    return True
+
+
+# ── 启动缓存：新 shell / evm-load 不启动 Python ────────────
+
+# 缓存脚本首行，记录生成它的 evm 版本
+INIT_CACHE_HEADER = '# evm init cache '
+
+
+def get_init_cache_path(shell: str) -> Path:
+    """`evm init <shell>` 输出的缓存（~/.evm/init.<shell>），rc 标记块直接 source。"""
+    return Path.home() / '.evm' / f'init.{shell}'
+
+
+def _write_private(path: Path, text: str) -> bool:
+    """原子写入 600 权限文件；缓存写失败时返回 False，不抛异常。"""
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(tmp), os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def write_init_cache(shell: str, script: str) -> None:
+    """保存集成脚本，首行记录当前版本。"""
+    from . import __version__
+
+    _write_private(
+        get_init_cache_path(shell),
+        f'{INIT_CACHE_HEADER}{__version__}\n{script}',
+    )
+
+
+def init_cache_outdated(shell: str) -> bool:
+    """缓存存在但由其他 evm 版本生成（例如 pip 升级后）。"""
+    from . import __version__
+
+    try:
+        with open(get_init_cache_path(shell), encoding='utf-8') as f:
+            first = f.readline()
+    except OSError:
+        return False
+    return first.rstrip('\n') != f'{INIT_CACHE_HEADER}{__version__}'
+
+
+# inject 缓存首行前缀，其后是 inject_cache_header() 拼出的存储签名
+INJECT_CACHE_HEADER = '# evm inject cache '
+
+
+def inject_cache_path(
+    env_file: Path,
+    shell: str,
+    group: Optional[str] = None,
+    prefix: Optional[str] = None,
+) -> Path:
+    """`inject --cached` 的输出缓存路径，与 evm-load 中的拼法一致：
+    <env-file>.inject-<shell>-<group>-<prefix>
+
+    group/prefix 中的 % / - 转义为 %25 %2F %2D：字段内不再出现分隔符 -，
+    不同组合不会映射到同一文件，也不会因 / 跨出目录。
+    """
+    return env_file.with_name(
+        f'{env_file.name}.inject-{shell}-'
+        f'{_cache_field(group or "")}-{_cache_field(prefix or "")}'
+    )
+
+
+def _cache_field(value: str) -> str:
+    """缓存文件名中的字段转义（evm-load 用 shell 参数展开做同样的替换）"""
+    return value.replace('%', '%25').replace('/', '%2F').replace('-', '%2D')
+
+
+def inject_cache_header(source: tuple) -> str:
+    """inject 缓存首行：存储签名，evm-load 用 stat 拼出同样的字符串比较
+
+    env.json、env.wal（存在时）依次为 `<inode>:<size>:<秒>.<纳秒>;`。
+    只比较 mtime 先后时，cp -p / 备份恢复带回旧 mtime 会命中过期缓存。
+    """
+    fields = ''.join(
+        f'{sig[0]}:{sig[1]}:{sig[2] // 10**9}.{sig[2] % 10**9:09d};'
+        for sig in source if sig is not None
+    )
+    return f'{INJECT_CACHE_HEADER}{fields}'
+
+
+def write_inject_cache(
+    path: Path, output: str, source: tuple, current: Callable[[], tuple]
+) -> bool:
+    """写入 inject 输出缓存（首行为 inject_cache_header(source)）
+
+    evm-load 在首行与当前 env.json / env.wal 的签名一致时才 source 缓存。
+    写完后再取一次存储签名，若与生成输出时（source）不同，说明期间存储
+    被修改，删除缓存。
+
+    Args:
+        path: inject_cache_path() 的结果
+        output: 渲染好的导出语句
+        source: 生成 output 的数据对应的存储签名
+        current: 返回当前存储签名的函数
+
+    Returns:
+        缓存是否已写入
+    """
+    if not _write_private(path, f'{inject_cache_header(source)}\n{output}'):
+        return False
+    if current() != source:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+# ── 补全索引：TAB 补全只读文件，不启动 evm / python3 ──────────
+
+# 索引种类 → 文件后缀（env.json → env.keys / env.groups）
+COMPLETION_INDEX_KINDS = ('keys', 'groups')
+
+
+def completion_index_path(env_file: Path, kind: str) -> Path:
+    """补全索引路径，与补全脚本中的拼法一致（替换存储文件的后缀）"""
+    return env_file.with_suffix(f'.{kind}')
+
+
+def write_completion_index(
+    env_file: Path, keys: Iterable[str], groups: Iterable[str]
+) -> None:
+    """写入纯文本补全索引（每行一个 key / 分组名）
+
+    由 _save_env_vars 在 .lock 下调用。索引只是缓存，写失败时忽略；
+    含换行的 key 无法按行表示，不写入。
+    """
+    for kind, names in (('keys', keys), ('groups', groups)):
+        text = ''.join(f'{name}\n' for name in names if '\n' not in name)
+        _write_private(completion_index_path(env_file, kind), text)
+
+
 def install_integration(shell: str) -> tuple[bool, str]:
     """把集成块追加到 shell 的 rc 文件。
 
@@ -348,17 +684,57 @@ def install_integration(shell: str) -> tuple[bool, str]:
         return False, f"Unknown shell: {shell}"
 
     if is_integration_installed(shell):
+        if upgrade_integration(shell):
+            _record_integration_stamp(rc)
+            return True, f"Updated evm shell integration in {rc}"
         return True, f"Already installed in {rc}"
 
     try:
         rc.parent.mkdir(parents=True, exist_ok=True)
         with open(rc, 'a', encoding='utf-8') as f:
             f.write(integration_block(shell))
+        _record_integration_stamp(rc)
         return True, f"Installed evm shell integration to {rc}"
     except OSError as e:
         return False, f"Failed to install to {rc}: {e}"
 
 
+def upgrade_integration(shell: str) -> bool:
+    """把 rc 中旧版本写入的标记块改写为当前 integration_block()。
+
+    旧块只有 `eval "$(evm init <shell>)"`，每个新 shell 都要启动 Python；
+    当前块优先 source ~/.evm/init.<shell>。块已是当前内容、没有完整的
+    标记块或读写失败时不改动。
+
+    Returns:
+        是否改写了 rc 文件
+    """
+    rc = get_rc_path(shell)
+    if rc is None:
+        return False
+    try:
+        content = rc.read_text(encoding='utf-8')
+    except OSError:
+        return False
+    block = integration_block(shell).strip('\n')
+    if block in content:
+        return False
+
+    lines = content.split('\n')
+    stripped = [line.strip() for line in lines]
+    try:
+        start = stripped.index(INTEGRATION_MARKER_START)
+        end = stripped.index(INTEGRATION_MARKER_END, start)
+    except ValueError:
+        return False
+    lines[start:end + 1] = block.split('\n')
+    try:
+        rc.write_text('\n'.join(lines), encoding='utf-8')
+    except OSError:
+        return False
+    return True
+
+
 def uninstall_integration(shell: str) -> tuple[bool, str]:
     """从 shell 的 rc 文件移除集成块（行级删除）。"""
     rc = get_rc_path(shell)
@@ -6,21 +6,111 @@ EVM 加密模块
 - HKDF-Expand: 密钥分离（加密密钥 + MAC 密钥）
 - HMAC-CTR: 基于 HMAC 的 CTR 模式流密码
 - HMAC-SHA256: 认证加密（Encrypt-then-MAC）
+- MasterKeyCache: 进程内 PBKDF2 主密钥 LRU 缓存（退出时清零）
 
-格式: ENCv3:<salt_b64>:<iv_b64>:<mac_b64>:<ciphertext_b64>
+格式:
+  ENCv3:<salt_b64>:<iv_b64>:<mac_b64>:<ciphertext_b64>
+      每个值独立盐 → 每个值一次 PBKDF2
+  ENCv4:<store_salt_b64>:<nonce_b64>:<mac_b64>:<ciphertext_b64>
+      同一存储共用盐、每值随机 nonce → 整个存储一次 PBKDF2
 """
 
+import atexit
 import base64
 import hashlib
 import hmac
 import os
 import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
 
 from .exceptions import DecryptionError
 
 # SHA-256 输出长度（字节），用于 HKDF-Expand 计算
 HKDF_HASH_LEN = 32
 
+# 主密钥缓存默认容量（条目数）
+MASTER_KEY_CACHE_SIZE = 256
+
+
+class MasterKeyCache:
+    """PBKDF2 主密钥的有界 LRU 缓存（线程安全）
+
+    以 (password, salt) 为键缓存派生结果，避免对同一盐重复执行
+    100,000 次迭代；同一键的并发未命中只派生一次。密钥以 bytearray
+    保存，淘汰或 clear() 时原地清零；get() 返回 bytes 副本，
+    其他线程淘汰条目不会清零调用方正在使用的密钥。
+    """
+
+    def __init__(self, maxsize: int = MASTER_KEY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[bytes, bytes], bytearray] = OrderedDict()
+        self._pending: dict[tuple[bytes, bytes], threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        password: bytes,
+        salt: bytes,
+        derive: Callable[[bytes, bytes], bytes],
+    ) -> bytes:
+        """返回缓存的主密钥（副本），未命中时调用 derive(password, salt) 并缓存
+
+        同一键的并发未命中合并为一次派生：首个线程派生，其余线程等待结果。
+        """
+        cache_key = (password, bytes(salt))
+        while True:
+            with self._lock:
+                key = self._entries.get(cache_key)
+                if key is not None:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return bytes(key)
+                pending = self._pending.get(cache_key)
+                if pending is None:
+                    pending = self._pending[cache_key] = threading.Event()
+                    break
+            # 其他线程正在派生同一键；派生失败时重新竞争
+            pending.wait()
+        try:
+            # 派生在锁外进行：hashlib 会释放 GIL，允许并发派生不同的盐
+            derived = bytearray(derive(password, salt))
+            with self._lock:
+                self.misses += 1
+                self._entries[cache_key] = derived
+                result = bytes(derived)
+                while len(self._entries) > self.maxsize:
+                    _, evicted = self._entries.popitem(last=False)
+                    _wipe(evicted)
+        finally:
+            with self._lock:
+                del self._pending[cache_key]
+            pending.set()
+        return result
+
+    def clear(self) -> None:
+        """清零并清空所有缓存的密钥"""
+        with self._lock:
+            for key in self._entries.values():
+                _wipe(key)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _wipe(buf: bytearray) -> None:
+    """原地清零密钥缓冲区"""
+    buf[:] = bytes(len(buf))
+
+
+# 进程级缓存，退出时清零
+MASTER_KEY_CACHE = MasterKeyCache()
+atexit.register(MASTER_KEY_CACHE.clear)
+
 
 def hkdf_expand(prk: bytes, info: bytes, length: int = 32) -> bytes:
     """HKDF-Expand (RFC 5869)
@@ -68,6 +158,9 @@ def hmac_ctr_keystream(key: bytes, iv: bytes, length: int) -> bytes:
 
     keystream = HMAC(key, IV || 0) || HMAC(key, IV || 1) || ...
 
+    预先对 IV 完成 HMAC 前缀计算，每个块只 copy() + update(counter)；
+    所有块收集到列表后一次 join，避免 bytes 反复拼接。
+
     Args:
         key: 加密密钥
         iv: 随机初始化向量（计数器起始值）
@@ -76,15 +169,34 @@ def hmac_ctr_keystream(key: bytes, iv: bytes, length: int) -> bytes:
     Returns:
         指定长度的密钥流
     """
-    stream = b''
-    counter = 0
-    while len(stream) < length:
-        block = hmac.new(
-            key, iv + struct.pack('>I', counter), hashlib.sha256
-        ).digest()
-        stream += block
-        counter += 1
-    return stream[:length]
+    n_blocks = (length + HKDF_HASH_LEN - 1) // HKDF_HASH_LEN
+    prefix = hmac.new(key, iv, hashlib.sha256)
+    blocks = [b''] * n_blocks
+    pack = struct.Struct('>I').pack
+    for counter in range(n_blocks):
+        h = prefix.copy()
+        h.update(pack(counter))
+        blocks[counter] = h.digest()
+    return b''.join(blocks)[:length]
+
+
+def xor_bytes(data: bytes, keystream: bytes) -> bytes:
+    """整块异或：转为大整数一次运算，替代逐字节生成器
+
+    Args:
+        data: 明文或密文
+        keystream: 至少与 data 等长的密钥流（多余部分忽略）
+
+    Returns:
+        与 data 等长的异或结果
+    """
+    n = len(data)
+    if not n:
+        return b''
+    return (
+        int.from_bytes(data, 'little')
+        ^ int.from_bytes(keystream[:n], 'little')
+    ).to_bytes(n, 'little')
 
 
 def encrypt_v3(plaintext: str, derive_key_fn) -> str:
@@ -106,7 +218,7 @@ def encrypt_v3(plaintext: str, derive_key_fn) -> str:
 
     # HMAC-CTR 加密
     keystream = hmac_ctr_keystream(enc_key, iv, len(data_bytes))
-    ciphertext = bytes(a ^ b for a, b in zip(data_bytes, keystream))
+    ciphertext = xor_bytes(data_bytes, keystream)
 
     # Encrypt-then-MAC: HMAC 覆盖 salt + iv + ciphertext
     mac = hmac.new(
@@ -160,7 +272,82 @@ def decrypt_v3(encoded: str, derive_key_fn) -> str:
 
     # HMAC-CTR 解密
     keystream = hmac_ctr_keystream(enc_key, iv, len(ciphertext))
-    plaintext = bytes(a ^ b for a, b in zip(ciphertext, keystream))
+    plaintext = xor_bytes(ciphertext, keystream)
+
+    try:
+        return plaintext.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise DecryptionError(f"Decrypted data is not valid UTF-8: {e}")
+
+
+def encrypt_v4(plaintext: str, store_salt: bytes, derive_key_fn) -> str:
+    """v4 加密: 存储级盐派生主密钥 + 每值随机 nonce
+
+    同一存储内所有值共用 store_salt，主密钥只需派生一次（配合
+    MasterKeyCache）；每个值的 nonce 既用于 HKDF 子密钥分离，
+    也作为 HMAC-CTR 计数器起点，保证密钥流不重复。
+
+    Args:
+        plaintext: 明文
+        store_salt: 存储级随机盐（16 字节）
+        derive_key_fn: 密钥派生函数 (salt) -> master_key
+
+    Returns:
+        ENCv4:<store_salt_b64>:<nonce_b64>:<mac_b64>:<ciphertext_b64>
+    """
+    nonce = os.urandom(16)
+    master_key = derive_key_fn(store_salt)
+    enc_key, mac_key = derive_subkeys(master_key, nonce)
+
+    data_bytes = plaintext.encode('utf-8')
+    keystream = hmac_ctr_keystream(enc_key, nonce, len(data_bytes))
+    ciphertext = xor_bytes(data_bytes, keystream)
+
+    # MAC 覆盖版本标签 + 盐 + nonce + 密文，防止跨版本混用
+    mac = hmac.new(
+        mac_key, b'ENCv4' + store_salt + nonce + ciphertext, hashlib.sha256
+    ).digest()
+
+    return 'ENCv4:' + ':'.join(
+        base64.b64encode(part).decode('ascii')
+        for part in (store_salt, nonce, mac, ciphertext)
+    )
+
+
+def decrypt_v4(encoded: str, derive_key_fn) -> str:
+    """v4 解密: 验证 MAC + HMAC-CTR 解密
+
+    Args:
+        encoded: store_salt_b64:nonce_b64:mac_b64:ciphertext_b64
+        derive_key_fn: 密钥派生函数 (salt) -> master_key
+
+    Raises:
+        DecryptionError: 格式错误或完整性校验失败
+    """
+    parts = encoded.split(':')
+    if len(parts) != 4:
+        raise DecryptionError("Invalid v4 encrypted data format")
+
+    try:
+        store_salt, nonce, stored_mac, ciphertext = (
+            base64.b64decode(p) for p in parts
+        )
+    except Exception as e:
+        raise DecryptionError(f"Failed to decode v4 data: {e}")
+
+    master_key = derive_key_fn(store_salt)
+    enc_key, mac_key = derive_subkeys(master_key, nonce)
+
+    computed_mac = hmac.new(
+        mac_key, b'ENCv4' + store_salt + nonce + ciphertext, hashlib.sha256
+    ).digest()
+    if not hmac.compare_digest(stored_mac, computed_mac):
+        raise DecryptionError(
+            "Data integrity check failed — data may be corrupted or tampered"
+        )
+
+    keystream = hmac_ctr_keystream(enc_key, nonce, len(ciphertext))
+    plaintext = xor_bytes(ciphertext, keystream)
 
     try:
         return plaintext.decode('utf-8')
@@ -169,9 +356,14 @@ def decrypt_v3(encoded: str, derive_key_fn) -> str:
 
 
 __all__ = [
+    'MASTER_KEY_CACHE',
+    'MasterKeyCache',
     'hkdf_expand',
     'derive_subkeys',
     'hmac_ctr_keystream',
+    'xor_bytes',
     'encrypt_v3',
     'decrypt_v3',
+    'encrypt_v4',
+    'decrypt_v4',
 ]
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+EVM 守护进程（evm serve）
+
+常驻内存持有 EnvironmentManager，通过 Unix socket 执行 _client 转发来的命令，
+省去每次调用的解释器启动、模块导入和 env.json 解析。
+
+- 每个请求前经 EnvironmentManager.refresh() stat 检查存储文件
+  （env.json / env.wal），外部修改后重新加载；自身写入不触发重新解析
+- 请求串行处理：命令在守护进程中切换 cwd、捕获 stdout/stderr，互不干扰；
+  每个连接的读写限时 REQUEST_TIMEOUT 秒，连上后不发请求的客户端不会阻塞其他人
+- socket 权限 600，仅属主可连接；已有守护进程在监听时拒绝启动
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from ._client import DAEMON_COMMANDS, FORWARDED_ENV, _split_argv, default_socket_path
+from .exceptions import EVMError
+from .manager import EnvironmentManager
+
+if TYPE_CHECKING:
+    import argparse
+
+# 单个连接读取请求 / 写回响应的超时（秒）；不含命令本身的执行时间
+REQUEST_TIMEOUT = 5.0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self) -> None:
+        daemon: EVMDaemon = self.server.daemon  # type: ignore[attr-defined]
+        try:
+            line = self.rfile.readline()
+        except OSError:
+            return  # 超时或断开：放弃该连接，继续服务下一个
+        try:
+            request = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            response = {'code': 1, 'stdout': '', 'stderr': 'Error: bad request\n'}
+        else:
+            response = daemon.handle(request)
+        try:
+            self.wfile.write(
+                json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+            )
+        except OSError:
+            pass
+
+
+class EVMDaemon:
+    """`evm serve` 守护进程"""
+
+    def __init__(self, env_file: Optional[str] = None, socket_path: Optional[str] = None):
+        self.manager = EnvironmentManager(env_file)
+        self.env_file = self.manager.env_file.resolve()
+        self.socket_path = socket_path or default_socket_path(str(self.env_file))
+        self._parser: Optional[argparse.ArgumentParser] = None
+
+        _remove_stale_socket(self.socket_path)
+        self.env_file.parent.mkdir(parents=True, exist_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            self.server = socketserver.UnixStreamServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+        self.server.daemon = self  # type: ignore[attr-defined]
+
+    def _current_manager(self) -> EnvironmentManager:
+        """返回常驻管理器；存储文件被外部修改时重新加载"""
+        self.manager.refresh()
+        return self.manager
+
+    def _manager_for(self, env_file: Optional[str]) -> EnvironmentManager:
+        """cli.run 的 manager_factory：同一存储复用常驻管理器"""
+        if env_file is None or Path(env_file).resolve() == self.env_file:
+            return self._current_manager()
+        return EnvironmentManager(env_file)
+
+    def handle(self, request: dict) -> dict:
+        """执行一条转发来的命令，返回 {'code', 'stdout', 'stderr'}"""
+        from .cli import create_parser, run
+
+        argv = request.get('argv')
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            return {'code': 1, 'stdout': '', 'stderr': 'Error: bad request\n'}
+        _, command = _split_argv(argv)
+        if command not in DAEMON_COMMANDS:
+            return {
+                'code': 1, 'stdout': '',
+                'stderr': f"Error: command '{command}' is not served by the daemon\n",
+            }
+        if self._parser is None:
+            self._parser = create_parser()
+
+        out, err = io.StringIO(), io.StringIO()
+        saved_cwd = os.getcwd()
+        saved_env = {k: os.environ.get(k) for k in FORWARDED_ENV}
+        try:
+            cwd = request.get('cwd')
+            if cwd:
+                os.chdir(cwd)
+            for k in FORWARDED_ENV:
+                value = (request.get('env') or {}).get(k)
+                if value is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = value
+            with redirect_stdout(out), redirect_stderr(err):
+                try:
+                    code = run(
+                        argv, manager_factory=self._manager_for, parser=self._parser,
+                    )
+                except SystemExit as e:  # argparse 错误 / --version
+                    code = e.code if isinstance(e.code, int) else 1
+        except OSError as e:
+            return {'code': 1, 'stdout': '', 'stderr': f'Error: {e}\n'}
+        finally:
+            os.chdir(saved_cwd)
+            for k, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = value
+        return {'code': code, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+    def serve_forever(self) -> None:
+        self.server.serve_forever()
+
+    def shutdown(self) -> None:
+        """从其他线程停止 serve_forever()"""
+        self.server.shutdown()
+
+    def close(self) -> None:
+        self.server.server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: str) -> None:
+    """删除上次异常退出遗留的 socket
+
+    Raises:
+        EVMError: 已有守护进程在该路径监听，或该路径不是 socket
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise EVMError(f"Refusing to replace non-socket file: {path}")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(1.0)
+        sock.connect(path)
+    except OSError:
+        os.unlink(path)  # 无人监听
+        return
+    finally:
+        sock.close()
+    raise EVMError(f"An evm daemon is already listening on {path}")
+
+
+__all__ = ['EVMDaemon', 'DAEMON_COMMANDS']
@@ -3,9 +3,12 @@
 EVM 分组操作 Mixin
 
 从 manager.py 中提取的分组管理功能。
+分组查询走 ChangeTrackingDict 的分组索引，不扫描全部 key。
 """
 
 
+from typing import Optional
+
 from ._typing import EnvironmentManagerProtocol
 from .exceptions import (
     GroupNotFoundError,
@@ -36,7 +39,7 @@ class GroupMixin(EnvironmentManagerProtocol):
             KeyNotFoundError: 变量不存在
         """
         full_key = f"{group}:{key}" if group else key
-        value = self._env_vars.get(full_key)
+        value: Optional[str] = self._env_vars.get(full_key)
         if value is None and group:
             value = self._env_vars.get(key)
         if value is None:
@@ -66,12 +69,7 @@ class GroupMixin(EnvironmentManagerProtocol):
         Returns:
             {group_name: variable_count} 字典
         """
-        groups: dict[str, int] = {}
-        for key in self._env_vars:
-            if ':' in key:
-                group = key.split(':', 1)[0]
-                groups[group] = groups.get(group, 0) + 1
-        return groups
+        return self._env_vars.group_counts()
 
     def delete_group(self, group: str, dry_run: bool = False) -> str:
         """删除整个分组
@@ -85,8 +83,7 @@ class GroupMixin(EnvironmentManagerProtocol):
                 "Cannot delete default namespace. Use 'clear' to remove all variables."
             )
 
-        prefix = f"{group}:"
-        to_delete = [k for k in self._env_vars if k.startswith(prefix)]
+        to_delete = self._env_vars.group_keys(group)
 
         if not to_delete:
             raise GroupNotFoundError(group)
@@ -3,15 +3,29 @@
 EVM 操作历史 Mixin
 
 记录操作日志到 history.jsonl（JSON Lines 格式），与 env.json 同目录。
+
+历史按分段轮转：活动分段 history.jsonl 写满 MAX_HISTORY_ENTRIES // 2 行后
+依次改名为 history.jsonl.1、.2，超出保留数的最旧分段被删除；
+磁盘上保留 MAX_HISTORY_ENTRIES 到 1.5 倍 MAX_HISTORY_ENTRIES 条记录。
+活动分段及各旧分段的行数记在 history.jsonl.meta，追加为 O(1)；
+读取时从文件末尾反向分块扫描，最新条目无需解析整个历史。
+每个分段另有 .idx 查询索引（每条记录一行：偏移、长度、时间、操作、变量名、状态），
+按条件查询时只读取命中的记录。分段轮转后内容不再变化，其索引另编译为
+.lookup（按变量名、按日期的行号表），查询只检查候选行，不再逐行扫描索引。
 """
 
 import fcntl
 import json
 import os
-from datetime import datetime
+import re
+from collections.abc import Iterable, Iterator
+from fnmatch import fnmatchcase
+from itertools import islice
 from pathlib import Path
+from typing import Optional
 
 from ._typing import EnvironmentManagerProtocol
+from .exceptions import EVMError
 
 
 class HistoryMixin(EnvironmentManagerProtocol):
@@ -32,110 +46,589 @@ class HistoryMixin(EnvironmentManagerProtocol):
     ) -> None:
         """记录操作日志（静默失败，不影响主流程）
 
+        事务进行中只缓冲，提交时由 _append_history 一次写入。
+        """
+        from datetime import datetime
+
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'operation': operation,
+            'key': key,
+            'details': details,
+            'status': status,
+        }
+        if self._pending_history is not None:
+            self._pending_history.append(entry)
+            return
+        self._append_history([entry])
+
+    def _append_history(self, entries: list[dict]) -> None:
+        """追加若干条日志到 history.jsonl（每个分段单次 write）
+
         仅捕获 OSError，避免吞没编程错误。
         创建文件时设置 chmod 600。
         使用文件锁防止并发追加时行交错。
+        各分段的行数记在 history.jsonl.meta 中，热路径上不再读取整个历史文件。
+        批量写入在分段边界处切开、写满即轮转，大事务 / batch / load
+        也不会让单个分段超出 _history_segment_size()。
         """
+        if not entries:
+            return
         try:
             history_file = self._get_history_file()
             is_new = not history_file.exists()
 
-            entry = {
-                'timestamp': datetime.now().isoformat(),
-                'operation': operation,
-                'key': key,
-                'details': details,
-                'status': status,
-            }
+            lines = [
+                (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+                for entry in entries
+            ]
 
-            fd = os.open(str(history_file), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600)
+            fd = self._open_history_locked(history_file)
             try:
-                fcntl.flock(fd, fcntl.LOCK_EX)
-                try:
-                    line = json.dumps(entry, ensure_ascii=False) + '\n'
-                    os.write(fd, line.encode('utf-8'))
-                finally:
-                    fcntl.flock(fd, fcntl.LOCK_UN)
+                meta = self._read_history_meta()
+                if meta is None:
+                    # 旧版历史或 sidecar 损坏：统计一次活动分段，旧分段行数未知
+                    meta = {'lines': _count_lines(history_file)}
+                size = self._history_segment_size()
+                start = 0
+                while start < len(entries):
+                    end = start + max(1, size - int(meta['lines']))
+                    chunk = lines[start:end]
+                    base = os.fstat(fd).st_size
+                    os.write(fd, b''.join(chunk))
+                    self._append_history_index(
+                        history_file, base, entries[start:end], chunk
+                    )
+                    meta['lines'] = int(meta['lines']) + len(chunk)
+                    start = end
+                    if meta['lines'] < size:
+                        continue
+                    self._rotate_history(history_file)
+                    keep = self._history_rotated_count()
+                    meta = {
+                        'lines': 0,
+                        'rotated': (
+                            [meta['lines']] + list(meta.get('rotated', []))
+                        )[:keep],
+                    }
+                    if start < len(entries):
+                        # 余下的记录写入新的活动分段；先锁新分段再释放已轮转的旧分段
+                        self._write_history_meta(meta)
+                        new_fd = self._open_history_locked(history_file)
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                        os.close(fd)
+                        fd = new_fd
+                self._write_history_meta(meta)
             finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
                 os.close(fd)
 
             # 新建文件时设置权限
             if is_new:
-                os.chmod(str(history_file), 0o600)
-
-            # 惰性裁切：仅在超过 1.5 倍上限时触发，避免每次 O(N) 扫描
-            self._trim_history_if_needed()
+                try:
+                    os.chmod(str(history_file), 0o600)
+                except OSError:
+                    pass  # 已轮转走或 chmod 失败均不影响记录
         except OSError:
             pass
 
+    # ── 分段 ──────────────────────────────────────────────
+
+    def _history_segment_size(self) -> int:
+        """单个分段的行数上限（上限的一半，保留 2 个旧分段即覆盖上限）"""
+        return max(1, self.MAX_HISTORY_ENTRIES // 2)
+
+    def _history_rotated_count(self) -> int:
+        """保留的已轮转分段数"""
+        size = self._history_segment_size()
+        return max(1, -(-self.MAX_HISTORY_ENTRIES // size))
+
+    def _history_meta_file(self) -> Path:
+        """分段行数 sidecar: {"lines": 活动分段行数, "rotated": [.1 行数, .2 行数]}"""
+        history_file = self._get_history_file()
+        return history_file.with_name(history_file.name + '.meta')
+
+    def _history_segments(self) -> list[Path]:
+        """现存的历史分段，最新在前（history.jsonl, .1, .2, ...）"""
+        history_file = self._get_history_file()
+        segments = [history_file] if history_file.exists() else []
+        n = 1
+        while True:
+            segment = history_file.with_name(f'{history_file.name}.{n}')
+            if not segment.exists():
+                break
+            segments.append(segment)
+            n += 1
+        return segments
+
+    @staticmethod
+    def _open_history_locked(history_file: Path) -> int:
+        """以追加模式打开活动分段并加排他锁
+
+        加锁期间若文件已被其他进程轮转，重新打开新的活动分段。
+        """
+        while True:
+            fd = os.open(
+                str(history_file), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600
+            )
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(history_file).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read_history_meta(self) -> Optional[dict]:
+        """读取 sidecar；缺失或损坏时返回 None"""
+        try:
+            with open(self._history_meta_file(), encoding='utf-8') as f:
+                meta = json.load(f)
+            int(meta['lines'])
+            return meta if isinstance(meta, dict) else None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_history_meta(self, meta: dict) -> None:
+        """写入 sidecar（调用方持有历史文件锁）"""
+        fd = os.open(
+            str(self._history_meta_file()),
+            os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600,
+        )
+        try:
+            os.write(fd, json.dumps(meta).encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _history_index_file(segment: Path) -> Path:
+        """分段的查询索引（history.jsonl → history.jsonl.idx，.1 → .1.idx）"""
+        return segment.with_name(segment.name + '.idx')
+
+    @staticmethod
+    def _history_lookup_file(segment: Path) -> Path:
+        """已轮转分段的编译索引（.1 → .1.lookup）"""
+        return segment.with_name(segment.name + '.lookup')
+
+    def _history_sidecars(self, segment: Path) -> list[Path]:
+        """随分段改名/删除的索引文件"""
+        return [self._history_index_file(segment), self._history_lookup_file(segment)]
+
+    def _compile_history_lookup(self, segment: Path) -> None:
+        """为刚轮转的分段编译 .lookup（调用方持有历史文件锁，失败时查询退回 .idx）"""
+        index_file = self._history_index_file(segment)
+        if index_file.exists():
+            rows = _read_index_rows(index_file)
+        else:
+            with open(segment, 'rb') as f:
+                rows = _index_rows_from_bytes(f.read())
+        fd = os.open(
+            str(self._history_lookup_file(segment)),
+            os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600,
+        )
+        try:
+            os.write(fd, json.dumps(_build_lookup(rows), ensure_ascii=False).encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _append_history_index(
+        self,
+        history_file: Path,
+        base: int,
+        entries: list[dict],
+        lines: list[bytes],
+    ) -> None:
+        """为新追加的记录写索引行（调用方持有历史文件锁）
+
+        活动分段已有内容但缺少索引（旧版历史）时，先为整个分段补建。
+        """
+        index_file = self._history_index_file(history_file)
+        if base and not index_file.exists():
+            with open(history_file, 'rb') as f:
+                rows = _index_rows_from_bytes(f.read())
+        else:
+            rows = []
+            offset = base
+            for entry, line in zip(entries, lines):
+                rows.append(_index_row(entry, offset, len(line)))
+                offset += len(line)
+        data = ''.join(
+            json.dumps(row, ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8')
+        fd = os.open(
+            str(index_file), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600
+        )
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _rotate_history(self, history_file: Path) -> None:
+        """轮转：history.jsonl → .1 → .2 ...（索引随之改名），超出保留数的旧分段删除
+
+        新的 .1 分段不再变化，为其编译 .lookup。
+
+        os.replace 为原子操作，崩溃时不会丢失活动分段。
+        调用方持有历史文件锁。
+        """
+        keep = self._history_rotated_count()
+        name = history_file.name
+        # 清理超出保留数的分段（MAX_HISTORY_ENTRIES 调小后可能残留）
+        n = keep
+        while True:
+            stale = history_file.with_name(f'{name}.{n}')
+            if not stale.exists():
+                break
+            if n > keep:
+                stale.unlink()
+                for sidecar in self._history_sidecars(stale):
+                    if sidecar.exists():
+                        sidecar.unlink()
+            n += 1
+        for i in range(keep, 0, -1):
+            src = history_file.with_name(f'{name}.{i - 1}') if i > 1 else history_file
+            dst = history_file.with_name(f'{name}.{i}')
+            if src.exists():
+                os.replace(src, dst)
+                for src_side, dst_side in zip(
+                    self._history_sidecars(src), self._history_sidecars(dst)
+                ):
+                    if src_side.exists():
+                        os.replace(src_side, dst_side)
+                    elif dst_side.exists():
+                        dst_side.unlink()
+        self._compile_history_lookup(history_file.with_name(f'{name}.1'))
+
     def get_history(
         self, limit: int = 20, offset: int = 0
     ) -> list[dict]:
-        """获取操作历史（最新在前）"""
-        history_file = self._get_history_file()
-        if not history_file.exists():
+        """获取操作历史（最新在前）
+
+        从文件末尾按块反向读取，只解析需要的条目；
+        offset 利用 sidecar 中记录的分段行数整段跳过。
+        """
+        if limit <= 0:
+            return []
+        try:
+            return list(islice(self._iter_history(offset), limit))
+        except OSError:
             return []
 
-        entries = []
+    def _iter_history(self, offset: int = 0) -> Iterator[dict]:
+        """最新在前惰性遍历历史条目，跳过前 offset 条"""
+        counts = self._history_segment_counts()
+        for i, segment in enumerate(self._history_segments()):
+            known = counts[i] if i < len(counts) else None
+            if known is not None and offset >= known:
+                offset -= known
+                continue
+            for raw in _iter_lines_reverse(segment):
+                if not raw.strip():
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                try:
+                    yield json.loads(raw)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+
+    def _history_segment_counts(self) -> list[Optional[int]]:
+        """各分段行数（最新在前）；未知的为 None"""
+        meta = self._read_history_meta()
+        if meta is None:
+            return []
+        counts: list[Optional[int]] = []
+        if self._get_history_file().exists():
+            counts.append(meta.get('lines'))
+        counts.extend(meta.get('rotated', []))
+        return counts
+
+    def query_history(
+        self,
+        key: Optional[str] = None,
+        operation: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> list[dict]:
+        """按条件查询操作历史（最新在前）
+
+        已轮转分段按 .lookup 中的变量名/日期行号表取候选行，活动分段扫描 .idx，
+        只读取命中的记录；记录按时间顺序追加，越过 since 后即停止扫描更旧的分段。
+
+        Args:
+            key: 变量名 glob 模式（如 'DB_*'）
+            operation: 操作名（如 'delete'）
+            status: 状态（'success' / 'failed' ...）
+            since: 起始时间（含），ISO 日期/时间或相对时长（'7d'、'12h'、'30m'）
+            until: 结束时间（含，按给定精度比较）
+            limit: 返回条数上限
+            offset: 跳过前若干条命中记录
+
+        Raises:
+            EVMError: 时间格式无效
+        """
+        query = _HistoryQuery(
+            key=key,
+            operation=operation,
+            status=status,
+            since=parse_time_bound(since) if since else None,
+            until=parse_time_bound(until) if until else None,
+        )
+        if limit <= 0:
+            return []
         try:
-            with open(history_file, encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        try:
-                            entries.append(json.loads(line))
-                        except json.JSONDecodeError:
-                            continue
+            matches = self._iter_history_matches(query)
+            return list(islice(matches, offset, offset + limit))
         except OSError:
             return []
 
-        # 最新在前
-        entries.reverse()
-        return entries[offset:offset + limit]
+    def _iter_history_matches(self, query: '_HistoryQuery') -> Iterator[dict]:
+        """最新在前遍历命中查询的记录"""
+        for segment in self._history_segments():
+            lookup = _read_lookup(self._history_lookup_file(segment))
+            index_file = self._history_index_file(segment)
+            if lookup is not None:
+                rows = lookup['rows']
+                candidates: Iterable[int] = _lookup_candidates(lookup, query)
+            elif index_file.exists():
+                rows = _read_index_rows(index_file)
+                candidates = range(len(rows) - 1, -1, -1)
+            else:
+                # 无索引的旧分段：直接解析分段内容
+                for raw in _iter_lines_reverse(segment):
+                    try:
+                        entry = json.loads(raw) if raw.strip() else None
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    if not isinstance(entry, dict):
+                        continue
+                    ts = str(entry.get('timestamp', ''))
+                    if query.before_since(ts):
+                        return
+                    if query.match(
+                        ts,
+                        str(entry.get('operation') or ''),
+                        str(entry.get('key') or ''),
+                        str(entry.get('status') or ''),
+                    ):
+                        yield entry
+                continue
+
+            with open(segment, 'rb') as f:
+                for i in candidates:
+                    offset, length, ts, op, key, status = rows[i]
+                    if query.before_since(ts):
+                        return
+                    if not query.match(ts, op, key, status):
+                        continue
+                    f.seek(offset)
+                    try:
+                        yield json.loads(f.read(length))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+            # 分段最旧的记录已早于 since：更旧的分段无需再看
+            if rows and query.before_since(rows[0][2]):
+                return
 
     def clear_history(self) -> str:
-        """清空操作历史"""
-        history_file = self._get_history_file()
-        if history_file.exists():
-            os.unlink(history_file)
+        """清空操作历史（所有分段及 sidecar）"""
+        segments = self._history_segments()
+        for segment in segments:
+            os.unlink(segment)
+            for sidecar in self._history_sidecars(segment):
+                if sidecar.exists():
+                    os.unlink(sidecar)
+        meta = self._history_meta_file()
+        if meta.exists():
+            os.unlink(meta)
+        if segments:
             return "History cleared"
         return "No history to clear"
 
-    def _trim_history_if_needed(self) -> None:
-        """惰性裁切：仅在行数超过 1.5 倍上限时触发。
 
-        使用原子写入（先写临时文件，再 rename）防止崩溃导致历史丢失。
-        """
-        history_file = self._get_history_file()
-        if not history_file.exists():
-            return
+def _count_lines(path: Path) -> int:
+    """统计活动分段行数（仅在 sidecar 缺失时调用一次）"""
+    count = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            count += chunk.count(b'\n')
+    return count
 
-        threshold = int(self.MAX_HISTORY_ENTRIES * 1.5)
-        tmp_path = str(history_file) + '.trim.tmp'
-        try:
-            with open(history_file, encoding='utf-8') as f:
-                lines = f.readlines()
 
-            if len(lines) <= threshold:
-                return
+def _iter_lines_reverse(path: Path, block_size: int = 8192) -> Iterator[bytes]:
+    """从文件末尾按块反向读取，逐行产出（最后一行最先）"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + tail
+            lines = block.split(b'\n')
+            # 第一段可能是被块边界截断的行，留到下一轮拼接
+            tail = lines[0]
+            yield from reversed(lines[1:])
+        yield tail
 
-            # 保留最新的一半
-            keep = lines[len(lines) // 2:]
 
-            # 原子写入：先写临时文件，再 rename
-            with open(tmp_path, 'w', encoding='utf-8') as f:
-                f.writelines(keep)
-                f.flush()
-                os.fsync(f.fileno())
-            os.replace(tmp_path, str(history_file))
+# ── 查询索引 ────────────────────────────────────────────────
+
+
+def _index_row(entry: dict, offset: int, length: int) -> list:
+    """索引行：[偏移, 长度, 时间戳, 操作, 变量名, 状态]"""
+    return [
+        offset,
+        length,
+        entry.get('timestamp', ''),
+        entry.get('operation', ''),
+        entry.get('key', ''),
+        entry.get('status', ''),
+    ]
+
+
+def _index_rows_from_bytes(data: bytes) -> list[list]:
+    """为已有分段内容补建索引行（跳过无法解析的行）"""
+    rows = []
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        try:
+            entry = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            entry = None
+        if isinstance(entry, dict):
+            rows.append(_index_row(entry, offset, len(line)))
+        offset += len(line)
+    return rows
+
+
+def _read_index_rows(index_file: Path) -> list[list]:
+    """读取 .idx 的全部索引行：整体一次解析，含残缺/损坏行时逐行解析并跳过"""
+    with open(index_file, 'rb') as f:
+        data = f.read()
+    lines = data.splitlines()
+    try:
+        rows = json.loads(b'[' + b','.join(line for line in lines if line.strip()) + b']')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        rows = []
+        for raw in lines:
             try:
-                os.chmod(str(history_file), 0o600)
-            except OSError:
-                pass  # chmod 失败不影响功能，权限问题由 log_operation 下次写入时自愈
-        except OSError:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
+                rows.append(json.loads(raw))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+    return [row for row in rows if isinstance(row, list) and len(row) == 6]
+
+
+def _build_lookup(rows: list[list]) -> dict:
+    """编译分段索引：{"rows": 索引行, "keys": {变量名: [行号]}, "days": {日期: [首行, 末行]}}"""
+    keys: dict[str, list[int]] = {}
+    days: dict[str, list[int]] = {}
+    for i, row in enumerate(rows):
+        keys.setdefault(str(row[4]), []).append(i)
+        span = days.setdefault(str(row[2])[:10], [i, i])
+        span[1] = i
+    return {'rows': rows, 'keys': keys, 'days': days}
+
+
+def _read_lookup(path: Path) -> Optional[dict]:
+    """读取 .lookup；缺失或损坏时返回 None（查询退回 .idx）"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lookup: dict = json.load(f)
+        if not all(isinstance(lookup.get(k), (list, dict)) for k in ('rows', 'keys', 'days')):
+            return None
+        return lookup
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _lookup_candidates(lookup: dict, query: '_HistoryQuery') -> list[int]:
+    """按变量名、日期行号表取候选行号（最新在前），其余条件由 query.match 判断"""
+    rows = lookup['rows']
+    lo, hi = 0, len(rows) - 1
+    if query.since:
+        day = query.since[:10]
+        lo = min((s[0] for d, s in lookup['days'].items() if d >= day), default=len(rows))
+    if query.until:
+        day = query.until[:10]
+        hi = max((s[1] for d, s in lookup['days'].items() if d <= day), default=-1)
+    if not query.key:
+        return list(range(hi, lo - 1, -1))
+    if any(c in query.key for c in '*?['):
+        pattern = query.key
+        ids = sorted(
+            i for k, found in lookup['keys'].items()
+            if fnmatchcase(k, pattern) for i in found
+        )
+    else:
+        ids = lookup['keys'].get(query.key, [])
+    return [i for i in reversed(ids) if lo <= i <= hi]
+
+
+_RELATIVE_TIME = re.compile(r'^(\d+)([smhdw])$')
+_RELATIVE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_time_bound(value: str) -> str:
+    """把时间参数规范为可与记录时间戳按前缀比较的 ISO 字符串
+
+    支持 ISO 日期/时间（'2026-10-01'、'2026-10-01T12:00'）
+    和相对时长（'30m'、'12h'、'7d'、'2w'，相对当前时间）。
+
+    Raises:
+        EVMError: 无法解析
+    """
+    from datetime import datetime, timedelta
+
+    value = value.strip()
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        delta = timedelta(**{_RELATIVE_UNITS[match.group(2)]: int(match.group(1))})
+        return (datetime.now() - delta).isoformat(timespec='seconds')
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise EVMError(
+            f"Invalid time '{value}': use YYYY-MM-DD[THH:MM[:SS]] or 30m/12h/7d/2w"
+        )
+    return value.replace(' ', 'T')
+
+
+class _HistoryQuery:
+    """history 查询条件（时间按给定精度做前缀比较）"""
+
+    def __init__(
+        self,
+        key: Optional[str] = None,
+        operation: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ):
+        self.key = key
+        self.operation = operation
+        self.status = status
+        self.since = since
+        self.until = until
+
+    def before_since(self, ts: str) -> bool:
+        """记录早于 since（更旧的记录无需再看）"""
+        return self.since is not None and ts[:len(self.since)] < self.since
+
+    def match(self, ts: str, op: str, key: str, status: str) -> bool:
+        """除 since 之外的条件是否全部满足"""
+        if self.until and ts[:len(self.until)] > self.until:
+            return False
+        if self.operation and op != self.operation:
+            return False
+        if self.status and status != self.status:
+            return False
+        if self.key and not fnmatchcase(str(key), self.key):
+            return False
+        return True
@@ -7,10 +7,13 @@ EVM 导入导出 Mixin
 
 import json
 import shlex
+from collections import deque
+from collections.abc import Iterable, Iterator
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TextIO
 
 from ._schema import VALID_KEY_PATTERN
+from ._storage import ChangeTrackingDict
 from ._typing import EnvironmentManagerProtocol
 from .exceptions import (
     BackupError,
@@ -39,6 +42,93 @@ def _parse_env_value(raw: str) -> str:
     return stripped
 
 
+def _closing_quote(text: str, quote: str) -> int:
+    """text 中第一个未转义的 quote 的位置，没有时返回 -1
+
+    单引号内不处理转义；双引号前有奇数个反斜杠时视为转义。
+    """
+    if quote == "'":
+        return text.find("'")
+    pos = text.find('"')
+    while pos >= 0:
+        start = pos
+        while start > 0 and text[start - 1] == '\\':
+            start -= 1
+        if (pos - start) % 2 == 0:
+            return pos
+        pos = text.find('"', pos + 1)
+    return -1
+
+
+def iter_env_file(lines: Iterable[str]) -> Iterator[tuple[int, str, str]]:
+    """逐行解析 .env 内容，产出 (起始行号, key, value)
+
+    - 跳过空行、# 注释和不含 = 的行
+    - 支持 ``export KEY=value`` 前缀
+    - 引号在本行未闭合的值延续到闭合引号所在行（多行值）；
+      到文件末尾仍未闭合时，首行按字面量处理，后续行照常解析
+
+    不校验 key 名，也不做去重，由调用方处理。只保留当前多行值的行，
+    可直接传入打开的文件对象流式解析任意大的文件。
+    """
+    source = enumerate(lines, 1)
+    # 多行值未闭合时退回重新解析的行
+    backlog: deque[tuple[int, str]] = deque()
+
+    def next_line() -> Optional[tuple[int, str]]:
+        if backlog:
+            return backlog.popleft()
+        return next(source, None)
+
+    while True:
+        item = next_line()
+        if item is None:
+            return
+        lineno, line = item
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, raw_value = line.split('=', 1)
+        key = key.strip()
+        if key.startswith('export') and key[6:7].isspace():
+            key = key[6:].lstrip()
+        raw_value = raw_value.strip()
+
+        quote = raw_value[:1]
+        if quote in ('"', "'") and _closing_quote(raw_value[1:], quote) < 0:
+            continued: list[tuple[int, str]] = []
+            parts = [raw_value]
+            while True:
+                item = next_line()
+                if item is None:
+                    break
+                continued.append(item)
+                text = item[1].rstrip('\r\n')
+                parts.append(text)
+                if _closing_quote(text, quote) >= 0:
+                    break
+            if item is not None:
+                yield lineno, key, _parse_env_value('\n'.join(parts))
+                continue
+            backlog.extendleft(reversed(continued))
+        yield lineno, key, _parse_env_value(raw_value)
+
+
+def _iter_group_prefix(
+    pairs: Iterable[tuple[str, str]], group: Optional[str]
+) -> Iterator[tuple[str, str]]:
+    """为 (key, value) 流添加分组前缀（已带前缀的 key 保持不变）"""
+    if not group:
+        yield from pairs
+        return
+    prefix = f"{group}:"
+    for key, value in pairs:
+        if key.startswith(prefix):
+            yield key, value
+        else:
+            yield f"{prefix}{key}", value
+
+
 def _validate_key_name(key: str) -> bool:
     """#9: 校验环境变量 key 名是否安全"""
     return bool(VALID_KEY_PATTERN.match(key))
@@ -49,12 +139,18 @@ class IOMixin(EnvironmentManagerProtocol):
 
     # ── 格式检测与加载辅助方法 ────────────────────────────
 
-    def _detect_format(self, path: Path, format_type: Optional[str]) -> str:
+    def _detect_format(
+        self,
+        path: Path,
+        format_type: Optional[str],
+        stream: Optional[TextIO] = None,
+    ) -> str:
         """检测文件格式
 
         Args:
             path: 文件路径
             format_type: 强制指定的格式
+            stream: 已打开的文件；内容嗅探时从中读取并复位，不再重复打开
 
         Returns:
             'json', 'env', 或 'backup'
@@ -67,21 +163,30 @@ class IOMixin(EnvironmentManagerProtocol):
             return 'env'
         # 内容嗅探
         try:
-            with open(path, encoding='utf-8') as f:
-                content = f.read(100)
-                return 'json' if content.strip().startswith('{') else 'env'
+            if stream is not None:
+                content = stream.read(100)
+                stream.seek(0)
+            else:
+                with open(path, encoding='utf-8') as f:
+                    content = f.read(100)
+            return 'json' if content.strip().startswith('{') else 'env'
         except OSError:
             return 'json'
 
-    def _load_json_file(self, path: Path) -> dict:
-        """加载 JSON 文件
+    def _load_json_file(
+        self, path: Path, stream: Optional[TextIO] = None
+    ) -> dict:
+        """加载 JSON 文件（stream 为已打开的文件时直接从中读取）
 
         Raises:
             ImportFailedError: JSON 解析失败
         """
         try:
-            with open(path, encoding='utf-8') as f:
-                data = json.load(f)
+            if stream is not None:
+                data = json.load(stream)
+            else:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
             if not isinstance(data, dict):
                 raise ImportFailedError(
                     "Invalid JSON format: expected a dictionary",
@@ -105,19 +210,21 @@ class IOMixin(EnvironmentManagerProtocol):
         loaded: dict[str, str] = {}
         skipped: list[str] = []
         with open(path, encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, raw_value = line.split('=', 1)
-                        key = key.strip()
-                        if not _validate_key_name(key):
-                            skipped.append(key)
-                            continue
-                        value = _parse_env_value(raw_value)
-                        loaded[key] = value
+            for key, value in self._iter_env_pairs(f, skipped):
+                loaded[key] = value
         return loaded, skipped
 
+    @staticmethod
+    def _iter_env_pairs(
+        lines: Iterable[str], skipped: list[str]
+    ) -> Iterator[tuple[str, str]]:
+        """iter_env_file 的 (key, value) 流，无效 key 记入 skipped 并跳过"""
+        for _, key, value in iter_env_file(lines):
+            if _validate_key_name(key):
+                yield key, value
+            else:
+                skipped.append(key)
+
     def _load_nested(self, data: dict) -> tuple:
         """处理嵌套 JSON（一级 key 作为分组名）
 
@@ -141,14 +248,7 @@ class IOMixin(EnvironmentManagerProtocol):
         """为变量添加分组前缀"""
         if not group:
             return vars_dict
-        result = {}
-        prefix = f"{group}:"
-        for key, value in vars_dict.items():
-            if not key.startswith(prefix):
-                result[f"{prefix}{key}"] = value
-            else:
-                result[key] = value
-        return result
+        return dict(_iter_group_prefix(vars_dict.items(), group))
 
     # ── 导出 ──────────────────────────────────────────────
 
@@ -158,12 +258,18 @@ class IOMixin(EnvironmentManagerProtocol):
         output_file: Optional[str] = None,
         group: Optional[str] = None,
         dry_run: bool = False,
+        include_secrets: bool = False,
+        expand: bool = False,
     ) -> str:
-        """导出环境变量"""
+        """导出环境变量
+
+        include_secrets=True 时加密变量以明文导出（批量并行解密），
+        否则按存储中的密文原样导出。
+        expand=True 时导出一次性展开 {{VAR}} 模板后的值。
+        """
         if group:
             export_vars = {
-                k: v for k, v in self._env_vars.items()
-                if k.startswith(f"{group}:")
+                k: self._env_vars[k] for k in self._env_vars.group_keys(group)
             }
             if not export_vars:
                 raise GroupNotFoundError(group)
@@ -173,6 +279,20 @@ class IOMixin(EnvironmentManagerProtocol):
         if not export_vars:
             return "No environment variables to export"
 
+        if not dry_run:
+            secrets: dict[str, str] = {}
+            if include_secrets:
+                secret_keys = [
+                    k for k, v in export_vars.items() if self._is_secret(v)
+                ]
+                if secret_keys:
+                    secrets = self.get_secrets(secret_keys)
+            if expand:
+                expanded = self._expanded_values(secrets)
+                export_vars = {k: expanded[k] for k in export_vars}
+            else:
+                export_vars.update(secrets)
+
         if output_file:
             output_path = Path(output_file)
         else:
@@ -233,34 +353,40 @@ class IOMixin(EnvironmentManagerProtocol):
             )
 
         try:
-            fmt = self._detect_format(input_path, format_type)
-
-            # 加载原始数据
-            backup_timestamp = None
-            groups_detected = 0
-            skipped_keys: list[str] = []
-
-            if fmt in ['json', 'backup']:
-                data = self._load_json_file(input_path)
-
-                if nest:
-                    loaded_vars, groups_detected = self._load_nested(data)
-                elif 'variables' in data:
-                    # 备份文件格式
-                    loaded_vars = data['variables']
-                    backup_timestamp = data.get('timestamp', 'unknown')
+            with open(input_path, encoding='utf-8') as f:
+                fmt = self._detect_format(input_path, format_type, f)
+
+                # 原始数据以 (key, value) 流的形式交给 _store_pairs
+                backup_timestamp = None
+                groups_detected = 0
+                skipped_keys: list[str] = []
+
+                if fmt in ['json', 'backup']:
+                    data = self._load_json_file(input_path, f)
+
+                    if nest:
+                        data, groups_detected = self._load_nested(data)
+                    elif 'variables' in data:
+                        # 备份文件格式
+                        backup_timestamp = data.get('timestamp', 'unknown')
+                        data = data['variables']
+                    pairs: Iterable[tuple[str, str]] = data.items()
+                elif fmt == 'env':
+                    # .env 逐行解析，直接写入存储，不构建中间 dict
+                    pairs = self._iter_env_pairs(f, skipped_keys)
                 else:
-                    loaded_vars = data
-            elif fmt == 'env':
-                loaded_vars, skipped_keys = self._load_env_file(input_path)
-            else:
-                raise ImportFailedError(
-                    f"Unsupported format: {fmt}", input_file
-                )
-
-            # 添加分组前缀
-            if group and not nest:
-                loaded_vars = self._apply_group_prefix(loaded_vars, group)
+                    raise ImportFailedError(
+                        f"Unsupported format: {fmt}", input_file
+                    )
+
+                # 添加分组前缀
+                if group and not nest:
+                    pairs = _iter_group_prefix(pairs, group)
+                # 一次写入；中途解析失败时回滚内存状态
+                with self.transaction():
+                    count = self._store_pairs(pairs, replace, dry_run)
+                    if not dry_run:
+                        self._save_env_vars()
 
             # 构建消息
             parts = []
@@ -282,32 +408,27 @@ class IOMixin(EnvironmentManagerProtocol):
             if dry_run:
                 parts.append(
                     f"[DRY-RUN] Would {'replace' if replace else 'merge'} "
-                    f"{len(loaded_vars)} variables from {input_file}"
+                    f"{count} variables from {input_file}"
                 )
                 return '\n'.join(parts) if parts else (
-                    f"[DRY-RUN] Would load {len(loaded_vars)} variables"
+                    f"[DRY-RUN] Would load {count} variables"
                 )
 
-            # 应用到环境变量
             if replace:
-                self._env_vars = loaded_vars
                 parts.append(
-                    f"Replaced environment variables ({len(loaded_vars)} total)"
+                    f"Replaced environment variables ({count} total)"
                 )
             else:
-                self._env_vars.update(loaded_vars)
                 parts.append(
-                    f"Loaded {len(loaded_vars)} environment variables "
+                    f"Loaded {count} environment variables "
                     f"from {input_file}"
                 )
 
-            self._save_env_vars()
-
             if group:
                 parts.append(f"Variables added to group '{group}'")
 
             return '\n'.join(parts) if parts else (
-                f"Loaded {len(loaded_vars)} variables"
+                f"Loaded {count} variables"
             )
 
         except (ImportFailedError, ExportError):
@@ -321,6 +442,33 @@ class IOMixin(EnvironmentManagerProtocol):
                 f"IO error loading: {e}", input_file
             ) from e
 
+    def _store_pairs(
+        self,
+        pairs: Iterable[tuple[str, str]],
+        replace: bool,
+        dry_run: bool,
+    ) -> int:
+        """把 (key, value) 流逐条写入内存中的存储，返回导入的变量数（去重）
+
+        replace 时填充一个新的变量字典并整体替换；dry_run 只计数。
+        """
+        if dry_run:
+            return len({key for key, _ in pairs})
+        if replace:
+            env_vars = ChangeTrackingDict()
+            env_vars.reset = True
+            for key, value in pairs:
+                env_vars[key] = value
+            self._env_vars = env_vars
+            return len(env_vars)
+
+        seen: set[str] = set()
+        env_vars = self._env_vars
+        for key, value in pairs:
+            env_vars[key] = value
+            seen.add(key)
+        return len(seen)
+
     # ── 备份恢复 ──────────────────────────────────────────
 
     def backup(self, backup_file: Optional[str] = None) -> str:
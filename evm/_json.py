@@ -5,6 +5,8 @@ EVM JSON 输出模块
 为 Agent/程序化调用提供结构化 JSON 输出。
 设计原则: stdout 是数据 (JSON)，stderr 是日志/人类可读信息。
 
+流式命令（如 validate --stream）输出 NDJSON：每行一条记录，不带信封。
+
 JSON 信封格式:
   成功: {"status": "ok", "data": {...}}
   错误: {"status": "error", "error": "...", "error_code": N}
@@ -49,4 +51,16 @@ def json_error(message: str, error_code: int = 1, quiet: bool = False) -> None:
     )
 
 
-__all__ = ['json_output', 'json_error']
+def json_line(data: Any, quiet: bool = False) -> None:
+    """输出一行 NDJSON 记录到 stdout（流式输出，不带信封，立即 flush）
+
+    Args:
+        data: 单条记录
+        quiet: 若为 True 则不输出
+    """
+    if quiet:
+        return
+    print(json.dumps(data, ensure_ascii=False, default=str), flush=True)
+
+
+__all__ = ['json_output', 'json_error', 'json_line']
@@ -4,13 +4,16 @@ EVM Schema Mixin
 
 变量 schema 定义和校验功能。
 支持格式：url, email, port, integer, boolean, path, ipv4, ipv6
+
+校验走 CompiledSchema：格式校验函数与自定义正则按 schema 文件
+(路径, inode, mtime, size) 在进程内只编译一次。
 """
 
-import ipaddress
 import json
 import os
 import re
 import warnings
+from collections.abc import Callable, Iterator
 from pathlib import Path
 from typing import Optional
 
@@ -41,6 +44,8 @@ VALID_KEY_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(?::[A-Za-z_][A-Za-z0-9_
 
 def validate_ipv6(value: str) -> bool:
     """#7: 使用标准库 ipaddress 校验 IPv6 地址"""
+    import ipaddress
+
     try:
         ipaddress.IPv6Address(value)
         return True
@@ -48,6 +53,137 @@ def validate_ipv6(value: str) -> bool:
         return False
 
 
+# 格式名 → 校验函数（返回真值表示通过）
+FORMAT_VALIDATORS: dict[str, Callable[[str], object]] = {
+    name: pattern.match for name, pattern in FORMAT_PATTERNS.items()
+}
+FORMAT_VALIDATORS['ipv6'] = validate_ipv6
+
+# 单条规则：(required, [(校验函数, 描述)], 固定错误)
+_Rule = tuple[bool, tuple[tuple[Callable[[str], object], str], ...], tuple[str, ...]]
+
+
+def _compile_entry(entry: dict) -> _Rule:
+    """把一条 schema 定义编译为校验规则"""
+    checks = []
+    static_errors: tuple[str, ...] = ()
+    fmt = entry.get('format')
+    if fmt in FORMAT_VALIDATORS:
+        checks.append((FORMAT_VALIDATORS[fmt], f"format '{fmt}'"))
+    pattern = entry.get('pattern')
+    if pattern:
+        try:
+            checks.append((re.compile(pattern).match, f"pattern '{pattern}'"))
+        except re.error:
+            static_errors = (f"Invalid schema regex: '{pattern}'",)
+    return bool(entry.get('required', False)), tuple(checks), static_errors
+
+
+def _check_rule(rule: _Rule, value: str) -> dict:
+    """用编译后的规则校验单个值"""
+    errors = [
+        f"Value '{value}' does not match {label}"
+        for check, label in rule[1]
+        if not check(value)
+    ]
+    errors.extend(rule[2])
+    return {'valid': not errors, 'errors': errors, 'warnings': []}
+
+
+def _missing_result(key: str, required: bool) -> dict:
+    """变量未设置时的校验结果"""
+    if required:
+        return {
+            'valid': False,
+            'errors': [f"Required variable '{key}' is not set"],
+            'warnings': [],
+        }
+    return {
+        'valid': True, 'errors': [],
+        'warnings': ['Variable not set (not required)'],
+    }
+
+
+class CompiledSchema:
+    """预编译的 schema
+
+    entries 为原始定义（只读使用）；每个 key 的格式校验函数和
+    自定义正则在构造时编译一次。
+    """
+
+    __slots__ = ('entries', '_rules')
+
+    def __init__(self, entries: dict):
+        self.entries = entries
+        self._rules = {key: _compile_entry(entry) for key, entry in entries.items()}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rules
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def check(self, key: str, value: str) -> dict:
+        """校验 key 的值"""
+        return _check_rule(self._rules[key], value)
+
+    def check_missing(self, key: str) -> dict:
+        """key 未设置时的结果"""
+        return _missing_result(key, self._rules[key][0])
+
+    def iter_validate(self, env_vars: dict) -> Iterator[tuple[str, dict]]:
+        """按定义顺序逐个产出 (key, result)"""
+        for key, rule in self._rules.items():
+            if key in env_vars:
+                yield key, _check_rule(rule, str(env_vars[key]))
+            else:
+                yield key, _missing_result(key, rule[0])
+
+    def validate_all(self, env_vars: dict) -> dict[str, dict]:
+        """校验所有有 schema 定义的变量"""
+        return dict(self.iter_validate(env_vars))
+
+
+# 进程池模式下每个任务包含的 schema 条目数
+VALIDATE_CHUNK_SIZE = 2000
+
+
+def _validate_chunk(entries: dict, values: dict) -> list[tuple[str, dict]]:
+    """进程池任务：在子进程内编译并校验一段 schema"""
+    return list(CompiledSchema(entries).iter_validate(values))
+
+
+def _iter_validate_parallel(
+    entries: dict, env_vars: dict, workers: int, chunk_size: int
+) -> Iterator[tuple[str, dict]]:
+    """分块提交到进程池，按原顺序逐块产出结果
+
+    生成器被提前关闭（如 fail-fast）时取消尚未开始的分块。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = list(entries)
+    chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+    try:
+        futures = [
+            pool.submit(
+                _validate_chunk,
+                {k: entries[k] for k in chunk},
+                {k: env_vars[k] for k in chunk if k in env_vars},
+            )
+            for chunk in chunks
+        ]
+        for future in futures:
+            yield from future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# schema 文件路径 → ((inode, mtime_ns, size), CompiledSchema)
+_SCHEMA_CACHE: dict[str, tuple[tuple[int, int, int], CompiledSchema]] = {}
+
+
 class SchemaMixin(EnvironmentManagerProtocol):
     """Schema mixin — 变量格式定义和校验"""
 
@@ -84,9 +220,29 @@ class SchemaMixin(EnvironmentManagerProtocol):
             )
             return {}
 
+    def _compiled_schema(self) -> CompiledSchema:
+        """获取编译后的 schema（按文件签名缓存，文件未变化时不重新读取）"""
+        schema_file = self._get_schema_file()
+        try:
+            st = os.stat(schema_file)
+        except FileNotFoundError:
+            return CompiledSchema({})
+        except OSError:
+            return CompiledSchema(self._load_schema())
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cache_key = str(schema_file)
+        cached = _SCHEMA_CACHE.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        compiled = CompiledSchema(self._load_schema())
+        _SCHEMA_CACHE[cache_key] = (signature, compiled)
+        return compiled
+
     def _save_schema(self, schema: dict) -> None:
         """保存 schema 定义"""
         schema_file = self._get_schema_file()
+        # mtime 精度不足时签名可能不变，写入前主动失效
+        _SCHEMA_CACHE.pop(str(schema_file), None)
         try:
             with open(schema_file, 'w', encoding='utf-8') as f:
                 json.dump(schema, f, indent=2, ensure_ascii=False)
@@ -114,11 +270,10 @@ class SchemaMixin(EnvironmentManagerProtocol):
         Returns:
             确认消息
         """
-        available_formats = list(FORMAT_PATTERNS.keys()) + ['ipv6']
-        if format and format not in available_formats:
+        if format and format not in FORMAT_VALIDATORS:
             raise SchemaError(
                 f"Unknown format '{format}'. "
-                f"Available: {', '.join(sorted(available_formats))}",
+                f"Available: {', '.join(sorted(FORMAT_VALIDATORS))}",
                 key,
             )
 
@@ -180,86 +335,45 @@ class SchemaMixin(EnvironmentManagerProtocol):
         Returns:
             {'valid': bool, 'errors': [...], 'warnings': [...]}
         """
-        schema = self._load_schema()
+        schema = self._compiled_schema()
         if key not in schema:
             raise SchemaError(f"No schema defined for '{key}'", key)
 
         if value is None:
             if key not in self._env_vars:
-                entry = schema[key]
-                if entry.get('required', False):
-                    return {
-                        'valid': False,
-                        'errors': [f"Required variable '{key}' is not set"],
-                        'warnings': [],
-                    }
-                return {
-                    'valid': True, 'errors': [],
-                    'warnings': ['Variable not set (not required)'],
-                }
+                return schema.check_missing(key)
             value = self._env_vars[key]
 
-        return self._validate_value(key, str(value), schema[key])
+        return schema.check(key, str(value))
 
     def validate_all(self) -> dict[str, dict]:
         """校验所有有 schema 定义的变量"""
-        schema = self._load_schema()
-        results = {}
-
-        for key, entry in schema.items():
-            if key in self._env_vars:
-                results[key] = self._validate_value(
-                    key, str(self._env_vars[key]), entry
-                )
-            elif entry.get('required', False):
-                results[key] = {
-                    'valid': False,
-                    'errors': [f"Required variable '{key}' is not set"],
-                    'warnings': [],
-                }
-            else:
-                results[key] = {
-                    'valid': True,
-                    'errors': [],
-                    'warnings': ['Variable not set (not required)'],
-                }
+        return self._compiled_schema().validate_all(self._env_vars)
+
+    def iter_validate(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = VALIDATE_CHUNK_SIZE,
+    ) -> Iterator[tuple[str, dict]]:
+        """流式校验所有有 schema 定义的变量
+
+        按 schema 定义顺序逐个产出 (key, result)，调用方可随时停止迭代。
 
-        return results
+        Args:
+            workers: 进程数；None/0/1 在当前进程串行校验，
+                大于 1 时按 chunk_size 分块提交到进程池
+            chunk_size: 每个进程池任务的条目数
+        """
+        schema = self._compiled_schema()
+        if not workers or workers <= 1 or len(schema) <= chunk_size:
+            yield from schema.iter_validate(self._env_vars)
+            return
+        yield from _iter_validate_parallel(
+            schema.entries, dict(self._env_vars), workers, chunk_size
+        )
 
     def _validate_value(
         self, key: str, value: str, entry: dict
     ) -> dict:
-        """内部：校验单个值"""
-        errors: list[str] = []
-        warnings: list[str] = []
-
-        # 格式校验
-        fmt = entry.get('format')
-        if fmt == 'ipv6':
-            # #7: 使用 ipaddress 标准库校验
-            if not validate_ipv6(value):
-                errors.append(
-                    f"Value '{value}' does not match format 'ipv6'"
-                )
-        elif fmt and fmt in FORMAT_PATTERNS:
-            if not FORMAT_PATTERNS[fmt].match(value):
-                errors.append(
-                    f"Value '{value}' does not match format '{fmt}'"
-                )
-
-        # 自定义正则校验
-        pattern = entry.get('pattern')
-        if pattern:
-            try:
-                if not re.match(pattern, value):
-                    errors.append(
-                        f"Value '{value}' does not match pattern '{pattern}'"
-                    )
-            except re.error:
-                errors.append(f"Invalid schema regex: '{pattern}'")
-
-        return {
-            'valid': len(errors) == 0,
-            'errors': errors,
-            'warnings': warnings,
-        }
+        """内部：按单条 schema 定义校验单个值"""
+        return _check_rule(_compile_entry(entry), value)
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+EVM 存储引擎辅助
+
+- ChangeTrackingDict: 记录自上次提交以来的修改（set/delete 增量）
+- WAL: 追加式写前日志 env.wal（JSON Lines），与 env.json 快照配合使用
+- 进程级解析缓存：按存储签名复用已解析的数据，重复构造管理器不再解析 JSON
+
+WAL 记录格式（每行一条）:
+  {"op": "set", "key": "K", "value": "V"}
+  {"op": "delete", "key": "K"}
+
+加载时先读快照，再按顺序重放 WAL；日志超过阈值后压缩为新快照。
+"""
+
+import json
+import os
+import time
+from collections.abc import Callable, ItemsView, Iterator
+from pathlib import Path
+from typing import Any, Optional
+
+from .exceptions import CorruptedStorageError
+
+# 支持的存储引擎
+STORAGE_ENGINES = ('json', 'wal')
+
+# WAL 压缩阈值：日志至少达到该字节数，且超过快照大小的该比例时压缩
+WAL_COMPACT_MIN_BYTES = 64 * 1024
+WAL_COMPACT_RATIO = 0.5
+
+# 增量中表示"已删除"的哨兵
+DELETED: Any = object()
+
+# 进程级解析缓存最多保留的存储数（0 表示关闭）
+STORE_CACHE_SIZE = 16
+
+# 解析时存储文件的 mtime 距今不足该纳秒数则不缓存：同一时间戳刻度内
+# 大小不变的原地改写无法从签名区分（同 git 的 "racy clean" 问题）
+STORE_CACHE_RACY_NS = 2_000_000_000
+
+
+def _group_add(groups: dict[str, dict[str, None]], key: str) -> None:
+    """把 key 登记到分组索引（无冒号的 key 不属于任何分组）"""
+    if ':' in key:
+        groups.setdefault(key.split(':', 1)[0], {})[key] = None
+
+
+def _group_remove(groups: dict[str, dict[str, None]], key: str) -> None:
+    """从分组索引移除 key；分组变空时一并删除"""
+    if ':' in key:
+        group = key.split(':', 1)[0]
+        members = groups.get(group)
+        if members is not None:
+            members.pop(key, None)
+            if not members:
+                del groups[group]
+
+
+class ChangeTrackingDict(dict):
+    """记录修改增量的 dict
+
+    ``changes`` 为 ``{key: value 或 DELETED}``，按最后一次修改为准；
+    ``reset`` 为 True 表示整体被清空/替换，需要写完整快照；
+    ``keys_changed`` 为 True 表示 key 集合有增删（仅改值时为 False）。
+    提交成功后调用 ``mark_committed()`` 清空记录。
+    ``on_change`` 在每次修改后以 key 调用（clear 时为 None），
+    供模板解析缓存等派生数据增量失效。
+
+    分组索引（group → 有序 key 集合）在首次分组查询时构建，
+    之后随每次增删增量维护，分组列出/计数/删除为 O(分组大小)。
+    casefold 索引同样按需构建、增量维护，重复搜索不再逐条转小写。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changes: dict[str, Any] = {}
+        self.reset = False
+        self.keys_changed = False
+        self.on_change: Optional[Callable[[Optional[str]], None]] = None
+        # 顶层分组名 → {key: None}（dict 作有序集合，保持插入顺序）
+        self._groups: Optional[dict[str, dict[str, None]]] = None
+        # key → (key.casefold(), str(value).casefold())，供不区分大小写的搜索
+        self._folded: Optional[dict[str, tuple[str, str]]] = None
+
+    # ── 分组索引 ──────────────────────────────────────────
+
+    def _group_index(self) -> dict[str, dict[str, None]]:
+        """按需构建分组索引"""
+        if self._groups is None:
+            groups: dict[str, dict[str, None]] = {}
+            for key in self:
+                group, sep, _ = key.partition(':')
+                if sep:
+                    members = groups.get(group)
+                    if members is None:
+                        groups[group] = {key: None}
+                    else:
+                        members[key] = None
+            self._groups = groups
+        return self._groups
+
+    def group_keys(self, group: str) -> list[str]:
+        """分组内的 key（按插入顺序）；支持 'a:b' 形式的嵌套分组"""
+        top, sep, _ = group.partition(':')
+        members = self._group_index().get(top)
+        if not members:
+            return []
+        if not sep:
+            return list(members)
+        prefix = f"{group}:"
+        return [k for k in members if k.startswith(prefix)]
+
+    def group_counts(self) -> dict[str, int]:
+        """{顶层分组名: 变量数}"""
+        return {g: len(members) for g, members in self._group_index().items()}
+
+    def folded_items(self) -> ItemsView[str, tuple[str, str]]:
+        """(key, (casefold 后的 key, casefold 后的 value))，按需构建"""
+        if self._folded is None:
+            self._folded = {
+                key: (key.casefold(), str(value).casefold())
+                for key, value in self.items()
+            }
+        return self._folded.items()
+
+    def rebase(self, base: dict[str, str]) -> list[str]:
+        """把他人已提交的状态并入内存，本地增量保留在其上
+
+        不在 ``changes`` 中的 key 与 base 对齐（新增、修改、删除），
+        这些调整不记录为本地增量；分组/casefold 索引与 on_change 照常维护。
+
+        Returns:
+            被调整的 key
+        """
+        changes = self.changes
+        touched = [
+            key for key in self if key not in base and key not in changes
+        ]
+        for key in touched:
+            dict.__delitem__(self, key)
+            if self._groups is not None:
+                _group_remove(self._groups, key)
+            if self._folded is not None:
+                self._folded.pop(key, None)
+        for key, value in base.items():
+            if key in changes:
+                continue
+            if key in self:
+                if dict.__getitem__(self, key) == value:
+                    continue
+            elif self._groups is not None:
+                _group_add(self._groups, key)
+            dict.__setitem__(self, key, value)
+            if self._folded is not None:
+                self._folded[key] = (key.casefold(), str(value).casefold())
+            touched.append(key)
+        if self.on_change is not None:
+            for key in touched:
+                self.on_change(key)
+        return touched
+
+    def mark_committed(self) -> None:
+        """清空增量记录"""
+        self.changes = {}
+        self.reset = False
+        self.keys_changed = False
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.keys_changed = True
+            if self._groups is not None:
+                _group_add(self._groups, key)
+        super().__setitem__(key, value)
+        self.changes[key] = value
+        if self._folded is not None:
+            self._folded[key] = (key.casefold(), str(value).casefold())
+        if self.on_change is not None:
+            self.on_change(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changes[key] = DELETED
+        self.keys_changed = True
+        if self._groups is not None:
+            _group_remove(self._groups, key)
+        if self._folded is not None:
+            self._folded.pop(key, None)
+        if self.on_change is not None:
+            self.on_change(key)
+
+    def pop(self, key, *default):
+        had = key in self
+        value = super().pop(key, *default)
+        if had:
+            self.changes[key] = DELETED
+            self.keys_changed = True
+            if self._groups is not None:
+                _group_remove(self._groups, key)
+            if self._folded is not None:
+                self._folded.pop(key, None)
+            if self.on_change is not None:
+                self.on_change(key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.changes[key] = DELETED
+        self.keys_changed = True
+        if self._groups is not None:
+            _group_remove(self._groups, key)
+        if self._folded is not None:
+            self._folded.pop(key, None)
+        if self.on_change is not None:
+            self.on_change(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __or__(self, other: Any) -> dict:
+        # 行为同 dict（返回普通 dict，不记录修改）；显式声明使 __ior__ 签名与之匹配
+        return dict.__or__(self, other)
+
+    def __ior__(self, other: Any) -> 'ChangeTrackingDict':
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self.changes = {}
+        self.reset = True
+        self.keys_changed = True
+        if self._groups is not None:
+            self._groups = {}
+        if self._folded is not None:
+            self._folded = {}
+        if self.on_change is not None:
+            self.on_change(None)
+
+
+# ── WAL ─────────────────────────────────────────────────────
+
+
+def wal_path(env_file: Path) -> Path:
+    """WAL 文件路径（与 env.json 同目录：env.json → env.wal）"""
+    return env_file.with_suffix('.wal')
+
+
+def file_signature(path: Path) -> Optional[tuple[int, int, int]]:
+    """(inode, size, mtime_ns)；文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def store_signature(env_file: Path) -> tuple:
+    """存储签名：env.json 与 env.wal 的 file_signature，任一变化即视为外部修改"""
+    return (file_signature(env_file), file_signature(wal_path(env_file)))
+
+
+# ── 进程级解析缓存 ──────────────────────────────────────────
+
+# 绝对路径 → (存储签名, 解析结果)；解析结果放入缓存后不再修改
+_store_cache: dict[str, tuple[tuple, dict[str, str]]] = {}
+
+
+def cached_store(env_file: Path, signature: tuple) -> Optional[dict[str, str]]:
+    """签名一致时返回已解析的数据
+
+    返回的是与缓存共享的对象，调用方必须复制后再修改。
+    """
+    entry = _store_cache.get(os.path.abspath(env_file))
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    return None
+
+
+def remember_store(
+    env_file: Path, signature: tuple, data: dict[str, str]
+) -> None:
+    """缓存解析结果（data 此后不得再修改）
+
+    存储不存在或刚被修改过（见 STORE_CACHE_RACY_NS）时不缓存；
+    超出 STORE_CACHE_SIZE 时淘汰最早的条目。
+    """
+    mtimes = [sig[2] for sig in signature if sig is not None]
+    if (
+        STORE_CACHE_SIZE <= 0
+        or not mtimes
+        or time.time_ns() - max(mtimes) < STORE_CACHE_RACY_NS
+    ):
+        return
+    key = os.path.abspath(env_file)
+    _store_cache.pop(key, None)
+    _store_cache[key] = (signature, data)
+    while len(_store_cache) > STORE_CACHE_SIZE:
+        try:
+            del _store_cache[next(iter(_store_cache))]
+        except (KeyError, RuntimeError, StopIteration):
+            break  # 其他线程同时在淘汰
+
+
+def forget_store(env_file: Path) -> None:
+    """丢弃缓存（本进程写入存储后调用）"""
+    _store_cache.pop(os.path.abspath(env_file), None)
+
+
+def change_records(changes: dict[str, Any]) -> list[dict]:
+    """把增量转换为 WAL 记录"""
+    records = []
+    for key, value in changes.items():
+        if value is DELETED:
+            records.append({'op': 'delete', 'key': key})
+        else:
+            records.append({'op': 'set', 'key': key, 'value': value})
+    return records
+
+
+def iter_wal(path: Path) -> Iterator[dict]:
+    """按顺序读取 WAL 记录
+
+    崩溃留下的不完整末行（无换行结尾）会被忽略。
+
+    Raises:
+        CorruptedStorageError: 中间某行无法解析
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    lines = data.split(b'\n')
+    # 最后一段若非空，说明末行未写完，丢弃
+    for lineno, raw in enumerate(lines[:-1], 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise CorruptedStorageError(
+                f"WAL is corrupted at line {lineno}: {e}. File: {path}"
+            ) from e
+        yield record
+
+
+def replay_wal(env_vars: dict[str, str], path: Path) -> int:
+    """把 WAL 重放到 env_vars 上，返回应用的记录数"""
+    count = 0
+    for record in iter_wal(path):
+        if not isinstance(record, dict) or not isinstance(record.get('key'), str):
+            raise CorruptedStorageError(
+                f"WAL record has no valid key: {record!r}. File: {path}"
+            )
+        op = record.get('op')
+        key = record['key']
+        if op == 'set':
+            value = record.get('value')
+            if not isinstance(value, str):
+                raise CorruptedStorageError(
+                    f"WAL record for '{key}' has invalid value. File: {path}"
+                )
+            env_vars[key] = value
+        elif op == 'delete':
+            env_vars.pop(key, None)
+        else:
+            raise CorruptedStorageError(
+                f"Unknown WAL operation '{op}'. File: {path}"
+            )
+        count += 1
+    return count
+
+
+def append_wal(path: Path, records: list[dict]) -> int:
+    """追加记录到 WAL（单次 write + fsync），返回追加后的文件大小
+
+    调用方须已持有存储 .lock 排他锁。
+    若上次写入在末行中途崩溃，先截掉残缺末行再追加。
+    """
+    data = ''.join(
+        json.dumps(r, ensure_ascii=False) + '\n' for r in records
+    ).encode('utf-8')
+    fd = os.open(str(path), os.O_CREAT | os.O_RDWR | os.O_APPEND, 0o600)
+    try:
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b'\n':
+            _truncate_torn_tail(fd, size)
+        os.write(fd, data)
+        os.fsync(fd)
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+
+def _truncate_torn_tail(fd: int, size: int) -> None:
+    """截断到最后一个完整行"""
+    chunk = 4096
+    end = size
+    while end > 0:
+        start = max(0, end - chunk)
+        block = os.pread(fd, end - start, start)
+        idx = block.rfind(b'\n')
+        if idx >= 0:
+            os.ftruncate(fd, start + idx + 1)
+            return
+        end = start
+    os.ftruncate(fd, 0)
+
+
+def should_compact(wal_size: int, snapshot_size: int) -> bool:
+    """日志是否已大到需要压缩为新快照"""
+    return (
+        wal_size >= WAL_COMPACT_MIN_BYTES
+        and wal_size > snapshot_size * WAL_COMPACT_RATIO
+    )
+
+
+__all__ = [
+    'STORAGE_ENGINES',
+    'WAL_COMPACT_MIN_BYTES',
+    'WAL_COMPACT_RATIO',
+    'STORE_CACHE_SIZE',
+    'STORE_CACHE_RACY_NS',
+    'DELETED',
+    'ChangeTrackingDict',
+    'wal_path',
+    'file_signature',
+    'store_signature',
+    'cached_store',
+    'remember_store',
+    'forget_store',
+    'change_records',
+    'iter_wal',
+    'replay_wal',
+    'append_wal',
+    'should_compact',
+]
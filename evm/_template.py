@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+EVM 模板展开
+
+解析变量值中的 {{OTHER_VAR}} 引用。引用关系按需构建成图，
+按拓扑序（DFS 后序）展开并缓存每个变量的结果：
+- 菱形引用只展开一次，展开整个存储为 O(V+E)
+- 循环引用抛出 TemplateCycleError 并给出完整环路
+- 变量修改时只让它本身及（传递）引用它的变量的缓存失效
+"""
+
+import re
+from typing import Optional
+
+from .exceptions import KeyNotFoundError, TemplateCycleError
+
+TEMPLATE_PATTERN = re.compile(r'\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}')
+
+
+class TemplateResolver:
+    """带缓存的模板解析器
+
+    绑定到一个变量字典；字典修改后需调用 invalidate(key)
+    （ChangeTrackingDict 通过 on_change 回调自动完成）。
+    未定义的引用原样保留。
+    """
+
+    def __init__(self, env_vars: dict[str, str]):
+        self.env_vars = env_vars
+        # key → 值中引用的 key（去重、保持顺序）
+        self._refs: dict[str, tuple[str, ...]] = {}
+        # key → 引用了它的 key（反向边，用于增量失效）
+        self._dependents: dict[str, set[str]] = {}
+        self._expanded: dict[str, str] = {}
+
+    def _references(self, key: str) -> tuple[str, ...]:
+        """解析并缓存 key 的引用列表，同时登记反向边"""
+        refs = self._refs.get(key)
+        if refs is None:
+            refs = tuple(dict.fromkeys(
+                TEMPLATE_PATTERN.findall(str(self.env_vars[key]))
+            ))
+            self._refs[key] = refs
+            for ref in refs:
+                self._dependents.setdefault(ref, set()).add(key)
+        return refs
+
+    def _substitute(self, key: str) -> str:
+        """用已展开的依赖替换 key 的值（依赖必须已在缓存中）"""
+        value = self.env_vars[key]
+        if not self._refs[key]:
+            return value
+        expanded = self._expanded
+        return TEMPLATE_PATTERN.sub(
+            lambda m: expanded.get(m.group(1), m.group(0)), value
+        )
+
+    def resolve(self, key: str) -> str:
+        """展开单个变量
+
+        Raises:
+            KeyNotFoundError: key 不存在
+            TemplateCycleError: 存在循环引用
+        """
+        cached = self._expanded.get(key)
+        if cached is not None:
+            return cached
+        if key not in self.env_vars:
+            raise KeyNotFoundError(key)
+
+        # 迭代 DFS：后序出栈即拓扑序，深引用链不受递归深度限制
+        path = [key]
+        on_path = {key: 0}
+        stack = [(key, iter(self._references(key)))]
+        while stack:
+            node, refs = stack[-1]
+            for ref in refs:
+                if ref in self._expanded or ref not in self.env_vars:
+                    continue
+                if ref in on_path:
+                    raise TemplateCycleError(path[on_path[ref]:] + [ref])
+                on_path[ref] = len(path)
+                path.append(ref)
+                stack.append((ref, iter(self._references(ref))))
+                break
+            else:
+                stack.pop()
+                path.pop()
+                del on_path[node]
+                self._expanded[node] = self._substitute(node)
+        return self._expanded[key]
+
+    def resolve_all(self) -> dict[str, str]:
+        """展开全部变量（每个变量、每条引用只处理一次）"""
+        for key in self.env_vars:
+            if key not in self._expanded:
+                self.resolve(key)
+        return {key: self._expanded[key] for key in self.env_vars}
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """key 被修改/删除后调用；None 表示整体失效"""
+        if key is None:
+            self._refs.clear()
+            self._dependents.clear()
+            self._expanded.clear()
+            return
+
+        for ref in self._refs.pop(key, ()):
+            dependents = self._dependents.get(ref)
+            if dependents is not None:
+                dependents.discard(key)
+
+        # key 本身总是向下传播（它此前可能不存在，引用它的值缓存的是原文）；
+        # 其余节点未缓存时，引用它的节点也不可能有缓存，可以剪枝
+        self._expanded.pop(key, None)
+        pending = list(self._dependents.get(key, ()))
+        seen = {key}
+        while pending:
+            dep = pending.pop()
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if self._expanded.pop(dep, None) is not None:
+                pending.extend(self._dependents.get(dep, ()))
+
+
+__all__ = ['TEMPLATE_PATTERN', 'TemplateResolver']
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+EVM 值的三元组（trigram）索引
+
+`search --value` 的子串匹配默认要把每个值转小写再逐条查找；存储较大
+（证书、JSON 配置）时改为先用三元组索引筛出候选 key，只对候选做精确匹配。
+
+索引按字节三元组（值 casefold 后的 UTF-8）散列到 2 的幂个桶，每个桶是一张
+key 位图；查询时把子串各三元组所在桶的位图按位与，得到候选 key。散列冲突
+只会带来误报，候选总要再做精确匹配。
+
+- env.trgm: 首行 JSON 头 {"version", "source", "keys", "buckets"}，
+  其后依次为各桶位图（每张 ceil(len(keys) / 8) 字节，小端），重建时原子写入
+- env.trgm.log: 每次提交在 .lock 下追加一行
+  {"keys": [本次修改的 key], "source": 写入后的存储签名}；
+  这些 key 视为"脏"，总是作为候选参与精确匹配
+- source 为 env.json / env.wal 的存储签名（见 _storage.store_signature）；
+  与当前存储不一致（外部编辑、未记录日志的写入、崩溃）时整体重建
+- 存储文件总大小达到 $EVM_TRIGRAM_MIN_BYTES（默认 1 MiB）时自动启用；
+  脏 key 过多时在下一次搜索时重建
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+# 索引文件格式版本
+TRIGRAM_VERSION = 1
+
+# 自动启用索引的存储大小（env.json + env.wal 字节数）
+TRIGRAM_MIN_BYTES = 1024 * 1024
+
+# 桶数范围：取值平均字节数的 2 倍向上取 2 的幂，限制在此区间
+TRIGRAM_MIN_BUCKETS = 64
+TRIGRAM_MAX_BUCKETS = 4096
+
+# 脏 key 超过 REBUILD_MIN_DIRTY + key 总数 × REBUILD_RATIO 时重建
+TRIGRAM_REBUILD_MIN_DIRTY = 256
+TRIGRAM_REBUILD_RATIO = 0.1
+
+
+def trigram_index_path(env_file: Path) -> Path:
+    """基础索引路径（env.json → env.trgm）"""
+    return env_file.with_suffix('.trgm')
+
+
+def trigram_log_path(env_file: Path) -> Path:
+    """增量日志路径（env.json → env.trgm.log）"""
+    return env_file.with_suffix('.trgm.log')
+
+
+def trigram_min_bytes() -> int:
+    """启用阈值，$EVM_TRIGRAM_MIN_BYTES 覆盖默认值（无效值按默认处理）"""
+    try:
+        return int(os.environ.get('EVM_TRIGRAM_MIN_BYTES', TRIGRAM_MIN_BYTES))
+    except ValueError:
+        return TRIGRAM_MIN_BYTES
+
+
+def trigram_buckets(data: bytes, count: int) -> set[int]:
+    """data 中全部字节三元组落入的桶（count 为 2 的幂）"""
+    mask = count - 1
+    return {
+        ((a << 16 | b << 8 | c) * 0x9E3779B1 >> 13) & mask
+        for a, b, c in set(zip(data, data[1:], data[2:]))
+    }
+
+
+def _as_source(raw: object) -> Optional[tuple]:
+    """把 JSON 中的签名还原为 store_signature() 的元组形式"""
+    if not isinstance(raw, list):
+        return None
+    return tuple(tuple(sig) if isinstance(sig, list) else None for sig in raw)
+
+
+class TrigramIndex:
+    """三元组桶位图索引 + 脏 key 集合
+
+    candidates() 返回的是候选集（可能有误报，不会漏报），
+    调用方必须对候选值再做一次精确匹配。
+    """
+
+    def __init__(
+        self,
+        keys: list[str],
+        buckets: int,
+        bitmaps: bytes,
+        source: Optional[tuple],
+        dirty: Optional[set[str]] = None,
+    ):
+        self.keys = keys
+        self.buckets = buckets
+        self.bitmaps = bitmaps
+        self.source = source
+        self.dirty: set[str] = dirty if dirty is not None else set()
+        self._stride = (len(keys) + 7) // 8
+
+    @classmethod
+    def build(cls, env_vars: dict[str, str], source: tuple) -> 'TrigramIndex':
+        """从当前变量整体构建"""
+        keys = list(env_vars)
+        encoded = [str(env_vars[key]).casefold().encode('utf-8') for key in keys]
+        average = sum(map(len, encoded)) // max(len(keys), 1)
+        buckets = TRIGRAM_MIN_BUCKETS
+        while buckets < 2 * average and buckets < TRIGRAM_MAX_BUCKETS:
+            buckets *= 2
+
+        stride = (len(keys) + 7) // 8
+        bitmaps = bytearray(stride * buckets)
+        for i, data in enumerate(encoded):
+            offset, bit = i >> 3, 1 << (i & 7)
+            for bucket in trigram_buckets(data, buckets):
+                bitmaps[bucket * stride + offset] |= bit
+        return cls(keys, buckets, bytes(bitmaps), source)
+
+    @classmethod
+    def load(cls, env_file: Path) -> Optional['TrigramIndex']:
+        """读取基础索引并应用增量日志；文件缺失、损坏或版本不符时返回 None"""
+        try:
+            with open(trigram_index_path(env_file), 'rb') as f:
+                header = json.loads(f.readline())
+                bitmaps = f.read()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get('version') != TRIGRAM_VERSION:
+            return None
+        keys = header.get('keys') or []
+        buckets = header.get('buckets') or 0
+        if len(bitmaps) != buckets * ((len(keys) + 7) // 8):
+            return None
+        index = cls(keys, buckets, bitmaps, _as_source(header.get('source')))
+
+        try:
+            with open(trigram_log_path(env_file), 'rb') as f:
+                lines = f.read().split(b'\n')
+        except FileNotFoundError:
+            return index
+        except OSError:
+            return None
+        # 末段非空说明末行未写完，忽略；若该次写入已落盘，签名对不上会触发重建
+        for raw in lines[:-1]:
+            try:
+                record = json.loads(raw)
+            except (ValueError, UnicodeDecodeError):
+                return None
+            index.dirty.update(record.get('keys') or ())
+            index.source = _as_source(record.get('source'))
+        return index
+
+    def save(self, env_file: Path) -> None:
+        """原子写入基础索引并删除增量日志（调用方须持有存储 .lock）"""
+        path = trigram_index_path(env_file)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        header = json.dumps({
+            'version': TRIGRAM_VERSION,
+            'source': self.source,
+            'keys': self.keys,
+            'buckets': self.buckets,
+        }, ensure_ascii=False).encode('utf-8')
+        fd = os.open(str(tmp), os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header + b'\n')
+                f.write(self.bitmaps)
+            os.replace(tmp, path)
+        except BaseException:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+        try:
+            os.unlink(trigram_log_path(env_file))
+        except FileNotFoundError:
+            pass
+
+    def needs_rebuild(self) -> bool:
+        """脏 key 是否多到候选集失去筛选意义"""
+        limit = TRIGRAM_REBUILD_MIN_DIRTY + len(self.keys) * TRIGRAM_REBUILD_RATIO
+        return len(self.dirty) > limit
+
+    def candidates(self, needle: str) -> Optional[set[str]]:
+        """值中可能包含 needle（已 casefold）的 key
+
+        needle 不足 3 个字节时无法筛选，返回 None。
+        """
+        data = needle.encode('utf-8')
+        if len(data) < 3 or not self.buckets:
+            return None
+        stride = self._stride
+        view = memoryview(self.bitmaps)
+        hits = -1
+        for bucket in trigram_buckets(data, self.buckets):
+            start = bucket * stride
+            hits &= int.from_bytes(view[start:start + stride], 'little')
+            if not hits:
+                break
+
+        keys = self.keys
+        found = set(self.dirty)
+        while hits > 0:
+            low = hits & -hits
+            found.add(keys[low.bit_length() - 1])
+            hits ^= low
+        return found
+
+
+def append_trigram_log(env_file: Path, keys: list[str], source: tuple) -> bool:
+    """基础索引存在时追加一条增量记录（调用方须持有存储 .lock）
+
+    Returns:
+        是否已记录（索引不存在时为 False）
+    """
+    if not trigram_index_path(env_file).exists():
+        return False
+    line = json.dumps(
+        {'keys': keys, 'source': source}, ensure_ascii=False
+    ).encode('utf-8') + b'\n'
+    fd = os.open(
+        str(trigram_log_path(env_file)),
+        os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600,
+    )
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+    return True
+
+
+def drop_trigram_index(env_file: Path) -> None:
+    """删除索引文件（整体重置后索引作废，下次搜索重建）"""
+    for path in (trigram_index_path(env_file), trigram_log_path(env_file)):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+__all__ = [
+    'TRIGRAM_VERSION',
+    'TRIGRAM_MIN_BYTES',
+    'TRIGRAM_MIN_BUCKETS',
+    'TRIGRAM_MAX_BUCKETS',
+    'TRIGRAM_REBUILD_MIN_DIRTY',
+    'TRIGRAM_REBUILD_RATIO',
+    'TrigramIndex',
+    'trigram_index_path',
+    'trigram_log_path',
+    'trigram_min_bytes',
+    'trigram_buckets',
+    'append_trigram_log',
+    'drop_trigram_index',
+]
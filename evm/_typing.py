@@ -7,8 +7,11 @@ Mixin 继承此协议后可消除 type: ignore[attr-defined] 注释，
 并让 mypy 正确校验跨 mixin 的属性访问。
 """
 
+from contextlib import AbstractContextManager
 from pathlib import Path
-from typing import Protocol
+from typing import Any, Optional, Protocol
+
+from ._storage import ChangeTrackingDict
 
 
 class EnvironmentManagerProtocol(Protocol):
@@ -19,13 +22,36 @@ class EnvironmentManagerProtocol(Protocol):
     """
 
     env_file: Path
-    _env_vars: dict[str, str]
+    _env_vars: ChangeTrackingDict
     lock_timeout: float
+    _pending_history: Optional[list[dict]]
 
     def _save_env_vars(self, dry_run: bool = False) -> None:
         """保存环境变量到存储文件"""
         ...
 
+    def transaction(self) -> AbstractContextManager[Any]:
+        """批量写入事务（退出时一次写入，异常时回滚内存状态）"""
+        ...
+
+    def _is_secret(self, value: str) -> bool:
+        """是否为加密变量"""
+        ...
+
+    def get_secrets(
+        self,
+        keys: Optional[list[str]] = None,
+        workers: Optional[int] = None,
+    ) -> dict[str, str]:
+        """批量解密变量"""
+        ...
+
+    def _expanded_values(
+        self, secrets: Optional[dict[str, str]] = None
+    ) -> dict[str, str]:
+        """一次展开整个存储的模板"""
+        ...
+
     def log_operation(
         self,
         operation: str,
@@ -16,26 +16,20 @@ EVM 命令行接口
   3  — 存储错误 (StorageError / CorruptedStorageError / LockTimeoutError)
   4  — 输入格式错误 (ImportFailedError / ExportError)
   5  — 解密失败 (DecryptionError)
-  6  — 校验失败 (ValidationError / SchemaError)
+  6  — 校验失败 (ValidationError / SchemaError / TemplateCycleError)
   7  — 分组错误 (GroupNotFoundError / GroupOperationError)
   8  — 备份错误 (BackupError)
   9  — 编辑器错误 (EditorError)
   10 — 命令未找到 (CommandNotFoundError)
 """
 
-import argparse
 import os
 import sys
-from typing import Optional
+from collections.abc import Callable
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Optional
 
 from . import __version__
-from ._completion import (
-    SHELL_GENERATORS,
-    install_integration,
-    is_integration_installed,
-    uninstall_integration,
-)
-from ._json import json_error, json_output
 from .exceptions import (
     BackupError,
     CommandNotFoundError,
@@ -53,22 +47,14 @@ from .exceptions import (
     OperationCancelledError,
     SchemaError,
     StorageError,
+    TemplateCycleError,
     ValidationError,
 )
-from .formatters import (
-    print_diff,
-    print_groups,
-    print_history,
-    print_info,
-    print_load_memory_result,
-    print_schema,
-    print_search_results,
-    print_validate_all,
-    print_validate_result,
-    print_vars_by_group,
-    print_vars_table,
-)
-from .manager import EnvironmentManager
+
+if TYPE_CHECKING:
+    import argparse
+
+    from .manager import EnvironmentManager
 
 # 异常类型 → 退出码映射
 EXIT_CODE_MAP = {
@@ -82,6 +68,7 @@ EXIT_CODE_MAP = {
     DecryptionError: 5,
     ValidationError: 6,
     SchemaError: 6,
+    TemplateCycleError: 6,
     GroupNotFoundError: 7,
     GroupOperationError: 7,
     BackupError: 8,
@@ -100,6 +87,7 @@ ALL_COMMANDS = [
     'exec', 'loadmemory', 'inject',
     'edit', 'info', 'diff', 'expand',
     'validate', 'history', 'schema', 'completion', 'init', 'upgrade',
+    'batch', 'secrets', 'serve',
 ]
 
 
@@ -111,8 +99,10 @@ def _exit_code_for(exc: EVMError) -> int:
     return 1
 
 
-def create_parser() -> argparse.ArgumentParser:
+def create_parser() -> 'argparse.ArgumentParser':
     """创建命令行参数解析器"""
+    import argparse
+
     parser = argparse.ArgumentParser(
         prog='evm',
         description='Environment Variable Manager - Manage environment variables easily',
@@ -131,10 +121,17 @@ Examples:
   evm info --json                  # Tool info as JSON
   evm diff backup.json             # Compare with backup
   evm expand URL                   # Expand {{VAR}} templates
+  evm expand --all --json          # Expand the whole store
+  evm search --glob 'DB_*'         # Also: --regex '^(DB|REDIS)_'
   evm validate API_URL             # Validate against schema
+  evm validate --json --fail-fast  # NDJSON results; stop at first error
   evm history --json               # History as JSON
+  evm history --key 'DB_*' --op delete --since 7d
   evm schema set API_URL --format url
   evm completion bash              # Generate shell completion
+  evm batch < ops.txt              # Apply many operations in one write
+  evm secrets migrate              # Re-encrypt all v1/v2 secrets at once
+  evm serve &                      # Daemon; then EVM_DAEMON=1 evm get KEY
 
 Agent-friendly usage:
   evm get KEY --json               # stdout = JSON, stderr = errors
@@ -156,6 +153,7 @@ Shell Integration (load vars into current shell):
   evm-load --group prod            # Only a group (group: prefix stripped)
   evm-load --include-secrets       # Also decrypt and inject secrets
   evm-load --prefix EVM_           # Namespace all keys to avoid collisions
+  evm-load --expand                # Resolve {{VAR}} templates before injecting
   # evm-load is a shell function installed by `evm init`; it wraps
   # `eval "$(evm inject)"` and handles --env-file flag positioning for you.
   # `evm inject` is the underlying command for use without shell integration.
@@ -222,6 +220,18 @@ Exit Codes:
                        help='Skip confirmation for destructive operations')
         return p
 
+    def _add_validate_arguments(p):
+        """validate / schema validate 共用的参数"""
+        p.add_argument('key', nargs='?', help='Variable (omit for all)')
+        p.add_argument('--stream', action='store_true',
+                       help='Print results as they are computed '
+                            '(NDJSON with --json)')
+        p.add_argument('--fail-fast', action='store_true',
+                       help='Stop at the first invalid variable '
+                            '(implies --stream, exit code 6)')
+        p.add_argument('--workers', '-w', type=int,
+                       help='Validate in chunks on N worker processes')
+
     # ── 基本命令 ──────────────────────────────────────────
 
     set_p = _sp('set', help='Set a variable')
@@ -283,6 +293,10 @@ Exit Codes:
                        default='json')
     exp_p.add_argument('--output', '-o', help='Output file path')
     exp_p.add_argument('--group', '-g', help='Export from group')
+    exp_p.add_argument('--include-secrets', action='store_true',
+                       help='Decrypt secret variables before exporting')
+    exp_p.add_argument('--expand', action='store_true',
+                       help='Expand {{VAR}} templates before exporting')
 
     ld_p = _sp('load', help='Load from file')
     ld_p.add_argument('file', help='Input file')
@@ -305,6 +319,13 @@ Exit Codes:
     sr_p = _sp('search', help='Search variables')
     sr_p.add_argument('pattern')
     sr_p.add_argument('--value', '-v', action='store_true')
+    sr_mode = sr_p.add_mutually_exclusive_group()
+    sr_mode.add_argument('--regex', '-e', dest='search_mode',
+                         action='store_const', const='regex',
+                         help='Treat pattern as a regular expression')
+    sr_mode.add_argument('--glob', dest='search_mode',
+                         action='store_const', const='glob',
+                         help="Match the whole key with a glob (e.g. 'DB_*')")
 
     rn_p = _sp('rename', help='Rename a variable')
     rn_p.add_argument('old_key')
@@ -317,11 +338,17 @@ Exit Codes:
     # ── 执行/内存 ─────────────────────────────────────────
 
     ex_p = _sp('exec', help='Execute with env vars')
+    ex_p.add_argument('--include-secrets', action='store_true',
+                      help='Decrypt secret variables into the child env')
+    ex_p.add_argument('--expand', action='store_true',
+                      help='Expand {{VAR}} templates in the child env')
     ex_p.add_argument('exec_args', nargs='+')
 
     lm_p = _sp('loadmemory', help='Load to os.environ')
     lm_p.add_argument('--prefix', '-p')
     lm_p.add_argument('--no-prefix', action='store_true')
+    lm_p.add_argument('--expand', action='store_true',
+                      help='Expand {{VAR}} templates before loading')
 
     # ── 注入 shell ───────────────────────────────────────
 
@@ -347,6 +374,18 @@ Exit Codes:
         '--prefix',
         help='Add a prefix to all exported keys (e.g. EVM_)',
     )
+    inj_p.add_argument(
+        '--expand',
+        action='store_true',
+        help='Expand {{VAR}} templates before exporting',
+    )
+    inj_p.add_argument(
+        '--cached',
+        action='store_true',
+        help='Also write the output to <env-file>.inject-<shell>-<group>-<prefix> '
+             'for evm-load to source while the store is unchanged '
+             '(ignored with --include-secrets/--expand)',
+    )
 
     # ── 编辑/信息/Diff/展开 ───────────────────────────────
 
@@ -359,18 +398,30 @@ Exit Codes:
     df_p.add_argument('file')
 
     xp_p = _sp('expand', help='Expand {{VAR}} templates')
-    xp_p.add_argument('key')
+    xp_p.add_argument('key', nargs='?', help='Variable (omit with --all)')
+    xp_p.add_argument('--all', '-a', dest='expand_all', action='store_true',
+                      help='Expand every variable in the store')
 
     # ── P2 新功能 ─────────────────────────────────────────
 
     # validate
     vl_p = _sp('validate', help='Validate against schema')
-    vl_p.add_argument('key', nargs='?', help='Variable (omit for all)')
+    _add_validate_arguments(vl_p)
 
     # history
     hi_p = _sp('history', help='Show operation history')
     hi_p.add_argument('--limit', '-n', type=int, default=20,
                       help='Number of entries to show')
+    hi_p.add_argument('--offset', type=int, default=0,
+                      help='Skip this many most recent entries')
+    hi_p.add_argument('--key', '-k',
+                      help='Only entries whose key matches this glob')
+    hi_p.add_argument('--op', dest='operation',
+                      help='Only this operation (e.g. set, delete)')
+    hi_p.add_argument('--status', help='Only this status (e.g. success)')
+    hi_p.add_argument('--since',
+                      help='Start time: YYYY-MM-DD[THH:MM] or 30m/12h/7d/2w')
+    hi_p.add_argument('--until', help='End time (inclusive)')
     hi_p.add_argument('--clear', action='store_true',
                       help='Clear all history')
 
@@ -398,7 +449,52 @@ Exit Codes:
     sc_sub.add_parser('list', help='List all schema definitions')
 
     sc_val = sc_sub.add_parser('validate', help='Validate against schema')
-    sc_val.add_argument('key', nargs='?', help='Variable (omit for all)')
+    _add_validate_arguments(sc_val)
+
+    # secrets
+    se_p = _sp('secrets', help='Manage encrypted variables')
+    se_sub = se_p.add_subparsers(dest='secrets_command',
+                                 help='Secrets subcommand')
+
+    se_mig = se_sub.add_parser(
+        'migrate',
+        help='Re-encrypt all v1/v2 secrets in one pass',
+    )
+    se_mig.add_argument('--workers', '-w', type=int,
+                        help='Parallel workers (default: CPU count)')
+    se_mig.add_argument('--dry-run', action='store_true',
+                        default=argparse.SUPPRESS,
+                        help='List secrets that would be migrated')
+    se_mig.add_argument('--json', dest='json_mode', action='store_true',
+                        default=argparse.SUPPRESS,
+                        help='Output structured JSON (agent-friendly)')
+
+    # serve: 常驻守护进程
+    sv_p = _sp(
+        'serve',
+        help='Run a daemon that answers evm commands over a Unix socket',
+        description='Keep the store in memory and serve commands from '
+                    'clients started with EVM_DAEMON=1. The store file is '
+                    'stat-checked before every request and reloaded when it '
+                    'changes externally.',
+    )
+    sv_p.add_argument(
+        '--socket',
+        help='Socket path (default: <env-file>.sock, or $EVM_SOCKET)',
+    )
+
+    # batch: 从 stdin 读取操作，单事务提交
+    bt_p = _sp(
+        'batch',
+        help='Apply operations read from stdin in a single transaction',
+        description='Read one operation per line (e.g. "set KEY VALUE", '
+                    '"delete KEY", "rename OLD NEW") and commit them with '
+                    'a single write. Any failure rolls back the whole batch.',
+    )
+    bt_p.add_argument(
+        '--file', '-f',
+        help='Read operations from this file instead of stdin',
+    )
 
     # completion
     co_p = _sp('completion', help='Generate shell completion')
@@ -458,43 +554,182 @@ def _confirm(message: str) -> bool:
         return False
 
 
+# ── 快速路径 ──────────────────────────────────────────────
+
+# 命令 → (位置参数, 开关 {flag: dest}, 带值选项 {option: dest})
+# 位置参数名以 '?' 结尾表示可选。与 create_parser() 中的定义保持一致。
+_FAST_COMMANDS: dict[str, tuple[list[str], dict[str, str], dict[str, str]]] = {
+    'get': (['key'], {'--secret': 'secret', '-s': 'secret'}, {}),
+    'list': (
+        ['pattern?'],
+        {'--show-groups': 'show_groups', '--no-prefix': 'no_prefix'},
+        {'--group': 'group', '-g': 'group'},
+    ),
+    'inject': (
+        [],
+        {'--include-secrets': 'include_secrets', '--expand': 'expand',
+         '--cached': 'cached'},
+        {'--shell': 'shell', '-s': 'shell', '--group': 'group',
+         '-g': 'group', '--prefix': 'prefix'},
+    ),
+}
+_FAST_GLOBAL_FLAGS = {
+    '--json': 'json_mode', '--quiet': 'quiet', '-q': 'quiet',
+    '--dry-run': 'dry_run', '--force': 'force',
+}
+_FAST_CHOICES = {'shell': ('bash', 'zsh', 'sh', 'fish')}
+
+
+def _parse_fast(argv: list[str]) -> Optional[SimpleNamespace]:
+    """手工解析 get/list/inject 的简单形态
+
+    只接受完全确定的写法；遇到任何其他参数（缩写、--opt=value、
+    未知选项、以 '-' 开头的值、--help 等）返回 None，交给 argparse。
+    """
+    ns = SimpleNamespace(
+        command=None, env_file=None, verbose=False,
+        json_mode=False, quiet=False, dry_run=False, force=False,
+    )
+    spec = None
+    positionals: list[str] = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in _FAST_GLOBAL_FLAGS:
+            setattr(ns, _FAST_GLOBAL_FLAGS[arg], True)
+        elif spec is None:
+            if arg == '--env-file' and i + 1 < len(argv):
+                ns.env_file = argv[i + 1]
+                i += 1
+            elif arg in _FAST_COMMANDS:
+                ns.command = arg
+                spec = _FAST_COMMANDS[arg]
+                for name in spec[0]:
+                    setattr(ns, name.rstrip('?'), None)
+                for dest in spec[1].values():
+                    setattr(ns, dest, False)
+                for dest in spec[2].values():
+                    setattr(ns, dest, None)
+            else:
+                return None
+        elif arg in spec[1]:
+            setattr(ns, spec[1][arg], True)
+        elif arg in spec[2]:
+            if i + 1 >= len(argv) or argv[i + 1].startswith('-'):
+                return None
+            dest = spec[2][arg]
+            value = argv[i + 1]
+            if dest in _FAST_CHOICES and value not in _FAST_CHOICES[dest]:
+                return None
+            setattr(ns, dest, value)
+            i += 1
+        elif arg.startswith('-'):
+            return None
+        else:
+            positionals.append(arg)
+        i += 1
+
+    if spec is None:
+        return None
+    names = spec[0]
+    required = [n for n in names if not n.endswith('?')]
+    if not len(required) <= len(positionals) <= len(names):
+        return None
+    for name, value in zip(names, positionals):
+        setattr(ns, name.rstrip('?'), value)
+    return ns
+
+
 def main(argv: Optional[list[str]] = None) -> int:
     """主入口
 
+    设置 EVM_DAEMON=1 时，支持的命令先尝试转发给 `evm serve` 守护进程，
+    连接不上则回退为本进程执行。
+
     Returns:
         退出码 (0=成功, 1-10=按异常类型细分)
     """
-    parser = create_parser()
-    args = parser.parse_args(argv)
+    if os.environ.get('EVM_DAEMON'):
+        from ._client import try_daemon
+
+        code = try_daemon(sys.argv[1:] if argv is None else argv)
+        if code is not None:
+            return code
+    return run(argv)
+
+
+def run(
+    argv: Optional[list[str]] = None,
+    manager_factory: Optional[Callable[[Optional[str]], 'EnvironmentManager']] = None,
+    parser: Optional['argparse.ArgumentParser'] = None,
+) -> int:
+    """在本进程内解析并执行一条命令
+
+    get/list/inject 的常见形态走 _parse_fast，不构建 argparse 解析器；
+    无法识别的参数一律回退到完整解析（含 --help 与错误提示）。
+
+    Args:
+        argv: 命令行参数
+        manager_factory: env_file → EnvironmentManager；守护进程借此复用
+            常驻内存的管理器（并跳过 shell 集成检查）
+        parser: 复用已构建的解析器（守护进程）
+
+    Returns:
+        退出码
+    """
+    args: argparse.Namespace | SimpleNamespace
+    fast = _parse_fast(sys.argv[1:] if argv is None else argv)
+    if fast is None:
+        if parser is None:
+            parser = create_parser()
+        args = parser.parse_args(argv)
+    else:
+        args = fast
 
     json_mode = getattr(args, 'json_mode', False)
     quiet = getattr(args, 'quiet', False)
+    in_daemon = manager_factory is not None
+    if manager_factory is None:
+        manager_factory = sys.modules[__name__].EnvironmentManager
 
     if args.verbose:
-        mgr = EnvironmentManager(args.env_file)
+        mgr = manager_factory(args.env_file)
         info = mgr.info()
         if json_mode:
+            from ._json import json_output
+
             json_output(info, quiet)
         else:
+            from .formatters import print_info
+
             print_info(info)
         return 0
 
     if not args.command:
+        if parser is None:
+            parser = create_parser()
         parser.print_help()
         return 0
 
     # 自动安装 shell 集成（跳过 init/completion/upgrade 自身，避免递归/噪声）
-    if args.command not in ('init', 'completion', 'upgrade'):
+    if (
+        args.command not in ('init', 'completion', 'upgrade', 'serve')
+        and not in_daemon
+    ):
         _ensure_shell_integration(quiet)
 
     dry_run = getattr(args, 'dry_run', False)
     force = getattr(args, 'force', False)
 
     try:
-        mgr = EnvironmentManager(args.env_file)
+        if args.command == 'serve':
+            return _cmd_serve(args, quiet)
+        mgr = manager_factory(args.env_file)
         return _dispatch(mgr, args, dry_run, force, json_mode, quiet)
     except OperationCancelledError:
         if json_mode:
+            from ._json import json_error
+
             json_error("Operation cancelled.", 1, quiet)
         else:
             print("Operation cancelled.", file=sys.stderr)
@@ -502,6 +737,8 @@ def main(argv: Optional[list[str]] = None) -> int:
     except EVMError as e:
         code = _exit_code_for(e)
         if json_mode:
+            from ._json import json_error
+
             json_error(str(e), code, quiet)
         else:
             print(f"Error: {e}", file=sys.stderr)
@@ -512,6 +749,8 @@ def main(argv: Optional[list[str]] = None) -> int:
         return 1
     except Exception as e:
         if json_mode:
+            from ._json import json_error
+
             json_error(f"Unexpected error: {e}", 1, quiet)
         else:
             print(f"Unexpected error: {e}", file=sys.stderr)
@@ -522,6 +761,8 @@ def main(argv: Optional[list[str]] = None) -> int:
 
 def _cmd_set(mgr, args, dry_run, force, json_mode, quiet):
     """处理 set 命令"""
+    from ._json import json_output
+
     if getattr(args, 'secret', False):
         msg = mgr.set_secret(args.key, args.value, dry_run=dry_run)
         if json_mode:
@@ -549,6 +790,8 @@ def _cmd_get(mgr, args, dry_run, force, json_mode, quiet):
     else:
         value = mgr.get(args.key)
     if json_mode:
+        from ._json import json_output
+
         json_output({"key": args.key, "value": value}, quiet)
     elif not quiet:
         if is_secret and sys.stdout.isatty():
@@ -563,6 +806,8 @@ def _cmd_get(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_delete(mgr, args, dry_run, force, json_mode, quiet):
     """处理 delete 命令"""
+    from ._json import json_output
+
     msg = mgr.delete(args.key, dry_run=dry_run)
     if json_mode:
         json_output({"key": args.key, "deleted": True, "message": msg}, quiet)
@@ -574,32 +819,38 @@ def _cmd_delete(mgr, args, dry_run, force, json_mode, quiet):
 def _cmd_list(mgr, args, dry_run, force, json_mode, quiet):
     """处理 list 命令"""
     no_prefix = getattr(args, 'no_prefix', False)
-    if getattr(args, 'show_groups', False):
+    show_groups = getattr(args, 'show_groups', False)
+    if show_groups:
         if args.group:
-            filtered = mgr.list_vars(group=args.group)
+            result = mgr.list_vars(group=args.group)
         elif args.pattern:
-            filtered = mgr.list_vars(pattern=args.pattern)
+            result = mgr.list_vars(pattern=args.pattern)
         else:
-            filtered = mgr.list_vars()
-        if json_mode:
-            json_output(filtered, quiet)
-        elif not quiet:
-            print_vars_by_group(filtered)
+            result = mgr.list_vars()
     else:
         result = mgr.list_vars(
             pattern=args.pattern,
             group=args.group,
             no_prefix=no_prefix,
         )
-        if json_mode:
-            json_output(result, quiet)
-        elif not quiet:
+    if json_mode:
+        from ._json import json_output
+
+        json_output(result, quiet)
+    elif not quiet:
+        from .formatters import print_vars_by_group, print_vars_table
+
+        if show_groups:
+            print_vars_by_group(result)
+        else:
             print_vars_table(result)
     return 0
 
 
 def _cmd_clear(mgr, args, dry_run, force, json_mode, quiet):
     """处理 clear 命令"""
+    from ._json import json_output
+
     if not dry_run and not force:
         count = len(mgr._env_vars)
         if count > 0:
@@ -621,6 +872,9 @@ def _cmd_clear(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_groups(mgr, args, dry_run, force, json_mode, quiet):
     """处理 groups 命令"""
+    from ._json import json_output
+    from .formatters import print_groups
+
     groups = mgr.list_groups()
     if json_mode:
         json_output({"groups": groups}, quiet)
@@ -631,6 +885,8 @@ def _cmd_groups(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_setg(mgr, args, dry_run, force, json_mode, quiet):
     """处理 setg 命令"""
+    from ._json import json_output
+
     msg = mgr.set_grouped(args.group, args.key, args.value, dry_run=dry_run)
     if json_mode:
         json_output({
@@ -644,6 +900,8 @@ def _cmd_setg(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_getg(mgr, args, dry_run, force, json_mode, quiet):
     """处理 getg 命令"""
+    from ._json import json_output
+
     value = mgr.get_grouped(args.group, args.key)
     if json_mode:
         json_output({
@@ -656,6 +914,8 @@ def _cmd_getg(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_deleteg(mgr, args, dry_run, force, json_mode, quiet):
     """处理 deleteg 命令"""
+    from ._json import json_output
+
     msg = mgr.delete_grouped(args.group, args.key, dry_run=dry_run)
     if json_mode:
         json_output({
@@ -669,6 +929,9 @@ def _cmd_deleteg(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_listg(mgr, args, dry_run, force, json_mode, quiet):
     """处理 listg 命令"""
+    from ._json import json_output
+    from .formatters import print_vars_table
+
     no_prefix = getattr(args, 'no_prefix', False)
     result = mgr.list_vars(group=args.group, no_prefix=no_prefix)
     if json_mode:
@@ -680,6 +943,8 @@ def _cmd_listg(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_delete_group(mgr, args, dry_run, force, json_mode, quiet):
     """处理 delete-group 命令"""
+    from ._json import json_output
+
     if not dry_run and not force:
         if not sys.stdin.isatty():
             raise EVMError(
@@ -702,6 +967,8 @@ def _cmd_delete_group(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_move_group(mgr, args, dry_run, force, json_mode, quiet):
     """处理 move-group 命令"""
+    from ._json import json_output
+
     msg = mgr.move_to_group(args.key, args.group, dry_run=dry_run)
     if json_mode:
         json_output({
@@ -714,11 +981,15 @@ def _cmd_move_group(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_export(mgr, args, dry_run, force, json_mode, quiet):
     """处理 export 命令"""
+    from ._json import json_output
+
     msg = mgr.export(
         format_type=args.format,
         output_file=args.output,
         group=args.group,
         dry_run=dry_run,
+        include_secrets=getattr(args, 'include_secrets', False),
+        expand=getattr(args, 'expand', False),
     )
     if json_mode:
         json_output({"message": msg, "format": args.format}, quiet)
@@ -729,6 +1000,8 @@ def _cmd_export(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_load(mgr, args, dry_run, force, json_mode, quiet):
     """处理 load 命令"""
+    from ._json import json_output
+
     msg = mgr.load(
         input_file=args.file,
         format_type=getattr(args, 'format', None),
@@ -746,6 +1019,8 @@ def _cmd_load(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_backup(mgr, args, dry_run, force, json_mode, quiet):
     """处理 backup 命令"""
+    from ._json import json_output
+
     msg = mgr.backup(args.file)
     if json_mode:
         json_output({"message": msg}, quiet)
@@ -756,6 +1031,8 @@ def _cmd_backup(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_restore(mgr, args, dry_run, force, json_mode, quiet):
     """处理 restore 命令"""
+    from ._json import json_output
+
     msg = mgr.restore(args.file, merge=getattr(args, 'merge', False))
     if json_mode:
         json_output({"message": msg, "file": args.file}, quiet)
@@ -766,8 +1043,13 @@ def _cmd_restore(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_search(mgr, args, dry_run, force, json_mode, quiet):
     """处理 search 命令"""
+    from ._json import json_output
+    from .formatters import print_search_results
+
     results = mgr.search(
-        args.pattern, search_value=getattr(args, 'value', False)
+        args.pattern,
+        search_value=getattr(args, 'value', False),
+        mode=getattr(args, 'search_mode', None) or 'substring',
     )
     if json_mode:
         json_output(results, quiet)
@@ -780,6 +1062,8 @@ def _cmd_search(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_rename(mgr, args, dry_run, force, json_mode, quiet):
     """处理 rename 命令"""
+    from ._json import json_output
+
     msg = mgr.rename(args.old_key, args.new_key, dry_run=dry_run)
     if json_mode:
         json_output({
@@ -793,6 +1077,8 @@ def _cmd_rename(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_copy(mgr, args, dry_run, force, json_mode, quiet):
     """处理 copy 命令"""
+    from ._json import json_output
+
     msg = mgr.copy(args.src_key, args.dst_key, dry_run=dry_run)
     if json_mode:
         json_output({
@@ -806,16 +1092,24 @@ def _cmd_copy(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_exec(mgr, args, dry_run, force, json_mode, quiet):
     """处理 exec 命令 - 返回子进程退出码"""
-    return mgr.execute(args.exec_args)
+    return mgr.execute(
+        args.exec_args,
+        include_secrets=getattr(args, 'include_secrets', False),
+        expand=getattr(args, 'expand', False),
+    )
 
 
 def _cmd_loadmemory(mgr, args, dry_run, force, json_mode, quiet):
     """处理 loadmemory 命令"""
+    from ._json import json_output
+    from .formatters import print_load_memory_result
+
     filter_prefix = getattr(args, 'prefix', None)
     add_evm_prefix = not getattr(args, 'no_prefix', False)
     loaded, prefix_used, filter_used = mgr.load_to_memory(
         filter_prefix=filter_prefix,
         add_evm_prefix=add_evm_prefix,
+        expand=getattr(args, 'expand', False),
     )
     if json_mode:
         json_output({
@@ -843,14 +1137,37 @@ def _cmd_inject(mgr, args, dry_run, force, json_mode, quiet):
     用法: eval "$(evm inject)"
     """
     shell = getattr(args, 'shell', None) or _detect_shell()
+    group = getattr(args, 'group', None)
+    prefix = getattr(args, 'prefix', None)
+    include_secrets = getattr(args, 'include_secrets', False)
+    expand = getattr(args, 'expand', False)
     result = mgr.inject(
         shell=shell,
-        group=getattr(args, 'group', None),
-        include_secrets=getattr(args, 'include_secrets', False),
-        prefix=getattr(args, 'prefix', None),
+        group=group,
+        include_secrets=include_secrets,
+        prefix=prefix,
+        expand=expand,
     )
 
+    # --cached：明文密钥永不落盘；--expand 不在 evm-load 的缓存键中
+    if (
+        getattr(args, 'cached', False)
+        and not (include_secrets or expand or dry_run)
+        and getattr(mgr, '_store_source', None) is not None
+    ):
+        from ._completion import inject_cache_path, write_inject_cache
+        from ._storage import store_signature
+
+        write_inject_cache(
+            inject_cache_path(mgr.env_file, shell, group, prefix),
+            result['output'],
+            mgr._store_source,
+            lambda: store_signature(mgr.env_file),
+        )
+
     if json_mode:
+        from ._json import json_output
+
         json_output(result, quiet)
     elif dry_run:
         # 预览：人类可读，不输出可 eval 的语句
@@ -873,6 +1190,8 @@ def _cmd_inject(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_edit(mgr, args, dry_run, force, json_mode, quiet):
     """处理 edit 命令"""
+    from ._json import json_output
+
     msg = mgr.edit(args.key)
     changed = "Updated" in msg
     if json_mode:
@@ -884,6 +1203,9 @@ def _cmd_edit(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_info(mgr, args, dry_run, force, json_mode, quiet):
     """处理 info 命令"""
+    from ._json import json_output
+    from .formatters import print_info
+
     info = mgr.info()
     if json_mode:
         json_output(info, quiet)
@@ -894,6 +1216,9 @@ def _cmd_info(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_diff(mgr, args, dry_run, force, json_mode, quiet):
     """处理 diff 命令"""
+    from ._json import json_output
+    from .formatters import print_diff
+
     result = mgr.diff(args.file)
     if json_mode:
         json_output(result, quiet)
@@ -904,6 +1229,18 @@ def _cmd_diff(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_expand(mgr, args, dry_run, force, json_mode, quiet):
     """处理 expand 命令"""
+    from ._json import json_output
+
+    if getattr(args, 'expand_all', False):
+        expanded_all = mgr.expand_all()
+        if json_mode:
+            json_output(expanded_all, quiet)
+        elif not quiet:
+            for key in sorted(expanded_all):
+                print(f"{key}={expanded_all[key]}")
+        return 0
+    if not args.key:
+        raise EVMError("Usage: evm expand KEY | evm expand --all")
     expanded = mgr.expand(args.key)
     if json_mode:
         json_output({"key": args.key, "expanded": expanded}, quiet)
@@ -914,6 +1251,9 @@ def _cmd_expand(mgr, args, dry_run, force, json_mode, quiet):
 
 def _cmd_validate(mgr, args, dry_run, force, json_mode, quiet):
     """处理 validate 命令"""
+    from ._json import json_output
+    from .formatters import print_validate_all, print_validate_result
+
     key = getattr(args, 'key', None)
     if key:
         result = mgr.validate(key)
@@ -921,8 +1261,14 @@ def _cmd_validate(mgr, args, dry_run, force, json_mode, quiet):
             json_output({"key": key, **result}, quiet)
         elif not quiet:
             print_validate_result(key, result)
+    elif getattr(args, 'stream', False) or getattr(args, 'fail_fast', False):
+        _stream_validate(mgr, args, json_mode, quiet)
     else:
-        results = mgr.validate_all()
+        workers = getattr(args, 'workers', None)
+        if workers and workers > 1:
+            results = dict(mgr.iter_validate(workers=workers))
+        else:
+            results = mgr.validate_all()
         if json_mode:
             json_output(results, quiet)
         elif not quiet:
@@ -930,8 +1276,49 @@ def _cmd_validate(mgr, args, dry_run, force, json_mode, quiet):
     return 0
 
 
+def _stream_validate(mgr, args, json_mode, quiet):
+    """流式校验：结果逐条输出（--json 时为 NDJSON），最后一行为汇总
+
+    --fail-fast 时遇到第一个不合法的变量即停止并以 SchemaError 退出。
+    """
+    from ._json import json_line
+    from .formatters import print_validate_result, print_validate_summary
+
+    fail_fast = getattr(args, 'fail_fast', False)
+    total = invalid = 0
+    for key, result in mgr.iter_validate(workers=getattr(args, 'workers', None)):
+        total += 1
+        if json_mode:
+            json_line({"key": key, **result}, quiet)
+        elif not quiet:
+            print_validate_result(key, result)
+            sys.stdout.flush()
+        if not result['valid']:
+            invalid += 1
+            if fail_fast:
+                raise SchemaError(
+                    f"Validation failed for '{key}': "
+                    f"{'; '.join(result['errors'])}",
+                    key,
+                )
+    if json_mode:
+        json_line(
+            {"summary": {"total": total, "valid": total - invalid,
+                         "invalid": invalid}},
+            quiet,
+        )
+    elif not quiet:
+        if total == 0:
+            print("No schema definitions found.")
+        else:
+            print_validate_summary(invalid)
+
+
 def _cmd_history(mgr, args, dry_run, force, json_mode, quiet):
     """处理 history 命令"""
+    from ._json import json_output
+    from .formatters import print_history
+
     if getattr(args, 'clear', False):
         msg = mgr.clear_history()
         if json_mode:
@@ -939,7 +1326,17 @@ def _cmd_history(mgr, args, dry_run, force, json_mode, quiet):
         elif not quiet:
             print(msg)
     else:
-        entries = mgr.get_history(limit=args.limit)
+        filters = {
+            name: getattr(args, name, None)
+            for name in ('key', 'operation', 'status', 'since', 'until')
+        }
+        offset = getattr(args, 'offset', 0)
+        if any(filters.values()):
+            entries = mgr.query_history(
+                limit=args.limit, offset=offset, **filters,
+            )
+        else:
+            entries = mgr.get_history(limit=args.limit, offset=offset)
         if json_mode:
             json_output(entries, quiet)
         elif not quiet:
@@ -952,8 +1349,94 @@ def _cmd_schema(mgr, args, dry_run, force, json_mode, quiet):
     return _dispatch_schema(mgr, args, json_mode, quiet)
 
 
+def _cmd_secrets(mgr, args, dry_run, force, json_mode, quiet):
+    """处理 secrets 命令"""
+    from ._json import json_output
+
+    se_cmd = getattr(args, 'secrets_command', None)
+    if se_cmd != 'migrate':
+        raise EVMError("Usage: evm secrets migrate [--workers N] [--dry-run]")
+
+    result = mgr.migrate_secrets(
+        workers=getattr(args, 'workers', None), dry_run=dry_run,
+    )
+    if json_mode:
+        json_output(result, quiet)
+    elif not quiet:
+        counts = ', '.join(
+            f"{fmt}: {n}" for fmt, n in result['from'].items() if n
+        )
+        if not result['migrated']:
+            print("No v1/v2 secrets to migrate")
+        elif dry_run:
+            print(f"[DRY-RUN] Would migrate {result['migrated']} secret(s) "
+                  f"({counts}) to {result['target_format']}:")
+            for key in result['keys']:
+                print(f"  {key}")
+        else:
+            print(f"Migrated {result['migrated']} secret(s) ({counts}) "
+                  f"to {result['target_format']} in {result['elapsed']:.2f}s "
+                  f"({result['per_second']:.1f}/s)")
+    return 0
+
+
+def _cmd_serve(args, quiet) -> int:
+    """处理 serve 命令 —— 阻塞直到被中断"""
+    from ._daemon import EVMDaemon
+
+    daemon = EVMDaemon(args.env_file, socket_path=getattr(args, 'socket', None))
+    if not quiet:
+        print(f"evm daemon listening on {daemon.socket_path}", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    return 0
+
+
+def _parse_batch_lines(lines) -> list[list[str]]:
+    """把批量输入逐行解析为操作列表（空行/注释行保留为空列表以对齐行号）"""
+    import shlex
+
+    operations: list[list[str]] = []
+    for lineno, line in enumerate(lines, 1):
+        try:
+            operations.append(shlex.split(line, comments=True))
+        except ValueError as e:
+            raise EVMError(f"Batch line {lineno}: {e}")
+    return operations
+
+
+def _cmd_batch(mgr, args, dry_run, force, json_mode, quiet):
+    """处理 batch 命令 —— 一次加锁、一次写入提交所有操作"""
+    from ._json import json_output
+
+    path = getattr(args, 'file', None)
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                operations = _parse_batch_lines(f)
+        except OSError as e:
+            raise ImportFailedError(f"Cannot read batch file: {e}", path)
+    else:
+        operations = _parse_batch_lines(sys.stdin)
+
+    result = mgr.batch(operations, dry_run=dry_run)
+    if json_mode:
+        json_output(result, quiet)
+    elif not quiet:
+        for msg in result['messages']:
+            print(msg)
+        print(f"Applied {result['applied']} operation(s)")
+    return 0
+
+
 def _cmd_completion(mgr, args, dry_run, force, json_mode, quiet):
     """处理 completion 命令"""
+    from ._completion import SHELL_GENERATORS
+
     generator = SHELL_GENERATORS.get(args.shell)
     if generator:
         script = generator(ALL_COMMANDS)
@@ -980,6 +1463,15 @@ def _cmd_init(mgr, args, dry_run, force, json_mode, quiet):
     --reinstall：先移除再追加
     --check：报告是否已安装（退出码 0/1）
     """
+    from ._completion import (
+        SHELL_GENERATORS,
+        install_integration,
+        is_integration_installed,
+        uninstall_integration,
+        write_init_cache,
+    )
+    from ._json import json_output
+
     shell = _resolve_shell(args)
 
     if getattr(args, 'check', False):
@@ -1002,6 +1494,8 @@ def _cmd_init(mgr, args, dry_run, force, json_mode, quiet):
     if getattr(args, 'reinstall', False):
         uninstall_integration(shell)
         ok, msg = install_integration(shell)
+        if ok:
+            write_init_cache(shell, SHELL_GENERATORS[shell](ALL_COMMANDS))
         if json_mode:
             json_output({'shell': shell, 'message': msg, 'ok': ok}, quiet)
         elif not quiet:
@@ -1010,6 +1504,8 @@ def _cmd_init(mgr, args, dry_run, force, json_mode, quiet):
 
     if getattr(args, 'install', False):
         ok, msg = install_integration(shell)
+        if ok:
+            write_init_cache(shell, SHELL_GENERATORS[shell](ALL_COMMANDS))
         if json_mode:
             json_output({'shell': shell, 'message': msg, 'ok': ok}, quiet)
         elif not quiet:
@@ -1022,10 +1518,12 @@ def _cmd_init(mgr, args, dry_run, force, json_mode, quiet):
                 )
         return 0 if ok else 1
 
-    # 默认：输出集成脚本（供 eval 使用）
+    # 默认：输出集成脚本（供 eval 使用），同时缓存供 rc 标记块直接 source
     generator = SHELL_GENERATORS.get(shell)
     if generator:
-        print(generator(ALL_COMMANDS), end='')
+        script = generator(ALL_COMMANDS)
+        print(script, end='')
+        write_init_cache(shell, script)
     else:
         raise EVMError(f"Unsupported shell: {shell}")
     return 0
@@ -1040,6 +1538,7 @@ def _cmd_upgrade(mgr, args, dry_run, force, json_mode, quiet):
     - `--force`             跳过预检查，直接运行 pip
     """
     from . import _upgrade
+    from ._json import json_error, json_output
 
     current = _upgrade.get_current_version()
 
@@ -1102,20 +1601,36 @@ def _ensure_shell_integration(quiet: bool) -> None:
 
     - EVM_NO_AUTO_INSTALL=1 时跳过
     - $SHELL 无法识别时静默跳过
-    - 已安装则跳过（幂等）
+    - 已安装则跳过（幂等）；rc 文件与 evm 版本都未变化时只查 stamp，
+      不读 rc 全文，也不读 init 缓存
+    - stamp 失配（rc 改过、pip 升级后）时重读 rc：旧版标记块改写为当前块，
+      并重新生成 ~/.evm/init.<shell>（旧版块的用户此前没有这个缓存）
     - 未安装则追加标记块到 rc，并往 stderr 打一行提示
     """
     if os.environ.get('EVM_NO_AUTO_INSTALL'):
         return
 
+    from ._completion import (
+        SHELL_GENERATORS,
+        install_integration,
+        integration_stamp_current,
+        is_integration_installed_cached,
+        write_init_cache,
+    )
+
     shell = _detect_shell()
     if shell not in SHELL_GENERATORS:
         return  # 未知 shell，静默跳过
 
-    if is_integration_installed(shell):
+    if integration_stamp_current(shell):
+        return  # 热路径：一次 stat() + 读 stamp
+    if is_integration_installed_cached(shell):
+        write_init_cache(shell, SHELL_GENERATORS[shell](ALL_COMMANDS))
         return  # 已装，跳过
 
     ok, msg = install_integration(shell)
+    if ok:
+        write_init_cache(shell, SHELL_GENERATORS[shell](ALL_COMMANDS))
     if ok and not quiet:
         print(
             f"{msg}  Restart your shell (or source the rc file) "
@@ -1160,11 +1675,13 @@ COMMAND_HANDLERS = {
     'completion': _cmd_completion,
     'init': _cmd_init,
     'upgrade': _cmd_upgrade,
+    'batch': _cmd_batch,
+    'secrets': _cmd_secrets,
 }
 
 
 def _dispatch(
-    mgr: EnvironmentManager,
+    mgr: 'EnvironmentManager',
     args,
     dry_run: bool,
     force: bool,
@@ -1186,9 +1703,12 @@ def _dispatch(
 
 
 def _dispatch_schema(
-    mgr: EnvironmentManager, args, json_mode: bool, quiet: bool
+    mgr: 'EnvironmentManager', args, json_mode: bool, quiet: bool
 ) -> int:
     """Schema 子命令调度"""
+    from ._json import json_output
+    from .formatters import print_schema
+
     sc_cmd = getattr(args, 'schema_command', None)
 
     if sc_cmd == 'set':
@@ -1230,19 +1750,7 @@ def _dispatch_schema(
             print_schema(schema)
 
     elif sc_cmd == 'validate':
-        key = getattr(args, 'key', None)
-        if key:
-            result = mgr.validate(key)
-            if json_mode:
-                json_output({"key": key, **result}, quiet)
-            elif not quiet:
-                print_validate_result(key, result)
-        else:
-            results = mgr.validate_all()
-            if json_mode:
-                json_output(results, quiet)
-            elif not quiet:
-                print_validate_all(results)
+        _cmd_validate(mgr, args, False, False, json_mode, quiet)
 
     else:
         # 无子命令时显示 schema 列表
@@ -1255,4 +1763,14 @@ def _dispatch_schema(
     return 0
 
 
-__all__ = ['create_parser', 'main', 'ALL_COMMANDS', 'EXIT_CODE_MAP', 'COMMAND_HANDLERS']
+def __getattr__(name: str):
+    # EnvironmentManager 延迟导入：仅在真正执行命令时加载 manager 及其依赖
+    if name == 'EnvironmentManager':
+        from .manager import EnvironmentManager
+
+        globals()['EnvironmentManager'] = EnvironmentManager
+        return EnvironmentManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['create_parser', 'main', 'run', 'ALL_COMMANDS', 'EXIT_CODE_MAP', 'COMMAND_HANDLERS']
@@ -115,6 +115,15 @@ class SchemaError(EVMError):
         super().__init__(message)
 
 
+class TemplateCycleError(EVMError):
+    """模板存在循环引用"""
+    def __init__(self, cycle: list[str]):
+        self.cycle = cycle
+        super().__init__(
+            f"Circular reference detected: {' -> '.join(cycle)}"
+        )
+
+
 class OperationCancelledError(EVMError):
     """用户取消操作"""
     pass
@@ -143,6 +152,7 @@ __all__ = [
     'DecryptionError',
     'ValidationError',
     'SchemaError',
+    'TemplateCycleError',
     'OperationCancelledError',
     # 向后兼容
     'PermissionError_',
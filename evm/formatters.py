@@ -6,7 +6,6 @@ EVM 输出格式化
 所有 print() 调用集中在此模块。
 """
 
-import shutil
 from typing import Optional
 
 # 默认终端宽度（无法检测时的回退值）
@@ -15,6 +14,8 @@ _DEFAULT_WIDTH = 80
 
 def _term_width() -> int:
     """获取当前终端宽度，非终端环境返回默认值"""
+    import shutil
+
     return shutil.get_terminal_size((_DEFAULT_WIDTH, 24)).columns
 
 
@@ -115,6 +116,15 @@ def print_info(info: dict) -> None:
     print(f"Platform: {info['platform']}")
     print(f"Storage: {info['storage_path']}")
     print(f"Storage exists: {info['storage_exists']}")
+    if info.get('storage_engine'):
+        print(f"Storage engine: {info['storage_engine']}")
+    lock = info.get('lock')
+    if lock and lock.get('contended'):
+        print(
+            f"Lock contention: {lock['contended']}/{lock['acquired']} acquisitions waited "
+            f"({lock['retries']} retries, {lock['wait_seconds'] * 1000:.1f}ms total, "
+            f"{lock['timeouts']} timeouts)"
+        )
     print(f"Total variables: {info['total_variables']}")
     print(f"Total groups: {info['total_groups']}")
     print(f"Secret variables: {info['secret_variables']}")
@@ -239,10 +249,15 @@ def print_validate_all(results: dict[str, dict]) -> None:
     for key in sorted(results):
         print_validate_result(key, results[key])
     print("-" * width)
-    if valid_count == total:
+    print_validate_summary(total - valid_count)
+
+
+def print_validate_summary(invalid: int) -> None:
+    """打印校验汇总行"""
+    if invalid == 0:
         print("All variables passed validation.")
     else:
-        print(f"{total - valid_count} variable(s) failed validation.")
+        print(f"{invalid} variable(s) failed validation.")
 
 
 def print_schema(schema: dict) -> None:
@@ -281,5 +296,6 @@ __all__ = [
     'print_history',
     'print_validate_result',
     'print_validate_all',
+    'print_validate_summary',
     'print_schema',
 ]
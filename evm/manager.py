@@ -10,30 +10,41 @@ EnvironmentManager 类通过 mixin 组合提供所有环境变量管理功能。
 - _groups.py  → GroupMixin（分组管理）
 - _history.py → HistoryMixin（操作日志）
 - _schema.py  → SchemaMixin（变量 schema）
+
+启动开销：加密（hashlib/hmac/_crypto）、子进程（subprocess）和写入
+（tempfile/shutil）相关模块在首次使用时才导入，`evm get` 等只读命令不加载它们。
 """
 
-import base64
 import fcntl
-import hashlib
-import hmac
 import json
 import os
-import platform
 import re
 import shlex
-import shutil
-import subprocess
 import sys
-import tempfile
 import time
+from collections.abc import Callable, Iterator, Set
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
 
-from ._crypto import decrypt_v3, encrypt_v3
 from ._groups import GroupMixin
 from ._history import HistoryMixin
 from ._io import IOMixin
 from ._schema import SchemaMixin
+from ._storage import (
+    STORAGE_ENGINES,
+    ChangeTrackingDict,
+    append_wal,
+    cached_store,
+    change_records,
+    forget_store,
+    remember_store,
+    replay_wal,
+    should_compact,
+    store_signature,
+    wal_path,
+)
+from ._template import TEMPLATE_PATTERN, TemplateResolver
 from .exceptions import (
     CommandNotFoundError,
     CorruptedStorageError,
@@ -46,6 +57,13 @@ from .exceptions import (
     StorageError,
 )
 
+if TYPE_CHECKING:
+    from ._trigram import TrigramIndex
+
+
+class _BatchPreviewDone(Exception):
+    """batch(dry_run=True) 预览结束：抛出以回滚事务（不会传出 batch）"""
+
 
 class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
     """环境变量管理器核心类
@@ -57,49 +75,158 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
     SECRET_PREFIX = "ENC:"
     SECRET_V2_PREFIX = "ENCv2:"
     SECRET_V3_PREFIX = "ENCv3:"
+    SECRET_V4_PREFIX = "ENCv4:"
+    SECRET_PREFIXES = (
+        SECRET_PREFIX, SECRET_V2_PREFIX, SECRET_V3_PREFIX, SECRET_V4_PREFIX,
+    )
+    # 新写入密文的可选格式
+    SECRET_FORMATS = ('v3', 'v4')
     # 模板引用模式 {{VAR_NAME}}
-    TEMPLATE_PATTERN = re.compile(r'\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}')
+    TEMPLATE_PATTERN = TEMPLATE_PATTERN
     # 文件锁默认超时（秒）
     LOCK_TIMEOUT = 5.0
+    # 锁被占用时的重试间隔：从 LOCK_RETRY_MIN 起指数增长，上限 LOCK_RETRY_MAX（秒）
+    LOCK_RETRY_MIN = 0.001
+    LOCK_RETRY_MAX = 0.05
+
+    _vars: ChangeTrackingDict
 
     def __init__(
         self,
         env_file: Optional[str] = None,
         lock_timeout: float = LOCK_TIMEOUT,
+        storage: Optional[str] = None,
+        secret_format: Optional[str] = None,
+        auto_refresh: Optional[float] = None,
     ):
         """初始化环境管理器
 
         Args:
             env_file: 存储文件路径，默认 ~/.evm/env.json
             lock_timeout: 文件锁超时秒数
+            storage: 存储引擎 'json'（每次整体重写）或 'wal'（追加日志 +
+                定期压缩），默认读取 $EVM_STORAGE，未设置时为 'json'
+            secret_format: 新密文格式 'v3'（每值独立盐）或 'v4'（存储级盐 +
+                每值 nonce，整库解密只需一次 PBKDF2），默认读取
+                $EVM_SECRET_FORMAT，未设置时为 'v3'
+            auto_refresh: 自动 refresh() 的最小间隔（秒）。设置后访问变量时
+                若距上次检查已超过该间隔，先 stat 存储文件，被外部修改则
+                重新加载；0 表示每次访问都检查。默认 None（不自动刷新）
+
+        Raises:
+            StorageError: 未知的存储引擎
+            EVMError: 未知的密文格式
         """
         if env_file is None:
             self.env_file = Path.home() / '.evm' / 'env.json'
         else:
             self.env_file = Path(env_file)
 
+        storage = storage or os.environ.get('EVM_STORAGE') or 'json'
+        if storage not in STORAGE_ENGINES:
+            raise StorageError(
+                f"Unknown storage engine '{storage}'. "
+                f"Available: {', '.join(STORAGE_ENGINES)}"
+            )
+        self.storage = storage
+        secret_format = (
+            secret_format or os.environ.get('EVM_SECRET_FORMAT') or 'v3'
+        )
+        if secret_format not in self.SECRET_FORMATS:
+            raise EVMError(
+                f"Unknown secret format '{secret_format}'. "
+                f"Available: {', '.join(self.SECRET_FORMATS)}"
+            )
+        self.secret_format = secret_format
+        self._store_salt: Optional[bytes] = None
         self.lock_timeout = lock_timeout
+        # 本管理器的锁竞争统计（info()['lock']）
+        self.lock_stats: dict[str, Any] = {
+            'acquired': 0,
+            'contended': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
         self._secret_warning_shown = False
+        # 事务状态：嵌套深度、是否有未提交修改、缓冲的历史记录
+        self._txn_depth = 0
+        self._txn_dirty = False
+        self._pending_history: Optional[list[dict]] = None
+        self._resolver: Optional[TemplateResolver] = None
+        # 已加载/已写入数据对应的存储签名；值搜索的三元组索引（按需加载）
+        self._store_source: Optional[tuple] = None
+        self._trigram: Optional[TrigramIndex] = None
+        # 自动刷新：间隔秒数与下次检查的 monotonic 时刻（None 表示关闭）
+        self.auto_refresh = auto_refresh
+        self._refresh_at: Optional[float] = None
         self.env_file.parent.mkdir(parents=True, exist_ok=True)
-        self._env_vars = self._load_env_vars()
+        self._env_vars = ChangeTrackingDict(self._load_env_vars())
+        if auto_refresh is not None:
+            self._refresh_at = time.monotonic() + auto_refresh
 
     # ── 内部存储 ──────────────────────────────────────────
 
+    @property
+    def _env_vars(self) -> ChangeTrackingDict:
+        """内存中的变量字典（ChangeTrackingDict，记录未提交的增量）"""
+        if self._refresh_at is not None:
+            now = time.monotonic()
+            interval = self.auto_refresh
+            if interval is not None and now >= self._refresh_at:
+                self._refresh_at = now + interval
+                self.refresh()
+        return self._vars
+
+    @_env_vars.setter
+    def _env_vars(self, value: dict[str, str]) -> None:
+        # 整体替换普通 dict 时视为重置：下次保存写完整快照
+        if not isinstance(value, ChangeTrackingDict):
+            value = ChangeTrackingDict(value)
+            value.reset = True
+        self._vars = value
+
     def _load_env_vars(self) -> dict[str, str]:
-        """从存储文件加载环境变量
+        """从存储文件加载环境变量（快照 + 重放 env.wal）
+
+        存储签名与进程级缓存一致时直接复用已解析的数据（不读文件、不加锁）；
+        否则在 .lock 共享锁下读取，不会读到提交进行到一半的快照 + 日志。
+        返回值可能与缓存共享，调用方须复制（ChangeTrackingDict(...)）后再修改。
 
         Raises:
-            CorruptedStorageError: JSON 文件损坏
+            CorruptedStorageError: JSON 文件或 WAL 损坏
             StorageError: IO 或权限错误
+            LockTimeoutError: lock_timeout 内未获取共享锁
         """
-        if not self.env_file.exists():
+        source = store_signature(self.env_file)
+        if source == (None, None):
+            self._store_source = source
             return {}
+        cached = cached_store(self.env_file, source)
+        if cached is not None:
+            self._store_source = source
+            return cached
+        with self._store_lock(shared=True):
+            return self._read_store()
+
+    def _read_store(self) -> dict[str, str]:
+        """读取快照并重放 env.wal，记录对应的存储签名（调用方须持有 .lock）"""
+        self._store_source = source = store_signature(self.env_file)
+        if source == (None, None):
+            return {}
+        wal = wal_path(self.env_file)
         try:
-            with open(self.env_file, encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    return {}
-                return json.loads(content)  # type: ignore[no-any-return]
+            data: dict[str, str] = {}
+            if self.env_file.exists():
+                with open(self.env_file, encoding='utf-8') as f:
+                    content = f.read().strip()
+                    if content:
+                        data = json.loads(content)
+            if wal.exists():
+                replay_wal(data, wal)
+            remember_store(self.env_file, source, data)
+            return data
         except json.JSONDecodeError as e:
             raise CorruptedStorageError(
                 f"Storage file is corrupted: {e}. File: {self.env_file}"
@@ -113,48 +240,81 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
                 f"IO error reading storage file: {e}"
             ) from e
 
+    def refresh(self) -> bool:
+        """存储被外部修改时重新加载
+
+        先 stat env.json / env.wal，签名（inode、mtime、大小）与上次加载或
+        写入时一致则什么都不做；否则重新读取（其他管理器已解析过同一版本时
+        直接复用进程级缓存）。事务进行中或有未提交的修改时不刷新。
+
+        Returns:
+            是否重新加载了数据
+
+        Raises:
+            CorruptedStorageError: 存储文件损坏
+            StorageError: IO 或权限错误
+        """
+        env_vars = self._vars
+        if self._txn_depth or env_vars.changes or env_vars.reset:
+            return False
+        if store_signature(self.env_file) == self._store_source:
+            return False
+        self._vars = ChangeTrackingDict(self._load_env_vars())
+        self._store_salt = None
+        return True
+
     def _save_env_vars(self, dry_run: bool = False) -> None:
         """保存环境变量到存储文件（原子写入 + 共享锁文件 + chmod 600）
 
         #1 fix: 使用独立的 .lock 文件加锁，而非锁临时文件。
         两个并发进程争夺同一个 .lock 文件的排他锁，
         确保 write + move 操作的原子性。
+
+        事务进行中只标记为脏，由 transaction() 退出时统一写入一次。
+        wal 引擎只追加本次增量到 env.wal，超过阈值或整体重置时压缩为快照。
+
+        合并提交：加锁后若存储签名与上次加载/写入时不同（其他进程已提交），
+        先在锁内重新读取存储，把本管理器记录的增量（set/delete）叠加其上
+        再写入，并发写入不同 key 不会互相覆盖；同一 key 以后提交者为准。
+        整体重置（clear、restore、load --replace）不合并。
         """
         if dry_run:
             return
+        if self._txn_depth:
+            self._txn_dirty = True
+            return
 
-        lock_path = str(self.env_file) + '.lock'
-        lock_fd = None
-        try:
-            # 打开共享锁文件（所有进程竞争同一资源）
-            lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
-            self._acquire_lock(lock_fd)
-            try:
-                tmp_fd, tmp_path = tempfile.mkstemp(
-                    dir=str(self.env_file.parent),
-                    suffix='.tmp',
-                    prefix='.env_',
-                )
-                try:
-                    with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
-                        json.dump(
-                            self._env_vars, f, indent=2, ensure_ascii=False
-                        )
-                        f.flush()
-                        os.fsync(f.fileno())
-                except Exception:
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
-                    raise
-
-                # 原子替换（在锁保护下）
-                shutil.move(tmp_path, str(self.env_file))
-                os.chmod(str(self.env_file), 0o600)
-            finally:
-                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        env_vars = self._vars
+        if self.storage == 'wal' and not env_vars.reset and not env_vars.changes:
+            return
 
-        except LockTimeoutError:
-            raise
+        try:
+            with self._store_lock():
+                if not env_vars.reset:
+                    self._merge_committed(env_vars)
+                wal = wal_path(self.env_file)
+                if self.storage == 'wal' and not env_vars.reset:
+                    wal_size = append_wal(
+                        wal, change_records(env_vars.changes)
+                    )
+                    snapshot_size = (
+                        self.env_file.stat().st_size
+                        if self.env_file.exists() else 0
+                    )
+                    if should_compact(wal_size, snapshot_size):
+                        self._write_snapshot()
+                        os.unlink(wal)
+                else:
+                    self._write_snapshot()
+                    if wal.exists():
+                        # 快照已包含全部状态，旧日志作废
+                        os.unlink(wal)
+                forget_store(self.env_file)
+                # 记录刚写入的签名：refresh()/合并提交据此判断他人是否提交过
+                self._store_source = source = store_signature(self.env_file)
+                self._record_trigram_changes(env_vars, source)
+                self._record_completion_index(env_vars)
+                env_vars.mark_committed()
         except PermissionError as e:
             raise StorageError(
                 f"Permission denied writing to: {self.env_file}"
@@ -163,27 +323,267 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
             raise StorageError(
                 f"IO error writing storage file: {e}"
             ) from e
+
+    def _merge_committed(self, env_vars: ChangeTrackingDict) -> None:
+        """并入其他进程自上次加载/写入以来的提交（调用方须持有 .lock）"""
+        if store_signature(self.env_file) == self._store_source:
+            return
+        if env_vars.rebase(self._read_store()):
+            # 内存中的三元组索引缺少他人的脏 key，下次搜索从磁盘重新加载
+            self._trigram = None
+
+    def _write_snapshot(self) -> None:
+        """原子写入完整快照 env.json（调用方须持有 .lock）"""
+        import shutil
+        import tempfile
+
+        tmp_fd, tmp_path = tempfile.mkstemp(
+            dir=str(self.env_file.parent),
+            suffix='.tmp',
+            prefix='.env_',
+        )
+        try:
+            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
+                json.dump(
+                    self._env_vars, f, indent=2, ensure_ascii=False
+                )
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        # 原子替换（在锁保护下）
+        shutil.move(tmp_path, str(self.env_file))
+        os.chmod(str(self.env_file), 0o600)
+
+    def _record_trigram_changes(
+        self, env_vars: ChangeTrackingDict, source: tuple
+    ) -> None:
+        """提交后维护三元组索引（调用方须持有 .lock）
+
+        增量提交把修改过的 key 追加到 env.trgm.log；整体重置时删除索引。
+        索引只是缓存，写失败时签名对不上，下次搜索自然重建。
+        """
+        from ._trigram import append_trigram_log, drop_trigram_index
+
+        try:
+            if env_vars.reset:
+                self._trigram = None
+                drop_trigram_index(self.env_file)
+                return
+            keys = list(env_vars.changes)
+            if append_trigram_log(self.env_file, keys, source):
+                if self._trigram is not None:
+                    self._trigram.dirty.update(keys)
+                    self._trigram.source = source
+        except OSError:
+            self._trigram = None
+
+    def _record_completion_index(self, env_vars: ChangeTrackingDict) -> None:
+        """key 集合有增删时重写 shell 补全索引（调用方须持有 .lock）
+
+        仅修改值的提交不重写；索引文件缺失时（旧版本创建的存储）补写。
+        """
+        from ._completion import completion_index_path, write_completion_index
+
+        if (
+            env_vars.reset
+            or env_vars.keys_changed
+            or not completion_index_path(self.env_file, 'keys').exists()
+        ):
+            write_completion_index(
+                self.env_file, env_vars, env_vars.group_counts()
+            )
+
+    @contextmanager
+    def _store_lock(self, shared: bool = False) -> Iterator[None]:
+        """持有存储 .lock：读取用共享锁（LOCK_SH），提交用排他锁（LOCK_EX）
+
+        所有进程竞争同一个 .lock 文件，而非锁临时文件或 env.json 本身。
+        共享锁在锁文件无法创建/打开时（只读目录等）退化为不加锁读取。
+
+        Raises:
+            LockTimeoutError: lock_timeout 内未获取锁
+            OSError: 无法打开锁文件（排他锁）
+        """
+        lock_path = str(self.env_file) + '.lock'
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+        except OSError:
+            if not shared:
+                raise
+            yield
+            return
+        try:
+            self._acquire_lock(fd, shared)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
         finally:
-            if lock_fd is not None:
-                try:
-                    os.close(lock_fd)
-                except OSError:
-                    pass
+            os.close(fd)
+
+    def _acquire_lock(self, fd: int, shared: bool = False) -> None:
+        """获取文件锁：先非阻塞尝试，被占用时指数退避重试直到 lock_timeout
 
-    def _acquire_lock(self, fd: int) -> None:
-        """获取排他文件锁，带超时重试
+        等待从 LOCK_RETRY_MIN 起每次翻倍、不超过 LOCK_RETRY_MAX，
+        短暂的竞争只需等待毫秒级；等待次数与耗时计入 lock_stats。
 
         Raises:
             LockTimeoutError: 超时未获取锁
         """
-        deadline = time.monotonic() + self.lock_timeout
-        while time.monotonic() < deadline:
+        operation = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        stats = self.lock_stats
+        stats['acquired'] += 1
+        try:
+            fcntl.flock(fd, operation)
+            return
+        except BlockingIOError:
+            pass
+
+        stats['contended'] += 1
+        start = time.monotonic()
+        deadline = start + self.lock_timeout
+        delay = self.LOCK_RETRY_MIN
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    stats['acquired'] -= 1
+                    stats['timeouts'] += 1
+                    raise LockTimeoutError(str(self.env_file), self.lock_timeout)
+                time.sleep(min(delay, deadline - now))
+                delay = min(delay * 2, self.LOCK_RETRY_MAX)
+                stats['retries'] += 1
+                try:
+                    fcntl.flock(fd, operation)
+                    return
+                except BlockingIOError:
+                    continue
+        finally:
+            waited = time.monotonic() - start
+            stats['wait_seconds'] += waited
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+
+    # ── 批量事务 ──────────────────────────────────────────
+
+    @contextmanager
+    def transaction(self) -> Iterator['EnvironmentManager']:
+        """批量写入事务：块内所有修改在退出时一次加锁、一次写入、一次 fsync
+
+        块内抛出异常时回滚内存状态并丢弃缓冲的历史记录，存储文件不变。
+        嵌套调用并入最外层事务。
+
+        用法::
+
+            with mgr.transaction():
+                for k, v in items:
+                    mgr.set(k, v)
+        """
+        if self._txn_depth:
+            self._txn_depth += 1
             try:
-                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                return
-            except OSError:
-                time.sleep(0.05)
-        raise LockTimeoutError(str(self.env_file), self.lock_timeout)
+                yield self
+            finally:
+                self._txn_depth -= 1
+            return
+
+        snapshot = self._snapshot_vars()
+        self._txn_depth = 1
+        self._txn_dirty = False
+        self._pending_history = []
+        try:
+            yield self
+        except BaseException:
+            self._txn_depth = 0
+            self._vars = snapshot
+            self._pending_history = None
+            raise
+
+        self._txn_depth = 0
+        entries, self._pending_history = self._pending_history, None
+        if self._txn_dirty:
+            self._txn_dirty = False
+            try:
+                self._save_env_vars()
+            except BaseException:
+                self._vars = snapshot
+                raise
+        self._append_history(entries)
+
+    def _snapshot_vars(self) -> ChangeTrackingDict:
+        """复制当前内存状态（含未提交增量），用于事务回滚"""
+        current = self._vars
+        snapshot = ChangeTrackingDict(current)
+        snapshot.changes = dict(current.changes)
+        snapshot.reset = current.reset
+        return snapshot
+
+    # 批量操作名 → (方法名, 参数个数)
+    BATCH_OPERATIONS: dict[str, tuple[str, int]] = {
+        'set': ('set', 2),
+        'set-secret': ('set_secret', 2),
+        'delete': ('delete', 1),
+        'rename': ('rename', 2),
+        'copy': ('copy', 2),
+        'setg': ('set_grouped', 3),
+        'deleteg': ('delete_grouped', 2),
+        'move-group': ('move_to_group', 2),
+        'delete-group': ('delete_group', 1),
+        'clear': ('clear', 0),
+    }
+
+    def batch(
+        self, operations: list[list[str]], dry_run: bool = False
+    ) -> dict:
+        """在单个事务中执行一组操作
+
+        Args:
+            operations: 每项为 ``[op, arg1, arg2, ...]``，op 见 BATCH_OPERATIONS
+            dry_run: 仅预览，不写入。各操作依次作用于内存中的事务，
+                结束时整体回滚，依赖前序操作的预览（如 set 后 rename）
+                与正式执行一致
+
+        Returns:
+            dict: ``{applied, messages}``
+
+        Raises:
+            EVMError: 未知操作或参数个数不符（整批回滚）
+        """
+        calls = []
+        for lineno, op in enumerate(operations, 1):
+            if not op:
+                continue
+            name, op_args = op[0], op[1:]
+            spec = self.BATCH_OPERATIONS.get(name)
+            if spec is None:
+                raise EVMError(
+                    f"Batch operation {lineno}: unknown operation '{name}'. "
+                    f"Available: {', '.join(sorted(self.BATCH_OPERATIONS))}"
+                )
+            method, argc = spec
+            if len(op_args) != argc:
+                raise EVMError(
+                    f"Batch operation {lineno}: '{name}' expects "
+                    f"{argc} argument(s), got {len(op_args)}"
+                )
+            calls.append((getattr(self, method), op_args))
+
+        messages = []
+        try:
+            with self.transaction():
+                for fn, op_args in calls:
+                    messages.append(fn(*op_args, dry_run=dry_run))
+                    if dry_run:
+                        # 预览后再应用到内存，后续操作看到前序操作的结果
+                        fn(*op_args)
+                if dry_run:
+                    raise _BatchPreviewDone
+        except _BatchPreviewDone:
+            pass
+        return {'applied': len(calls), 'messages': messages}
 
     # ── 基本 CRUD ────────────────────────────────────────
 
@@ -245,23 +645,19 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
         if group:
             prefix = f"{group}:"
-            filtered = {
-                k: v for k, v in self._env_vars.items()
-                if k.startswith(prefix)
-            }
-            if not filtered:
+            env_vars = self._env_vars
+            keys = env_vars.group_keys(group)
+            if not keys:
                 raise GroupNotFoundError(group)
             if no_prefix:
-                result = {}
-                for key, value in filtered.items():
-                    new_key = key[len(prefix):] if key.startswith(prefix) else key
-                    result[new_key] = value
-                return result
-            return filtered
+                return {key[len(prefix):]: env_vars[key] for key in keys}
+            return {key: env_vars[key] for key in keys}
         elif pattern:
+            needle = pattern.casefold()
             return {
-                k: v for k, v in self._env_vars.items()
-                if pattern.lower() in k.lower()
+                k: self._env_vars[k]
+                for k, (folded_key, _) in self._env_vars.folded_items()
+                if needle in folded_key
             }
         else:
             return dict(self._env_vars)
@@ -284,15 +680,113 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
     # ── 搜索 ─────────────────────────────────────────────
 
-    def search(self, pattern: str, search_value: bool = False) -> dict[str, str]:
-        """搜索环境变量"""
-        results = {}
-        for key, value in self._env_vars.items():
-            if pattern.lower() in key.lower():
-                results[key] = value
-            elif search_value and pattern.lower() in str(value).lower():
-                results[key] = value
-        return results
+    # 搜索模式：子串 / shell 通配符 / 正则
+    SEARCH_MODES = ('substring', 'glob', 'regex')
+
+    def search(
+        self,
+        pattern: str,
+        search_value: bool = False,
+        mode: str = 'substring',
+    ) -> dict[str, str]:
+        """搜索环境变量（不区分大小写）
+
+        Args:
+            pattern: 搜索模式串
+            search_value: 是否同时匹配值
+            mode: 'substring' 子串包含；'glob' 通配符匹配整个 key/值
+                （如 ``DB_*``）；'regex' 正则 search
+
+        Raises:
+            EVMError: 未知模式或正则不合法
+        """
+        env_vars = self._env_vars
+        if mode == 'regex':
+            try:
+                regex_search = re.compile(pattern, re.IGNORECASE).search
+            except re.error as e:
+                raise EVMError(f"Invalid regex '{pattern}': {e}")
+            return {
+                key: value for key, value in env_vars.items()
+                if regex_search(key) or (search_value and regex_search(str(value)))
+            }
+
+        # substring / glob 在 casefold 索引上匹配，不再逐条转小写
+        if mode == 'glob':
+            import fnmatch
+
+            glob_match = re.compile(fnmatch.translate(pattern.casefold())).match
+
+            def text_match(text: str) -> bool:
+                return glob_match(text) is not None
+        elif mode == 'substring':
+            needle = pattern.casefold()
+
+            def text_match(text: str) -> bool:
+                return needle in text
+        else:
+            raise EVMError(
+                f"Unknown search mode '{mode}'. "
+                f"Available: {', '.join(self.SEARCH_MODES)}"
+            )
+        if search_value and mode == 'substring':
+            candidates = self._value_candidates(needle)
+            if candidates is not None:
+                # 大存储：值只对三元组索引筛出的候选做精确匹配
+                return {
+                    key: value for key, value in env_vars.items()
+                    if needle in key.casefold() or (
+                        key in candidates and needle in str(value).casefold()
+                    )
+                }
+        return {
+            key: env_vars[key]
+            for key, (folded_key, folded_value) in env_vars.folded_items()
+            if text_match(folded_key) or (search_value and text_match(folded_value))
+        }
+
+    def _value_candidates(self, needle: str) -> Optional[Set[str]]:
+        """值中可能包含 needle 的 key；不适用索引时返回 None（全量扫描）"""
+        env_vars = self._env_vars
+        if len(needle) < 3 or env_vars.reset or env_vars.changes:
+            return None
+        index = self._trigram_index()
+        if index is None:
+            return None
+        return index.candidates(needle)
+
+    def _trigram_index(self) -> Optional['TrigramIndex']:
+        """存储达到阈值时返回与当前数据一致的三元组索引
+
+        依次尝试内存中的索引、磁盘上的 env.trgm（+ 增量日志），
+        签名不符或脏 key 过多时重建并在 .lock 下写回。
+        """
+        from ._trigram import TrigramIndex, trigram_min_bytes
+
+        source = self._store_source
+        if source is None:
+            return None
+        size = sum(sig[1] for sig in source if sig is not None)
+        if size < trigram_min_bytes():
+            return None
+
+        index = self._trigram
+        if index is None or index.source != source:
+            index = TrigramIndex.load(self.env_file)
+        if index is None or index.source != source or index.needs_rebuild():
+            index = TrigramIndex.build(self._env_vars, source)
+            self._persist_trigram_index(index)
+        self._trigram = index
+        return index
+
+    def _persist_trigram_index(self, index: 'TrigramIndex') -> None:
+        """写回重建的索引；等锁超时或存储已被他人修改时只保留在内存中"""
+        try:
+            with self._store_lock():
+                if store_signature(self.env_file) == index.source:
+                    index.save(self.env_file)
+        except (LockTimeoutError, OSError):
+            pass
 
     # ── 重命名/复制 ──────────────────────────────────────
 
@@ -329,10 +823,15 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         self,
         filter_prefix: Optional[str] = None,
         add_evm_prefix: bool = True,
+        expand: bool = False,
     ) -> tuple[int, bool, Optional[str]]:
-        """加载环境变量到 os.environ"""
+        """加载环境变量到 os.environ
+
+        expand=True 时先一次性展开全部 {{VAR}} 模板再写入。
+        """
+        values = self._expanded_values() if expand else self._env_vars
         loaded_count = 0
-        for key, value in self._env_vars.items():
+        for key, value in values.items():
             if filter_prefix and not key.startswith(filter_prefix):
                 continue
             final_key = f"EVM:{key}" if add_evm_prefix else key
@@ -342,11 +841,18 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
     # ── 执行命令 ──────────────────────────────────────────
 
-    def execute(self, command: list[str]) -> int:
+    def execute(
+        self,
+        command: list[str],
+        include_secrets: bool = False,
+        expand: bool = False,
+    ) -> int:
         """使用环境变量执行命令
 
         P1: 改用 subprocess.run 替代 os.execvpe，
         以便 Agent 可以捕获退出码。
+        include_secrets=True 时加密变量批量解密后以明文传入子进程。
+        expand=True 时传入的是一次性展开 {{VAR}} 模板后的值。
 
         Returns:
             子进程的退出码
@@ -354,9 +860,16 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         if not command:
             raise EVMError("No command specified")
 
+        import subprocess
+
         env_copy = os.environ.copy()
         for key, value in self._env_vars.items():
             env_copy[key] = str(value)
+        secrets = self.get_secrets() if include_secrets else {}
+        if expand:
+            env_copy.update(self._expanded_values(secrets))
+        else:
+            env_copy.update(secrets)
 
         try:
             result = subprocess.run(command, env=env_copy)
@@ -378,6 +891,7 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         group: Optional[str] = None,
         include_secrets: bool = False,
         prefix: Optional[str] = None,
+        expand: bool = False,
     ) -> dict:
         """生成可被 shell eval 的导出语句
 
@@ -395,6 +909,7 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
             group: 仅导出指定分组的变量。
             include_secrets: 是否解密并导出加密变量。
             prefix: 给所有导出 key 加前缀（如 ``EVM_``）。
+            expand: 导出前一次性展开整个存储的 ``{{VAR}}`` 模板。
 
         Returns:
             dict: ``{shell, count, variables, skipped, output}``
@@ -405,11 +920,17 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
         group_prefix = f"{group}:" if group else None
 
-        for key, value in self._env_vars.items():
+        candidates: list[tuple[str, str, str]] = []
+        secret_keys: list[str] = []
+        env_vars = self._env_vars
+        # 指定分组时只遍历分组索引中的 key
+        items = (
+            ((k, env_vars[k]) for k in env_vars.group_keys(group))
+            if group else env_vars.items()
+        )
+        for key, value in items:
             # 分组过滤
             if group_prefix:
-                if not key.startswith(group_prefix):
-                    continue
                 final_key = key[len(group_prefix):]
             else:
                 # 默认跳过分组变量（含冒号，非合法 shell 标识符）
@@ -422,27 +943,30 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
                 skipped.append(key)
                 continue
 
-            # 加密变量处理（v1 ENC: / v2 ENCv2: / v3 ENCv3:）
-            is_secret = isinstance(value, str) and value.startswith(
-                (self.SECRET_PREFIX,
-                 self.SECRET_V2_PREFIX,
-                 self.SECRET_V3_PREFIX)
-            )
-            if is_secret:
-                if not include_secrets:
-                    skipped.append(key)
-                    continue
-                plain = self.get_secret(key)
-            else:
-                plain = str(value)
-
             if prefix:
                 final_key = f"{prefix}{final_key}"
                 if not self._SHELL_ID_PATTERN.match(final_key):
                     skipped.append(key)
                     continue
 
-            injected[final_key] = plain
+            # 加密变量处理（v1 ENC: / v2 ENCv2: / v3 ENCv3: / v4 ENCv4:）
+            if self._is_secret(value):
+                if not include_secrets:
+                    skipped.append(key)
+                    continue
+                secret_keys.append(key)
+
+            candidates.append((key, final_key, str(value)))
+
+        # 加密变量一次性并行解密（迁移合并为一次写入）
+        secrets = self.get_secrets(secret_keys) if secret_keys else {}
+        if expand:
+            expanded = self._expanded_values(secrets)
+            for key, final_key, _ in candidates:
+                injected[final_key] = expanded[key]
+        else:
+            for key, final_key, plain in candidates:
+                injected[final_key] = secrets.get(key, plain)
 
         lines = []
         for k in sorted(injected):
@@ -467,6 +991,9 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         if key not in self._env_vars:
             raise KeyNotFoundError(key)
 
+        import subprocess
+        import tempfile
+
         editor = os.environ.get('EDITOR', os.environ.get('VISUAL', 'vi'))
         current_value = self._env_vars[key]
 
@@ -507,17 +1034,14 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
     def info(self) -> dict[str, object]:
         """返回工具元信息"""
+        import platform
+
         from . import __version__
 
         groups = self.list_groups()
         total_vars = len(self._env_vars)
         secret_count = sum(
-            1 for v in self._env_vars.values()
-            if isinstance(v, str) and (
-                v.startswith(self.SECRET_PREFIX)
-                or v.startswith(self.SECRET_V2_PREFIX)
-                or v.startswith(self.SECRET_V3_PREFIX)
-            )
+            1 for v in self._env_vars.values() if self._is_secret(v)
         )
 
         return {
@@ -528,6 +1052,12 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
             'platform': platform.system(),
             'storage_path': str(self.env_file),
             'storage_exists': self.env_file.exists(),
+            'storage_engine': self.storage,
+            'lock': {
+                **self.lock_stats,
+                'wait_seconds': round(self.lock_stats['wait_seconds'], 6),
+                'max_wait_seconds': round(self.lock_stats['max_wait_seconds'], 6),
+            },
             'total_variables': total_vars,
             'total_groups': len(groups),
             'secret_variables': secret_count,
@@ -537,47 +1067,53 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
     # ── 模板展开 ──────────────────────────────────────────
 
-    def expand(self, key: str, depth: int = 0, max_depth: int = 10) -> str:
-        """展开变量值中的模板引用 {{OTHER_VAR}}"""
-        if key not in self._env_vars:
-            raise KeyNotFoundError(key)
-        if depth > max_depth:
-            raise EVMError(
-                f"Template expansion exceeded max depth ({max_depth}). "
-                f"Possible circular reference."
-            )
+    def _template_resolver(self) -> TemplateResolver:
+        """获取绑定到当前变量字典的模板解析器
 
-        value = self._env_vars[key]
+        变量字典被整体替换（重新加载、事务回滚）时重建；
+        单个 key 的修改经 ChangeTrackingDict.on_change 增量失效。
+        """
+        resolver = self._resolver
+        if resolver is None or resolver.env_vars is not self._vars:
+            resolver = TemplateResolver(self._vars)
+            self._vars.on_change = resolver.invalidate
+            self._resolver = resolver
+        return resolver
 
-        def replace_match(match):
-            ref_key = match.group(1)
-            if ref_key in self._env_vars:
-                ref_val = self._env_vars[ref_key]
-                if self.TEMPLATE_PATTERN.search(ref_val):
-                    return self._expand_value(
-                        ref_val, depth + 1, max_depth
-                    )
-                return ref_val
-            return match.group(0)
+    def expand(self, key: str) -> str:
+        """展开变量值中的模板引用 {{OTHER_VAR}}
 
-        return self.TEMPLATE_PATTERN.sub(replace_match, value)
+        引用递归展开，未定义的引用原样保留；结果被缓存，
+        被引用的变量修改后自动失效。
 
-    def _expand_value(
-        self, value: str, depth: int, max_depth: int
-    ) -> str:
-        """内部：展开字符串中的模板引用"""
-        if depth > max_depth:
-            return value
-
-        def replace_match(match):
-            ref_key = match.group(1)
-            if ref_key in self._env_vars:
-                return self._expand_value(
-                    self._env_vars[ref_key], depth + 1, max_depth
-                )
-            return match.group(0)
+        Raises:
+            KeyNotFoundError: key 不存在
+            TemplateCycleError: 存在循环引用
+        """
+        return self._template_resolver().resolve(key)
 
-        return self.TEMPLATE_PATTERN.sub(replace_match, value)
+    def expand_all(self) -> dict[str, str]:
+        """展开所有变量（按引用图拓扑序，O(V+E)）
+
+        Raises:
+            TemplateCycleError: 存在循环引用
+        """
+        return self._template_resolver().resolve_all()
+
+    def _expanded_values(
+        self, secrets: Optional[dict[str, str]] = None
+    ) -> dict[str, str]:
+        """一次展开整个存储，供 inject/exec/export/loadmemory 的 expand 选项使用
+
+        Args:
+            secrets: 已解密的明文 {key: value}；提供时以明文参与展开
+                （此时不复用缓存的解析器，明文不会进入长期缓存）
+        """
+        if not secrets:
+            return self.expand_all()
+        merged = dict(self._env_vars)
+        merged.update(secrets)
+        return TemplateResolver(merged).resolve_all()
 
     # ── 加密变量（v3: HKDF + HMAC-CTR + Encrypt-then-MAC）──────
 
@@ -588,6 +1124,8 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         #2: 此盐值与机器绑定。hostname/uid/arch 变化会导致密钥不同。
         用户应知晓此限制。
         """
+        import platform
+
         machine_id = (
             platform.node()
             + str(os.getuid() if hasattr(os, 'getuid') else '')
@@ -595,22 +1133,79 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         )
         return machine_id.encode('utf-8')
 
+    @staticmethod
+    def _pbkdf2(password: bytes, salt: bytes) -> bytes:
+        """PBKDF2-HMAC-SHA256，100,000 次迭代"""
+        import hashlib
+
+        return hashlib.pbkdf2_hmac('sha256', password, salt, 100000, dklen=32)
+
     def _derive_master_key(self, salt: bytes) -> bytes:
-        """#4+#15: PBKDF2 派生主密钥，供 _crypto.py 使用"""
-        return hashlib.pbkdf2_hmac(
-            'sha256', self._get_machine_salt(), salt, 100000, dklen=32
+        """#4+#15: PBKDF2 派生主密钥，供 _crypto.py 使用
+
+        结果按 (机器标识, salt) 缓存在进程级 LRU 中，同一盐只派生一次。
+        """
+        from . import _crypto
+
+        return _crypto.MASTER_KEY_CACHE.get(
+            self._get_machine_salt(), salt, self._pbkdf2
         )
 
+    @classmethod
+    def _is_secret(cls, value: object) -> bool:
+        """值是否为任一版本的密文"""
+        return isinstance(value, str) and value.startswith(cls.SECRET_PREFIXES)
+
+    def _get_store_salt(self) -> bytes:
+        """v4 存储级盐：沿用库中已有 v4 密文的盐，否则新生成"""
+        import base64
+
+        if self._store_salt is None:
+            for value in self._env_vars.values():
+                if isinstance(value, str) and value.startswith(
+                    self.SECRET_V4_PREFIX
+                ):
+                    encoded = value[len(self.SECRET_V4_PREFIX):]
+                    try:
+                        self._store_salt = base64.b64decode(
+                            encoded.split(':', 1)[0]
+                        )
+                        break
+                    except ValueError:
+                        continue
+            else:
+                self._store_salt = os.urandom(16)
+        return self._store_salt  # type: ignore[return-value]
+
+    def _encrypt(self, plaintext: str) -> str:
+        """按 secret_format 加密（v3 或 v4）"""
+        from ._crypto import encrypt_v3, encrypt_v4
+
+        if self.secret_format == 'v4':
+            return encrypt_v4(
+                plaintext, self._get_store_salt(), self._derive_master_key
+            )
+        return encrypt_v3(plaintext, self._derive_master_key)
+
     # ── v2 兼容（保留旧版解密，供自动迁移使用）────────────
 
     def _derive_key_v2(self, salt: bytes) -> bytes:
-        """v2 兼容：PBKDF2 密钥派生（与 v3 共用参数）"""
-        return hashlib.pbkdf2_hmac(
-            'sha256', self._get_machine_salt(), salt, 100000, dklen=32
-        )
+        """v2 兼容：PBKDF2 密钥派生（与 v3 共用参数及缓存）"""
+        return self._derive_master_key(salt)
+
+    @staticmethod
+    def _repeat_key(key: bytes, length: int) -> bytes:
+        """v1/v2 重复密钥流：key 循环展开到 length 字节"""
+        return (bytes(key) * (length // len(key) + 1))[:length]
 
     def _decrypt_v2(self, encoded: str) -> str:
         """v2 兼容解密（重复密钥 XOR + HMAC）"""
+        import base64
+        import hashlib
+        import hmac
+
+        from ._crypto import xor_bytes
+
         parts = encoded.split(':')
         if len(parts) != 3:
             raise DecryptionError("Invalid v2 encrypted data format")
@@ -634,9 +1229,7 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
                 "Data integrity check failed (v2)"
             )
 
-        plaintext = bytes(
-            d ^ key[i % len(key)] for i, d in enumerate(ciphertext)
-        )
+        plaintext = xor_bytes(ciphertext, self._repeat_key(key, len(ciphertext)))
         try:
             return plaintext.decode('utf-8')
         except UnicodeDecodeError as e:
@@ -646,6 +1239,12 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
 
     def _decrypt_v1(self, encoded: str) -> str:
         """v1 兼容解密（简单 XOR + base64，无盐无 MAC）"""
+        import base64
+        import hashlib
+        import platform
+
+        from ._crypto import xor_bytes
+
         machine_id = (
             platform.node()
             + str(os.getuid() if hasattr(os, 'getuid') else '')
@@ -654,8 +1253,8 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
         key = hashlib.sha256(machine_id.encode()).digest()
         try:
             encrypted = base64.b64decode(encoded.encode('ascii'))
-            decrypted = bytes(
-                d ^ key[i % len(key)] for i, d in enumerate(encrypted)
+            decrypted = xor_bytes(
+                encrypted, self._repeat_key(key, len(encrypted))
             )
             return decrypted.decode('utf-8')
         except Exception as e:
@@ -668,7 +1267,8 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
     ) -> str:
         """加密存储变量
 
-        使用 v3 格式: HKDF 密钥分离 + HMAC-CTR + Encrypt-then-MAC。
+        默认 v3 格式: HKDF 密钥分离 + HMAC-CTR + Encrypt-then-MAC；
+        secret_format='v4' 时使用存储级盐 + 每值 nonce。
 
         #2: 首次使用时打印机器绑定警告。
         """
@@ -685,7 +1285,7 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
                 "another machine will make secrets unrecoverable.]"
             )
 
-        encrypted = encrypt_v3(value, self._derive_master_key)
+        encrypted = self._encrypt(value)
         self._env_vars[key] = encrypted
         self._save_env_vars()
         self.log_operation('set_secret', key)
@@ -694,46 +1294,182 @@ class EnvironmentManager(IOMixin, GroupMixin, HistoryMixin, SchemaMixin):
     def get_secret(self, key: str) -> str:
         """获取并解密变量
 
-        支持 v1/v2/v3 三种格式。
-        #16: 读取 v1/v2 格式时自动迁移到 v3。
+        支持 v1/v2/v3/v4 四种格式。
+        #16: 读取 v1/v2 格式时自动迁移到当前 secret_format。
         """
         value = self._env_vars.get(key)
         if value is None:
             raise KeyNotFoundError(key)
 
-        if isinstance(value, str) and value.startswith(self.SECRET_V3_PREFIX):
-            # v3: 直接解密
-            return decrypt_v3(
-                value[len(self.SECRET_V3_PREFIX):],
-                self._derive_master_key,
-            )
+        plaintext, legacy = self._decrypt_value(key, value)
+        if legacy:
+            self._migrate_secrets({key: (plaintext, legacy)})
+        return plaintext
 
-        elif isinstance(value, str) and value.startswith(self.SECRET_V2_PREFIX):
-            # #16: v2 → 解密后自动迁移到 v3
-            plaintext = self._decrypt_v2(
-                value[len(self.SECRET_V2_PREFIX):]
-            )
-            self._env_vars[key] = encrypt_v3(
-                plaintext, self._derive_master_key
-            )
-            self._save_env_vars()
-            self.log_operation('migrate_secret', key, 'v2 -> v3')
-            return plaintext
+    def get_secrets(
+        self,
+        keys: Optional[list[str]] = None,
+        workers: Optional[int] = None,
+    ) -> dict[str, str]:
+        """批量解密变量（线程池并行）
 
-        elif isinstance(value, str) and value.startswith(self.SECRET_PREFIX):
-            # #16: v1 → 解密后自动迁移到 v3
-            plaintext = self._decrypt_v1(
-                value[len(self.SECRET_PREFIX):]
-            )
-            self._env_vars[key] = encrypt_v3(
-                plaintext, self._derive_master_key
-            )
-            self._save_env_vars()
-            self.log_operation('migrate_secret', key, 'v1 -> v3')
-            return plaintext
+        PBKDF2 在 hashlib 中释放 GIL，多个不同盐的密文可在多核上并行派生。
+        其中的 v1/v2 值统一迁移，整批只写一次存储。
+
+        Args:
+            keys: 要解密的变量名，None 表示所有加密变量
+            workers: 并行线程数，默认 os.cpu_count()
 
+        Returns:
+            {key: plaintext}
+
+        Raises:
+            KeyNotFoundError: 指定的变量不存在
+            DecryptionError: 指定的变量不是密文或解密失败
+        """
+        if keys is None:
+            items = [
+                (k, v) for k, v in self._env_vars.items()
+                if self._is_secret(v)
+            ]
         else:
+            items = []
+            for key in keys:
+                value = self._env_vars.get(key)
+                if value is None:
+                    raise KeyNotFoundError(key)
+                items.append((key, value))
+
+        decrypted = self._map_parallel(
+            lambda kv: self._decrypt_value(*kv), items, workers
+        )
+
+        results: dict[str, str] = {}
+        migrations: dict[str, tuple[str, str]] = {}
+        for (key, _), (plaintext, legacy) in zip(items, decrypted):
+            results[key] = plaintext
+            if legacy:
+                migrations[key] = (plaintext, legacy)
+        if migrations:
+            self._migrate_secrets(migrations)
+        return results
+
+    def migrate_secrets(
+        self, workers: Optional[int] = None, dry_run: bool = False
+    ) -> dict[str, Any]:
+        """把所有 v1/v2 密文一次性迁移到当前 secret_format
+
+        解密与重新加密在线程池中并行完成，整批单事务写入一次，
+        并只记录一条汇总历史。任一值解密失败则不写入任何修改。
+
+        Returns:
+            {'migrated', 'keys', 'from', 'target_format',
+             'elapsed', 'per_second', 'dry_run'}
+        """
+        legacy = []
+        counts = {'v1': 0, 'v2': 0}
+        for key, value in self._env_vars.items():
+            if not isinstance(value, str):
+                continue
+            if value.startswith(self.SECRET_V2_PREFIX):
+                counts['v2'] += 1
+            elif value.startswith(self.SECRET_PREFIX):
+                counts['v1'] += 1
+            else:
+                continue
+            legacy.append((key, value))
+
+        result: dict[str, Any] = {
+            'migrated': len(legacy),
+            'keys': sorted(k for k, _ in legacy),
+            'from': counts,
+            'target_format': self.secret_format,
+            'elapsed': 0.0,
+            'per_second': 0.0,
+            'dry_run': dry_run,
+        }
+        if dry_run or not legacy:
+            return result
+
+        if self.secret_format == 'v4':
+            # 先确定存储级盐，避免线程间各自生成
+            self._get_store_salt()
+
+        def reencrypt(item: tuple[str, str]) -> str:
+            plaintext, _ = self._decrypt_value(*item)
+            return self._encrypt(plaintext)
+
+        start = time.perf_counter()
+        encrypted = self._map_parallel(reencrypt, legacy, workers)
+        with self.transaction():
+            for (key, _), new_value in zip(legacy, encrypted):
+                self._env_vars[key] = new_value
+            self._save_env_vars()
+            summary = ', '.join(f'{v}: {n}' for v, n in counts.items() if n)
+            self.log_operation(
+                'migrate_secrets', '',
+                f'{len(legacy)} secret(s) ({summary}) -> {self.secret_format}',
+            )
+        elapsed = time.perf_counter() - start
+
+        result['elapsed'] = round(elapsed, 4)
+        result['per_second'] = round(len(legacy) / elapsed, 1) if elapsed else 0.0
+        return result
+
+    @staticmethod
+    def _map_parallel(
+        fn: Callable[[Any], Any], items: list, workers: Optional[int]
+    ) -> list:
+        """在线程池中按顺序映射 fn（workers<=1 或单项时直接串行）"""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(items)))
+        if workers == 1:
+            return [fn(item) for item in items]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, items))
+
+    def _decrypt_value(self, key: str, value: str) -> tuple[str, Optional[str]]:
+        """解密单个密文（无副作用，可在线程中调用）
+
+        Returns:
+            (plaintext, legacy) —— legacy 为 'v1'/'v2' 表示需要迁移，否则 None
+
+        Raises:
+            DecryptionError: 不是密文或解密失败
+        """
+        from ._crypto import decrypt_v3, decrypt_v4
+
+        if not isinstance(value, str):
             raise DecryptionError(f"'{key}' is not an encrypted variable")
+        if value.startswith(self.SECRET_V4_PREFIX):
+            return decrypt_v4(
+                value[len(self.SECRET_V4_PREFIX):],
+                self._derive_master_key,
+            ), None
+        if value.startswith(self.SECRET_V3_PREFIX):
+            return decrypt_v3(
+                value[len(self.SECRET_V3_PREFIX):],
+                self._derive_master_key,
+            ), None
+        if value.startswith(self.SECRET_V2_PREFIX):
+            return self._decrypt_v2(value[len(self.SECRET_V2_PREFIX):]), 'v2'
+        if value.startswith(self.SECRET_PREFIX):
+            return self._decrypt_v1(value[len(self.SECRET_PREFIX):]), 'v1'
+        raise DecryptionError(f"'{key}' is not an encrypted variable")
+
+    def _migrate_secrets(self, migrations: dict[str, tuple[str, str]]) -> None:
+        """#16: 把已解密的 v1/v2 值重新加密为当前格式，单事务写入"""
+        with self.transaction():
+            for key, (plaintext, legacy) in migrations.items():
+                self._env_vars[key] = self._encrypt(plaintext)
+                self.log_operation(
+                    'migrate_secret', key, f'{legacy} -> {self.secret_format}'
+                )
+            self._save_env_vars()
 
 
 __all__ = ['EnvironmentManager']
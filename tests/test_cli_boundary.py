@@ -484,7 +484,7 @@ class TestCmdEditBoundaries:
         """edit --json → 结构化输出"""
         main(['--env-file', self.env_file, '--quiet', 'set', 'K', 'original'])
         capsys.readouterr()
-        with patch('evm.manager.subprocess.run') as mock_run:
+        with patch('subprocess.run') as mock_run:
             mock_run.return_value = type('Result', (), {'returncode': 0})()
             code = main(['--env-file', self.env_file, '--json', 'edit', 'K'])
             assert code == 0
@@ -40,6 +40,7 @@ from evm.exceptions import (
     KeyNotFoundError,
     SchemaError,
     StorageError,
+    TemplateCycleError,
     ValidationError,
 )
 
@@ -150,13 +151,13 @@ class TestExecuteBoundaries:
 
     def test_keyboard_interrupt_returns_130(self):
         """子进程 KeyboardInterrupt → 退出码 130"""
-        with patch('evm.manager.subprocess.run', side_effect=KeyboardInterrupt):
+        with patch('subprocess.run', side_effect=KeyboardInterrupt):
             code = self.mgr.execute(['false'])
             assert code == 130
 
     def test_generic_exception_raises_evmError(self):
         """子进程通用异常 → EVMError"""
-        with patch('evm.manager.subprocess.run', side_effect=RuntimeError('boom')):
+        with patch('subprocess.run', side_effect=RuntimeError('boom')):
             with pytest.raises(EVMError, match='Error executing'):
                 self.mgr.execute(['test'])
 
@@ -187,7 +188,7 @@ class TestEditBoundaries:
         self.mgr.set('K', 'val')
         mock_result = MagicMock()
         mock_result.returncode = 1
-        with patch('evm.manager.subprocess.run', return_value=mock_result):
+        with patch('subprocess.run', return_value=mock_result):
             with pytest.raises(EditorError, match='exited with code'):
                 self.mgr.edit('K')
 
@@ -196,7 +197,7 @@ class TestEditBoundaries:
         self.mgr.set('K', 'original')
         mock_result = MagicMock()
         mock_result.returncode = 0
-        with patch('evm.manager.subprocess.run', return_value=mock_result):
+        with patch('subprocess.run', return_value=mock_result):
             # 编辑器不改内容，tmp 文件保持 'original'
             msg = self.mgr.edit('K')
             assert 'No changes' in msg
@@ -214,19 +215,19 @@ class TestEditBoundaries:
                 f.write('new_value\n')
             return mock_result
 
-        with patch('evm.manager.subprocess.run', side_effect=fake_run):
+        with patch('subprocess.run', side_effect=fake_run):
             msg = self.mgr.edit('K')
             assert 'Updated' in msg
             assert self.mgr.get('K') == 'new_value'
 
 
 # ═══════════════════════════════════════════════════════════
-# manager.py — _expand_value 递归路径 (lines 474-485)
+# _template.py — 递归展开路径
 # ═══════════════════════════════════════════════════════════
 
 
 class TestExpandValueRecursive:
-    """_expand_value: 内部递归展开"""
+    """TemplateResolver: 递归展开"""
 
     def setup_method(self):
         self.temp_dir = tempfile.mkdtemp()
@@ -250,24 +251,22 @@ class TestExpandValueRecursive:
         result = self.mgr.expand('A')
         assert result == 'hello {{MISSING}}'
 
-    def test_max_depth_returns_value_silently(self):
-        """_expand_value 超过最大深度时静默返回当前值（不抛异常）"""
+    def test_chain_ending_in_missing_ref(self):
+        """引用链末端的未定义引用保留原文"""
         self.mgr.set('A', '{{B}}')
         self.mgr.set('B', '{{C}}')
         self.mgr.set('C', '{{D}}')
-        # depth=0 expand 会递归调用 _expand_value，每层 depth+1
-        # 当 depth > max_depth 时 _expand_value 返回原值
         result = self.mgr.expand('A')
-        # 最多展开 max_depth=10 层，此处只有 3 层，全部展开
         assert result == '{{D}}'  # D 不存在，保留原文
 
     def test_expand_circular_reference(self):
-        """循环引用在 max_depth 内静默停止"""
+        """循环引用抛出 TemplateCycleError 并给出环路"""
         self.mgr.set('A', '{{B}}')
         self.mgr.set('B', '{{A}}')
-        # 不会无限递归，_expand_value 在 depth > max_depth 时返回
-        result = self.mgr.expand('A')
-        assert '{{' in result  # 最终某层无法解析，保留模板语法
+        with pytest.raises(TemplateCycleError) as exc_info:
+            self.mgr.expand('A')
+        assert exc_info.value.cycle == ['A', 'B', 'A']
+        assert 'A -> B -> A' in str(exc_info.value)
 
 
 # ═══════════════════════════════════════════════════════════
@@ -740,7 +739,7 @@ class TestCliBranches:
         from evm.cli import main
         main(['--env-file', self.env_file, '--quiet', 'set', 'K', 'val'])
         capsys.readouterr()
-        with patch('evm.manager.subprocess.run') as mock_run:
+        with patch('subprocess.run') as mock_run:
             mock_run.return_value = MagicMock(returncode=0)
             code = main(['--env-file', self.env_file, '--quiet', 'edit', 'K'])
             assert code == 0
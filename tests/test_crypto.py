@@ -0,0 +1,428 @@
+"""
+加密性能相关测试
+
+覆盖：
+- MasterKeyCache 主密钥 LRU 缓存（命中、淘汰清零、clear）
+- v4 密文格式（存储级盐 + 每值 nonce）
+- 向量化 HMAC-CTR 密钥流与 xor_bytes（与旧实现逐字节一致）
+- get_secrets 批量并行解密（迁移合并为一次写入）
+- migrate_secrets / evm secrets migrate 一次性迁移 v1/v2
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from evm import _crypto
+from evm._crypto import (
+    MasterKeyCache,
+    decrypt_v4,
+    encrypt_v4,
+    hmac_ctr_keystream,
+    xor_bytes,
+)
+from evm.cli import main
+from evm.exceptions import DecryptionError, EVMError, KeyNotFoundError
+from evm.manager import EnvironmentManager
+
+
+def _legacy_v1(plaintext):
+    """构造 v1 格式密文（XOR + base64，无盐）"""
+    import platform
+    machine_id = platform.node() + str(os.getuid()) + platform.machine()
+    key = hashlib.sha256(machine_id.encode()).digest()
+    data = plaintext.encode('utf-8')
+    encrypted = bytes(d ^ key[i % len(key)] for i, d in enumerate(data))
+    return 'ENC:' + base64.b64encode(encrypted).decode()
+
+
+def _fast_derive(salt):
+    """测试用快速派生（避免 PBKDF2 开销）"""
+    return bytes((b + 1) % 256 for b in (salt * 2)[:32])
+
+
+# ══════════════════════════════════════════════════════════════
+# MasterKeyCache
+# ══════════════════════════════════════════════════════════════
+
+
+class TestMasterKeyCache:
+
+    def test_derives_once_per_salt(self):
+        cache = MasterKeyCache(maxsize=4)
+        calls = []
+
+        def derive(password, salt):
+            calls.append(salt)
+            return b'k' * 32
+
+        for _ in range(5):
+            assert cache.get(b'pw', b'salt1', derive) == b'k' * 32
+        cache.get(b'pw', b'salt2', derive)
+        assert calls == [b'salt1', b'salt2']
+        assert cache.hits == 4
+        assert cache.misses == 2
+
+    def test_password_is_part_of_cache_key(self):
+        cache = MasterKeyCache()
+        a = cache.get(b'pw1', b'salt', lambda p, s: p * 8)
+        b = cache.get(b'pw2', b'salt', lambda p, s: p * 8)
+        assert a != b
+
+    def test_eviction_wipes_oldest_key(self):
+        cache = MasterKeyCache(maxsize=2)
+        first = cache.get(b'pw', b's1', lambda p, s: b'\x01' * 32)
+        stored = cache._entries[(b'pw', b's1')]
+        cache.get(b'pw', b's2', lambda p, s: b'\x02' * 32)
+        cache.get(b'pw', b's3', lambda p, s: b'\x03' * 32)
+        assert len(cache) == 2
+        assert stored == bytes(32)
+        # 调用方持有的是副本，淘汰不影响正在进行的解密
+        assert first == b'\x01' * 32
+
+    def test_clear_wipes_all_keys(self):
+        cache = MasterKeyCache()
+        key = cache.get(b'pw', b's', lambda p, s: b'\xff' * 32)
+        stored = cache._entries[(b'pw', b's')]
+        cache.clear()
+        assert len(cache) == 0
+        assert stored == bytes(32)
+        assert key == b'\xff' * 32
+
+    def test_returns_immutable_copy(self):
+        cache = MasterKeyCache()
+        key = cache.get(b'pw', b's', lambda p, s: b'\x07' * 32)
+        assert type(key) is bytes
+        assert cache.get(b'pw', b's', lambda p, s: b'') == key
+
+    def test_concurrent_misses_derive_once(self):
+        cache = MasterKeyCache()
+        calls = []
+        started = threading.Event()
+
+        def derive(password, salt):
+            calls.append(salt)
+            started.set()
+            time.sleep(0.05)
+            return b'k' * 32
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            keys = list(pool.map(
+                lambda _: cache.get(b'pw', b'salt', derive), range(8)
+            ))
+        assert keys == [b'k' * 32] * 8
+        assert calls == [b'salt']
+        assert cache.misses == 1
+
+    def test_failed_derive_lets_waiter_retry(self):
+        cache = MasterKeyCache()
+        attempts = []
+
+        def derive(password, salt):
+            attempts.append(1)
+            if len(attempts) == 1:
+                time.sleep(0.05)
+                raise ValueError('boom')
+            return b'k' * 32
+
+        def get(_):
+            try:
+                return cache.get(b'pw', b'salt', derive)
+            except ValueError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(get, range(2)))
+        assert sorted(results, key=bool) == [None, b'k' * 32]
+        assert len(attempts) == 2
+        assert not cache._pending
+
+    def test_manager_uses_process_cache(self, tmp_path, monkeypatch):
+        cache = MasterKeyCache()
+        monkeypatch.setattr(_crypto, 'MASTER_KEY_CACHE', cache)
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        mgr.set_secret('S', 'value')
+        assert mgr.get_secret('S') == 'value'
+        assert mgr.get_secret('S') == 'value'
+        assert cache.misses == 1
+        assert cache.hits == 2
+
+
+# ══════════════════════════════════════════════════════════════
+# v4 格式
+# ══════════════════════════════════════════════════════════════
+
+
+class TestSecretV4:
+
+    def test_roundtrip(self):
+        salt = b's' * 16
+        encrypted = encrypt_v4('Hello 🔐', salt, _fast_derive)
+        assert encrypted.startswith('ENCv4:')
+        assert decrypt_v4(encrypted[len('ENCv4:'):], _fast_derive) == 'Hello 🔐'
+
+    def test_same_plaintext_different_nonce(self):
+        salt = b's' * 16
+        a = encrypt_v4('same', salt, _fast_derive)
+        b = encrypt_v4('same', salt, _fast_derive)
+        assert a != b
+        assert a.split(':')[1] == b.split(':')[1]
+
+    def test_tamper_detected(self):
+        encrypted = encrypt_v4('secret', b's' * 16, _fast_derive)
+        parts = encrypted[len('ENCv4:'):].split(':')
+        parts[3] = base64.b64encode(b'xxxxxx').decode()
+        with pytest.raises(DecryptionError, match='integrity'):
+            decrypt_v4(':'.join(parts), _fast_derive)
+
+    def test_bad_format(self):
+        with pytest.raises(DecryptionError, match='Invalid v4'):
+            decrypt_v4('only:two', _fast_derive)
+
+    def test_manager_v4_shares_one_store_salt(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        mgr = EnvironmentManager(env_file, secret_format='v4')
+        mgr.set_secret('A', 'alpha')
+        mgr.set_secret('B', 'beta')
+        salts = {mgr._env_vars[k].split(':')[1] for k in ('A', 'B')}
+        assert len(salts) == 1
+        # 新实例沿用已有的存储级盐
+        mgr2 = EnvironmentManager(env_file, secret_format='v4')
+        mgr2.set_secret('C', 'gamma')
+        assert mgr2._env_vars['C'].split(':')[1] in salts
+        assert mgr2.get_secret('A') == 'alpha'
+        assert mgr2.inject(include_secrets=True)['variables']['C'] == 'gamma'
+        assert mgr2.info()['secret_variables'] == 3
+
+    def test_v3_manager_reads_v4(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        EnvironmentManager(env_file, secret_format='v4').set_secret('A', 'x')
+        assert EnvironmentManager(env_file).get_secret('A') == 'x'
+
+    def test_format_from_environment(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('EVM_SECRET_FORMAT', 'v4')
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        mgr.set_secret('A', 'x')
+        assert mgr._env_vars['A'].startswith('ENCv4:')
+
+    def test_unknown_format_rejected(self, tmp_path):
+        with pytest.raises(EVMError, match='Unknown secret format'):
+            EnvironmentManager(str(tmp_path / 'env.json'), secret_format='v9')
+
+
+# ══════════════════════════════════════════════════════════════
+# 密钥流 / XOR
+# ══════════════════════════════════════════════════════════════
+
+
+def _legacy_keystream(key, iv, length):
+    stream = b''
+    counter = 0
+    while len(stream) < length:
+        stream += hmac.new(
+            key, iv + struct.pack('>I', counter), hashlib.sha256
+        ).digest()
+        counter += 1
+    return stream[:length]
+
+
+class TestKeystreamAndXor:
+
+    @pytest.mark.parametrize('length', [0, 1, 31, 32, 33, 1000, 65537])
+    def test_keystream_matches_legacy(self, length):
+        key, iv = os.urandom(32), os.urandom(16)
+        assert hmac_ctr_keystream(key, iv, length) == _legacy_keystream(key, iv, length)
+
+    @pytest.mark.parametrize('length', [0, 1, 7, 64, 4096])
+    def test_xor_matches_bytewise(self, length):
+        data, stream = os.urandom(length), os.urandom(length + 5)
+        expected = bytes(a ^ b for a, b in zip(data, stream))
+        assert xor_bytes(data, stream) == expected
+
+    def test_xor_preserves_leading_zero_bytes(self):
+        assert xor_bytes(b'\x00\x00\x01', b'\x00\x00\x00') == b'\x00\x00\x01'
+        assert xor_bytes(b'\x01\x00\x00', b'\x01\x00\x00') == b'\x00\x00\x00'
+
+    def test_large_secret_roundtrip(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        pem = '-----BEGIN KEY-----\n' + 'A' * 200_000 + '\n-----END KEY-----'
+        mgr.set_secret('PEM', pem)
+        assert mgr.get_secret('PEM') == pem
+
+
+# ══════════════════════════════════════════════════════════════
+# get_secrets 批量解密
+# ══════════════════════════════════════════════════════════════
+
+
+class TestGetSecrets:
+
+    @pytest.fixture
+    def mgr(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with mgr.transaction():
+            for i in range(6):
+                mgr.set_secret(f'S{i}', f'value-{i}')
+            mgr.set('PLAIN', 'p')
+        return mgr
+
+    @pytest.mark.parametrize('workers', [1, 4])
+    def test_all_secrets(self, mgr, workers):
+        result = mgr.get_secrets(workers=workers)
+        assert result == {f'S{i}': f'value-{i}' for i in range(6)}
+
+    def test_parallel_v4_derives_once(self, tmp_path, monkeypatch):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'), secret_format='v4')
+        with mgr.transaction():
+            for i in range(20):
+                mgr.set_secret(f'S{i}', f'value-{i}')
+        monkeypatch.setattr(_crypto, 'MASTER_KEY_CACHE', MasterKeyCache())
+        calls = []
+        pbkdf2 = EnvironmentManager._pbkdf2
+
+        def counting(password, salt):
+            calls.append(salt)
+            return pbkdf2(password, salt)
+
+        monkeypatch.setattr(EnvironmentManager, '_pbkdf2', staticmethod(counting))
+        result = mgr.get_secrets(workers=8)
+        assert result == {f'S{i}': f'value-{i}' for i in range(20)}
+        assert len(calls) == 1
+
+    def test_selected_keys(self, mgr):
+        assert mgr.get_secrets(['S1', 'S3']) == {'S1': 'value-1', 'S3': 'value-3'}
+
+    def test_missing_key(self, mgr):
+        with pytest.raises(KeyNotFoundError):
+            mgr.get_secrets(['S1', 'NOPE'])
+
+    def test_plain_key_rejected(self, mgr):
+        with pytest.raises(DecryptionError, match='not an encrypted'):
+            mgr.get_secrets(['PLAIN'])
+
+    def test_empty_store(self, tmp_path):
+        assert EnvironmentManager(str(tmp_path / 'env.json')).get_secrets() == {}
+
+    def test_legacy_migrated_in_single_save(self, mgr, monkeypatch):
+        for i in range(3):
+            mgr._env_vars[f'OLD{i}'] = _legacy_v1(f'old-{i}')
+        mgr._save_env_vars()
+
+        saves = []
+        original = mgr._write_snapshot
+        monkeypatch.setattr(
+            mgr, '_write_snapshot',
+            lambda *a, **kw: (saves.append(1), original(*a, **kw))[1],
+        )
+        result = mgr.get_secrets(['OLD0', 'OLD1', 'OLD2', 'S0'])
+        assert result['OLD2'] == 'old-2'
+        assert len(saves) == 1
+        for i in range(3):
+            assert mgr._env_vars[f'OLD{i}'].startswith('ENCv3:')
+        history = mgr.get_history()
+        assert sum(e['operation'] == 'migrate_secret' for e in history) == 3
+
+    def test_export_include_secrets(self, mgr, tmp_path):
+        out = tmp_path / 'out.json'
+        mgr.export('json', str(out), include_secrets=True)
+        data = json.loads(out.read_text())
+        assert data['S0'] == 'value-0'
+        assert data['PLAIN'] == 'p'
+        mgr.export('json', str(out))
+        assert json.loads(out.read_text())['S0'].startswith('ENCv3:')
+
+    def test_execute_include_secrets(self, mgr, tmp_path):
+        out = tmp_path / 'child.txt'
+        code = (
+            "import os, sys; "
+            "open(sys.argv[1], 'w').write(os.environ['S4'])"
+        )
+        assert mgr.execute([sys.executable, '-c', code, str(out)],
+                           include_secrets=True) == 0
+        assert out.read_text() == 'value-4'
+
+
+# ══════════════════════════════════════════════════════════════
+# migrate_secrets / evm secrets migrate
+# ══════════════════════════════════════════════════════════════
+
+
+class TestMigrateSecrets:
+
+    @pytest.fixture
+    def env_file(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        mgr = EnvironmentManager(env_file)
+        with mgr.transaction():
+            for i in range(5):
+                mgr._env_vars[f'OLD{i}'] = _legacy_v1(f'old-{i}')
+            mgr.set_secret('NEW', 'fresh')
+            mgr.set('PLAIN', 'p')
+        return env_file
+
+    def test_migrates_all_in_one_write(self, env_file, monkeypatch):
+        mgr = EnvironmentManager(env_file)
+        writes = []
+        original = mgr._write_snapshot
+        monkeypatch.setattr(
+            mgr, '_write_snapshot',
+            lambda *a, **kw: (writes.append(1), original(*a, **kw))[1],
+        )
+        result = mgr.migrate_secrets(workers=3)
+        assert result['migrated'] == 5
+        assert result['from'] == {'v1': 5, 'v2': 0}
+        assert result['target_format'] == 'v3'
+        assert len(writes) == 1
+
+        reloaded = EnvironmentManager(env_file)
+        for i in range(5):
+            assert reloaded._env_vars[f'OLD{i}'].startswith('ENCv3:')
+            assert reloaded.get_secret(f'OLD{i}') == f'old-{i}'
+        ops = [e['operation'] for e in reloaded.get_history()]
+        assert ops.count('migrate_secrets') == 1
+        assert 'migrate_secret' not in ops
+
+    def test_dry_run_writes_nothing(self, env_file):
+        mgr = EnvironmentManager(env_file)
+        before = dict(mgr._env_vars)
+        result = mgr.migrate_secrets(dry_run=True)
+        assert result['keys'] == [f'OLD{i}' for i in range(5)]
+        assert EnvironmentManager(env_file)._env_vars == before
+
+    def test_to_v4_shares_store_salt(self, env_file):
+        mgr = EnvironmentManager(env_file, secret_format='v4')
+        mgr.migrate_secrets(workers=4)
+        salts = {mgr._env_vars[f'OLD{i}'].split(':')[1] for i in range(5)}
+        assert len(salts) == 1
+
+    def test_failure_leaves_store_untouched(self, env_file):
+        mgr = EnvironmentManager(env_file)
+        mgr._env_vars['BROKEN'] = 'ENCv2:only_one_part'
+        mgr._save_env_vars()
+        with pytest.raises(DecryptionError):
+            mgr.migrate_secrets()
+        assert EnvironmentManager(env_file)._env_vars['OLD0'].startswith('ENC:')
+
+    def test_cli_json(self, env_file, capsys):
+        code = main(['--env-file', env_file, 'secrets', 'migrate',
+                     '--workers', '2', '--json'])
+        data = json.loads(capsys.readouterr().out)
+        assert code == 0
+        assert data['data']['migrated'] == 5
+        assert data['data']['per_second'] > 0
+
+    def test_cli_dry_run_text(self, env_file, capsys):
+        code = main(['--env-file', env_file, 'secrets', 'migrate', '--dry-run'])
+        out = capsys.readouterr().out
+        assert code == 0
+        assert 'Would migrate 5 secret(s)' in out
+        assert EnvironmentManager(env_file)._env_vars['OLD0'].startswith('ENC:')
@@ -0,0 +1,184 @@
+"""
+evm serve 守护进程与客户端测试
+
+守护进程在后台线程中运行，客户端经 Unix socket 转发命令。
+"""
+
+import json
+import os
+import threading
+
+import pytest
+
+from evm._client import _split_argv, try_daemon
+from evm._daemon import EVMDaemon
+from evm.cli import main
+from evm.manager import EnvironmentManager
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    env_file = str(tmp_path / 'env.json')
+    EnvironmentManager(env_file).set('A', '1')
+    # AF_UNIX 路径长度有限，socket 放在 tmp_path 下
+    d = EVMDaemon(env_file, socket_path=str(tmp_path / 's.sock'))
+    thread = threading.Thread(target=d.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('EVM_SOCKET', d.socket_path)
+    monkeypatch.setenv('EVM_DAEMON', '1')
+    yield d
+    d.shutdown()
+    thread.join(5)
+    d.close()
+
+
+def _run(capsys, env_file, *args):
+    code = main(['--env-file', env_file, *args])
+    out, err = capsys.readouterr()
+    return code, out, err
+
+
+class TestDaemon:
+
+    def test_get_matches_local_json_envelope(self, daemon, capsys, monkeypatch):
+        env_file = str(daemon.env_file)
+        remote = _run(capsys, env_file, 'get', 'A', '--json')
+        monkeypatch.delenv('EVM_DAEMON')
+        local = _run(capsys, env_file, 'get', 'A', '--json')
+        assert remote == local
+        assert json.loads(remote[1]) == {
+            'status': 'ok', 'data': {'key': 'A', 'value': '1'},
+        }
+
+    def test_commands_run_in_daemon(self, daemon, capsys, monkeypatch):
+        calls = []
+        original = daemon.handle
+        monkeypatch.setattr(daemon, 'handle', lambda r: (calls.append(r), original(r))[1])
+        code, _, _ = _run(capsys, str(daemon.env_file), 'set', 'B', '2')
+        assert code == 0
+        assert calls and calls[0]['argv'][-3:] == ['set', 'B', '2']
+        assert EnvironmentManager(str(daemon.env_file)).get('B') == '2'
+
+    def test_error_exit_code_forwarded(self, daemon, capsys):
+        code, _, err = _run(capsys, str(daemon.env_file), 'get', 'MISSING', '--json')
+        assert code == 2
+        assert json.loads(err)['error_code'] == 2
+
+    def test_reloads_after_external_change(self, daemon, capsys):
+        env_file = str(daemon.env_file)
+        assert _run(capsys, env_file, 'get', 'A')[1].strip() == '1'
+        EnvironmentManager(env_file).set('A', 'changed-elsewhere')
+        assert _run(capsys, env_file, 'get', 'A')[1].strip() == 'changed-elsewhere'
+
+    def test_own_write_not_reloaded(self, daemon, capsys):
+        env_file = str(daemon.env_file)
+        resident = daemon.manager._vars
+        assert _run(capsys, env_file, 'set', 'B', '2')[0] == 0
+        assert _run(capsys, env_file, 'get', 'B')[1].strip() == '2'
+        assert daemon.manager._vars is resident
+
+    def test_relative_export_uses_client_cwd(self, daemon, capsys, tmp_path, monkeypatch):
+        workdir = tmp_path / 'work'
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        code, _, _ = _run(capsys, str(daemon.env_file), 'export', '-o', 'out.json')
+        assert code == 0
+        assert json.loads((workdir / 'out.json').read_text()) == {'A': '1'}
+
+    def test_unsupported_command_runs_locally(self, daemon):
+        assert try_daemon(['exec', '--', 'true']) is None
+        reply = daemon.handle({'argv': ['exec', '--', 'true']})
+        assert reply['code'] == 1
+        assert 'not served' in reply['stderr']
+
+    def test_no_daemon_falls_back(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setenv('EVM_DAEMON', '1')
+        monkeypatch.setenv('EVM_SOCKET', str(tmp_path / 'nobody.sock'))
+        env_file = str(tmp_path / 'env.json')
+        assert try_daemon(['--env-file', env_file, 'list']) is None
+        assert _run(capsys, env_file, 'set', 'X', 'y')[0] == 0
+        assert EnvironmentManager(env_file).get('X') == 'y'
+
+    def test_socket_permissions_and_cleanup(self, tmp_path):
+        d = EVMDaemon(str(tmp_path / 'env.json'), socket_path=str(tmp_path / 'p.sock'))
+        try:
+            assert oct(os.stat(d.socket_path).st_mode & 0o777) == '0o600'
+        finally:
+            d.close()
+        assert not os.path.exists(d.socket_path)
+
+    def test_idle_client_does_not_block_others(self, daemon, capsys, monkeypatch):
+        import socket
+
+        from evm import _daemon
+
+        monkeypatch.setattr(_daemon._RequestHandler, 'timeout', 0.2)
+        idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        idle.connect(daemon.socket_path)
+        try:
+            code, out, _ = _run(capsys, str(daemon.env_file), 'get', 'A')
+        finally:
+            idle.close()
+        assert (code, out.strip()) == (0, '1')
+
+    def test_refuses_to_replace_live_daemon(self, daemon):
+        from evm.exceptions import EVMError
+
+        with pytest.raises(EVMError, match='already listening'):
+            EVMDaemon(str(daemon.env_file), socket_path=daemon.socket_path)
+        assert try_daemon(['--env-file', str(daemon.env_file), 'get', 'A']) == 0
+
+    def test_replaces_stale_socket(self, tmp_path):
+        import socket
+
+        path = str(tmp_path / 'stale.sock')
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        dead.bind(path)
+        dead.close()  # 文件残留，但无人监听
+        d = EVMDaemon(str(tmp_path / 'env.json'), socket_path=path)
+        d.close()
+
+    def test_refuses_non_socket_path(self, tmp_path):
+        from evm.exceptions import EVMError
+
+        path = tmp_path / 'not-a-socket'
+        path.write_text('keep me')
+        with pytest.raises(EVMError, match='non-socket'):
+            EVMDaemon(str(tmp_path / 'env.json'), socket_path=str(path))
+        assert path.read_text() == 'keep me'
+
+
+    @pytest.mark.parametrize('daemon_side, client_side', [
+        ('real', 'link'), ('link', 'real'),
+    ])
+    def test_symlinked_env_file_shares_socket(
+        self, tmp_path, monkeypatch, daemon_side, client_side
+    ):
+        monkeypatch.delenv('EVM_SOCKET', raising=False)
+        (tmp_path / 'real').mkdir()
+        (tmp_path / 'link').symlink_to(tmp_path / 'real')
+        EnvironmentManager(str(tmp_path / 'real' / 'env.json')).set('A', '1')
+        d = EVMDaemon(str(tmp_path / daemon_side / 'env.json'))
+        thread = threading.Thread(target=d.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client_env = str(tmp_path / client_side / 'env.json')
+            real = os.path.realpath(tmp_path / 'real' / 'env.json')
+            assert d.socket_path == real + '.sock'
+            assert try_daemon(['--env-file', client_env, 'get', 'A']) == 0
+        finally:
+            d.shutdown()
+            thread.join(5)
+            d.close()
+
+
+class TestSplitArgv:
+
+    @pytest.mark.parametrize('argv, expected', [
+        (['get', 'A'], (None, 'get')),
+        (['--env-file', 'x.json', '--json', 'list'], ('x.json', 'list')),
+        (['--env-file=x.json', 'set', 'A', 'B'], ('x.json', 'set')),
+        (['--json'], (None, None)),
+    ])
+    def test_split(self, argv, expected):
+        assert _split_argv(argv) == expected
@@ -0,0 +1,335 @@
+"""
+操作历史存储测试
+
+覆盖：
+- 分段轮转（history.jsonl → .1 → .2）与保留上限（单次大批量写入也按分段切开）
+- 追加热路径不读取历史文件
+- 旧版无 sidecar 的历史文件兼容
+- 反向分块读取与基于分段行数的 offset 跳过
+- 条件查询：活动分段扫描 .idx，已轮转分段按 .lookup 行号表取候选
+"""
+
+import builtins
+import json
+
+import pytest
+
+from evm.manager import EnvironmentManager
+
+
+@pytest.fixture
+def mgr(tmp_path):
+    mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+    mgr.MAX_HISTORY_ENTRIES = 10
+    return mgr
+
+
+def _lines(path):
+    return path.read_text(encoding='utf-8').splitlines()
+
+
+class TestHistoryRotation:
+
+    def test_rotates_when_segment_full(self, mgr):
+        for i in range(5):
+            mgr.log_operation('set', f'K{i}')
+        history_file = mgr._get_history_file()
+        assert not history_file.exists()
+        assert len(_lines(history_file.with_name('history.jsonl.1'))) == 5
+
+        mgr.log_operation('set', 'K5')
+        assert len(_lines(history_file)) == 1
+
+    def test_retains_at_least_max_entries(self, mgr):
+        for i in range(47):
+            mgr.log_operation('set', f'K{i}')
+        entries = mgr.get_history(limit=100)
+        assert 10 <= len(entries) <= 15
+        assert entries[0]['key'] == 'K46'
+        keys = [e['key'] for e in entries]
+        assert keys == [f'K{i}' for i in range(46, 46 - len(keys), -1)]
+        assert len(mgr._history_segments()) <= 3
+
+    def test_single_batch_rotates_at_segment_boundary(self, mgr):
+        mgr.log_operation('set', 'FIRST')
+        with mgr.transaction():
+            for i in range(23):
+                mgr.log_operation('set', f'K{i}')
+        history_file = mgr._get_history_file()
+        for segment in mgr._history_segments():
+            assert len(_lines(segment)) <= 5
+        # 1 + 23 = 24 条：4 个满分段轮转，活动分段 4 条，只保留 2 个旧分段
+        assert len(_lines(history_file)) == 4
+        entries = mgr.get_history(limit=100)
+        assert [e['key'] for e in entries] == [f'K{i}' for i in range(22, 8, -1)]
+        assert mgr._read_history_meta() == {'lines': 4, 'rotated': [5, 5]}
+        assert [e['key'] for e in mgr.query_history(key='K1*')] == [
+            'K19', 'K18', 'K17', 'K16', 'K15', 'K14', 'K13', 'K12', 'K11', 'K10',
+        ]
+
+    def test_append_does_not_read_history(self, mgr, monkeypatch):
+        for i in range(3):
+            mgr.log_operation('set', f'K{i}')
+        history_file = str(mgr._get_history_file())
+        real_open = builtins.open
+
+        def guarded_open(file, *args, **kwargs):
+            assert str(file) != history_file, 'history read on append'
+            return real_open(file, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, 'open', guarded_open)
+        for i in range(20):
+            mgr.log_operation('set', f'X{i}')
+        monkeypatch.undo()
+        assert mgr.get_history(limit=1)[0]['key'] == 'X19'
+
+    def test_legacy_file_without_sidecar(self, mgr):
+        history_file = mgr._get_history_file()
+        history_file.write_text(''.join(
+            json.dumps({'operation': 'set', 'key': f'OLD{i}'}) + '\n'
+            for i in range(30)
+        ))
+        mgr.log_operation('set', 'NEW')
+        # 超长的旧文件在首次追加时整体轮转
+        assert not history_file.exists()
+        assert mgr.get_history(limit=1)[0]['key'] == 'NEW'
+
+    def test_clear_removes_all_segments(self, mgr):
+        for i in range(12):
+            mgr.log_operation('set', f'K{i}')
+        assert mgr.clear_history() == 'History cleared'
+        assert mgr._history_segments() == []
+        assert not mgr._history_meta_file().exists()
+        assert not list(mgr.env_file.parent.glob('history.jsonl*'))
+        assert mgr.get_history() == []
+
+    def test_shrinking_max_drops_stale_segments(self, mgr):
+        for i in range(20):
+            mgr.log_operation('set', f'K{i}')
+        mgr.MAX_HISTORY_ENTRIES = 2
+        for i in range(3):
+            mgr.log_operation('set', f'N{i}')
+        assert len(mgr._history_segments()) <= 3
+
+
+class TestHistoryTailReader:
+
+    def test_newest_first_across_segments(self, mgr):
+        for i in range(23):
+            mgr.log_operation('set', f'K{i}')
+        keys = [e['key'] for e in mgr.get_history(limit=8)]
+        assert keys == [f'K{i}' for i in range(22, 14, -1)]
+
+    @pytest.mark.parametrize('offset', [0, 1, 3, 5, 7, 12, 40])
+    def test_offset_matches_full_scan(self, mgr, offset):
+        for i in range(23):
+            mgr.log_operation('set', f'K{i}')
+        full = []
+        for segment in reversed(mgr._history_segments()):
+            full.extend(json.loads(line) for line in _lines(segment))
+        full.reverse()
+        assert mgr.get_history(limit=4, offset=offset) == full[offset:offset + 4]
+
+    def test_offset_skips_indexed_segments_unread(self, mgr, monkeypatch):
+        for i in range(13):
+            mgr.log_operation('set', f'K{i}')
+
+
+    def test_small_block_boundaries(self, tmp_path):
+        from evm._history import _iter_lines_reverse
+        path = tmp_path / 'h.jsonl'
+        lines = [f'line-{i}-' + 'x' * i for i in range(30)]
+        path.write_text('\n'.join(lines) + '\n')
+        out = [line.decode() for line in _iter_lines_reverse(path, block_size=7) if line]
+        assert out == list(reversed(lines))
+
+    def test_skips_corrupt_lines(self, mgr):
+        mgr._get_history_file().write_text(
+            '{"key": "A"}\nNOT JSON\n{"key": "B"}\n'
+        )
+        assert [e['key'] for e in mgr.get_history()] == ['B', 'A']
+
+    def test_cli_offset(self, mgr, capsys):
+        from evm.cli import main
+        mgr.MAX_HISTORY_ENTRIES = 1000
+        for i in range(5):
+            mgr.set(f'K{i}', 'v')
+        main(['--env-file', str(mgr.env_file), 'history', '--json',
+              '-n', '2', '--offset', '1'])
+        data = json.loads(capsys.readouterr().out)['data']
+        assert [e['key'] for e in data] == ['K3', 'K2']
+
+
+class TestHistoryQuery:
+
+    @pytest.fixture
+    def filled(self, mgr):
+        mgr.MAX_HISTORY_ENTRIES = 8
+        rows = [
+            ('2026-10-01T09:00:00', 'set', 'DB_HOST', 'success'),
+            ('2026-10-01T10:00:00', 'delete', 'DB_HOST', 'success'),
+            ('2026-10-05T08:00:00', 'set', 'API_KEY', 'success'),
+            ('2026-10-06T12:00:00', 'delete', 'DB_PASS', 'failed'),
+            ('2026-10-08T00:00:00', 'delete', 'API_KEY', 'success'),
+            ('2026-10-09T23:59:00', 'delete', 'DB_USER', 'success'),
+            ('2026-10-10T07:30:00', 'set', 'DB_USER', 'success'),
+            ('2026-10-11T18:00:00', 'delete', 'DB_NAME', 'success'),
+            ('2026-10-12T06:00:00', 'rename', 'DB_NAME', 'success'),
+            ('2026-10-12T07:00:00', 'delete', 'DB_PORT', 'success'),
+        ]
+        mgr._append_history([
+            {'timestamp': ts, 'operation': op, 'key': key, 'details': '', 'status': st}
+            for ts, op, key, st in rows[:3]
+        ])
+        for ts, op, key, st in rows[3:]:
+            mgr._append_history([
+                {'timestamp': ts, 'operation': op, 'key': key, 'details': '', 'status': st}
+            ])
+        return mgr
+
+    def _keys(self, entries):
+        return [e['key'] for e in entries]
+
+    def test_key_glob_and_operation(self, filled):
+        got = filled.query_history(key='DB_*', operation='delete', limit=100)
+        assert self._keys(got) == ['DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASS', 'DB_HOST']
+
+    def test_status(self, filled):
+        assert self._keys(filled.query_history(status='failed')) == ['DB_PASS']
+
+    def test_time_range_date_precision(self, filled):
+        got = filled.query_history(since='2026-10-06', until='2026-10-09', limit=100)
+        assert self._keys(got) == ['DB_USER', 'API_KEY', 'DB_PASS']
+
+    def test_limit_and_offset(self, filled):
+        got = filled.query_history(operation='delete', limit=2, offset=1)
+        assert self._keys(got) == ['DB_NAME', 'DB_USER']
+
+    def test_reads_only_matching_records(self, filled, monkeypatch):
+        reads = []
+        real_open = builtins.open
+
+        class Spy:
+            def __init__(self, f):
+                self._f = f
+
+            def read(self, n=-1):
+                reads.append(n)
+                return self._f.read(n)
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return self._f.__exit__(*exc)
+
+        segments = {str(p) for p in filled._history_segments()}
+
+        def spy_open(file, *args, **kwargs):
+            f = real_open(file, *args, **kwargs)
+            return Spy(f) if str(file) in segments else f
+
+        monkeypatch.setattr(builtins, 'open', spy_open)
+        got = filled.query_history(key='API_*', limit=100)
+        assert self._keys(got) == ['API_KEY', 'API_KEY']
+        assert len(reads) == 2
+
+    def test_since_stops_before_older_segments(self, filled, monkeypatch):
+        oldest = filled._history_segments()[-1]
+        real_open = builtins.open
+
+        def guarded_open(file, *args, **kwargs):
+            assert str(file) not in (str(oldest), str(oldest) + '.idx')
+            return real_open(file, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, 'open', guarded_open)
+        got = filled.query_history(since='2026-10-11', limit=100)
+        assert self._keys(got) == ['DB_PORT', 'DB_NAME', 'DB_NAME']
+
+    QUERIES = [
+        {'key': 'DB_*', 'operation': 'delete'},
+        {'key': 'DB_USER'},
+        {'key': 'NOPE'},
+        {'since': '2026-10-06', 'until': '2026-10-09'},
+        {'since': '2026-10-05T09:00', 'until': '2026-10-06T11:00'},
+        {'until': '2026-10-01'},
+        {'status': 'failed', 'key': 'DB_?ASS'},
+    ]
+
+    def test_rotated_segments_use_lookup(self, filled, monkeypatch):
+        rotated = filled._history_segments()[1:]
+        assert rotated
+        for segment in rotated:
+            assert filled._history_lookup_file(segment).exists()
+        expected = [filled.query_history(limit=100, **q) for q in self.QUERIES]
+
+        real_open = builtins.open
+        rotated_idx = {str(filled._history_index_file(s)) for s in rotated}
+
+        def guarded_open(file, *args, **kwargs):
+            assert str(file) not in rotated_idx
+            return real_open(file, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, 'open', guarded_open)
+        assert [filled.query_history(limit=100, **q) for q in self.QUERIES] == expected
+        monkeypatch.undo()
+
+        # 无 .lookup（旧版或损坏）时退回扫描 .idx，结果一致
+        for segment in rotated:
+            filled._history_lookup_file(segment).write_text('{not json')
+        assert [filled.query_history(limit=100, **q) for q in self.QUERIES] == expected
+
+    def test_torn_index_line_is_skipped(self, mgr):
+        mgr.log_operation('delete', 'DB_A')
+        index_file = mgr._history_index_file(mgr._get_history_file())
+        with open(index_file, 'a') as f:
+            f.write('[0, 5, "2026-')
+        assert self._keys(mgr.query_history(key='DB_*')) == ['DB_A']
+
+    def test_lookup_candidates(self):
+        from evm._history import _build_lookup, _HistoryQuery, _lookup_candidates
+        lookup = _build_lookup([
+            [0, 1, '2026-10-01T09:00', 'set', 'A', 'success'],
+            [1, 1, '2026-10-01T10:00', 'set', 'B', 'success'],
+            [2, 1, '2026-10-03T08:00', 'delete', 'A', 'success'],
+            [3, 1, '2026-10-04T08:00', 'set', 'AB', 'success'],
+        ])
+        assert lookup['keys'] == {'A': [0, 2], 'B': [1], 'AB': [3]}
+        assert lookup['days']['2026-10-01'] == [0, 1]
+        assert _lookup_candidates(lookup, _HistoryQuery(key='A')) == [2, 0]
+        assert _lookup_candidates(lookup, _HistoryQuery(key='A*')) == [3, 2, 0]
+        assert _lookup_candidates(lookup, _HistoryQuery(since='2026-10-02')) == [3, 2]
+        assert _lookup_candidates(
+            lookup, _HistoryQuery(key='A', until='2026-10-02')
+        ) == [0]
+
+    def test_relative_since(self, mgr):
+        mgr.log_operation('set', 'NOW')
+        assert self._keys(mgr.query_history(since='1h')) == ['NOW']
+        assert mgr.query_history(until='2000-01-01') == []
+
+    def test_invalid_time(self, mgr):
+        from evm.exceptions import EVMError
+        with pytest.raises(EVMError, match='Invalid time'):
+            mgr.query_history(since='last tuesday')
+
+    def test_legacy_segment_without_index(self, mgr):
+        mgr._get_history_file().write_text(
+            json.dumps({'timestamp': '2026-01-01T00:00:00', 'operation': 'delete',
+                        'key': 'DB_OLD', 'status': 'success'}) + '\n'
+        )
+        assert self._keys(mgr.query_history(key='DB_*')) == ['DB_OLD']
+        mgr.log_operation('delete', 'DB_NEW')
+        assert mgr._history_index_file(mgr._get_history_file()).exists()
+        assert self._keys(mgr.query_history(operation='delete')) == ['DB_NEW', 'DB_OLD']
+
+    def test_cli_filters(self, filled, capsys):
+        from evm.cli import main
+        code = main(['--env-file', str(filled.env_file), 'history', '--json',
+                     '--key', 'DB_*', '--op', 'delete', '--since', '2026-10-09'])
+        data = json.loads(capsys.readouterr().out)['data']
+        assert code == 0
+        assert self._keys(data) == ['DB_PORT', 'DB_NAME', 'DB_USER']
@@ -587,3 +587,177 @@ class TestEvmLoadEndToEnd:
         assert result.returncode == 0, result.stderr
         assert 'E2E_FISH=injected' in result.stdout
 
+
+
+# ── inject --cached：evm-load 直接 source 的输出缓存 ─────────
+
+
+class TestInjectCache:
+    """inject --cached 写缓存；evm-load 在缓存比存储新时不启动 evm"""
+
+    def _store(self, tmp_path, capsys):
+        env_file = tmp_path / 'env.json'
+        main(['--env-file', str(env_file), 'set', 'CACHED_KEY', 'v 1'])
+        main(['--env-file', str(env_file), 'setg', 'dev', 'DB', 'local'])
+        capsys.readouterr()
+        return env_file
+
+    def test_cached_writes_output(self, tmp_path, capsys):
+        from evm._completion import inject_cache_path
+
+        env_file = self._store(tmp_path, capsys)
+        code = main([
+            '--env-file', str(env_file), 'inject', '--shell', 'bash', '--cached',
+        ])
+        out, _ = capsys.readouterr()
+        assert code == 0
+        cache = inject_cache_path(env_file, 'bash')
+        assert cache.name == 'env.json.inject-bash--'
+        header, body = cache.read_text().split('\n', 1)
+        st = env_file.stat()
+        assert header == (
+            f'# evm inject cache {st.st_ino}:{st.st_size}:'
+            f'{st.st_mtime_ns // 10**9}.{st.st_mtime_ns % 10**9:09d};'
+        )
+        assert body == out
+        assert cache.stat().st_mode & 0o777 == 0o600
+
+    def test_cache_key_includes_group_and_prefix(self, tmp_path, capsys):
+        from evm._completion import inject_cache_path
+
+        env_file = self._store(tmp_path, capsys)
+        main([
+            '--env-file', str(env_file), 'inject', '--shell', 'fish',
+            '--group', 'dev', '--prefix', 'APP_', '--cached',
+        ])
+        out, _ = capsys.readouterr()
+        cache = inject_cache_path(env_file, 'fish', 'dev', 'APP_')
+        assert cache.name == 'env.json.inject-fish-dev-APP_'
+        assert cache.read_text().split('\n', 1)[1] == out == 'set -gx APP_DB local\n'
+
+    def test_cache_key_escapes_fields(self, tmp_path, capsys):
+        from evm._completion import inject_cache_path
+
+        env_file = tmp_path / 'env.json'
+        names = {
+            inject_cache_path(env_file, 'bash', group, prefix).name
+            for group, prefix in [('a', 'b-'), ('a-b', None), ('a/b', None), ('a%2Fb', None)]
+        }
+        assert len(names) == 4
+        assert inject_cache_path(env_file, 'bash', 'a/b').name == 'env.json.inject-bash-a%2Fb-'
+
+        env_file = self._store(tmp_path, capsys)
+        code = main([
+            '--env-file', str(env_file), 'inject', '--shell', 'bash',
+            '--group', 'a/b', '--cached',
+        ])
+        assert code == 0
+        assert inject_cache_path(env_file, 'bash', 'a/b').exists()
+
+    @pytest.mark.skipif(not _shell_available('bash'), reason='bash 不在 PATH')
+    @pytest.mark.parametrize('group, prefix', [('a/b', ''), ('a', 'b-'), ('x%2Dy', '-%/')])
+    def test_bash_evm_load_escapes_like_python(self, tmp_path, group, prefix):
+        from evm._completion import inject_cache_path, write_inject_cache
+        from evm._storage import store_signature
+
+        env_file = tmp_path / 'env.json'
+        env_file.write_text('{}')
+        source = store_signature(env_file)
+        write_inject_cache(
+            inject_cache_path(env_file, 'bash', group, prefix or None),
+            'export HIT=cache\n', source, lambda: source,
+        )
+        comp_file = tmp_path / 'comp.bash'
+        comp_file.write_text(generate_bash_completion(ALL_COMMANDS))
+        args = ['--group', group] + (['--prefix', prefix] if prefix else [])
+        script = (
+            'evm() { echo "export HIT=evm"; }; '
+            f'source {comp_file} 2>/dev/null; '
+            f'evm-load --env-file {env_file} "$@"; echo "$HIT"'
+        )
+        result = subprocess.run(
+            ['bash', '-c', script, 'evm-load', *args], capture_output=True, text=True,
+        )
+        assert result.stdout.strip() == 'cache'
+
+    @pytest.mark.parametrize('flag', ['--include-secrets', '--expand', '--dry-run'])
+    def test_not_cached_with(self, tmp_path, capsys, flag):
+        env_file = self._store(tmp_path, capsys)
+        main([
+            '--env-file', str(env_file), 'inject', '--shell', 'bash',
+            '--cached', flag,
+        ])
+        assert not list(tmp_path.glob('env.json.inject-*'))
+
+    def test_without_flag_no_cache(self, tmp_path, capsys):
+        env_file = self._store(tmp_path, capsys)
+        main(['--env-file', str(env_file), 'inject', '--shell', 'bash'])
+        assert not list(tmp_path.glob('env.json.inject-*'))
+
+    def test_store_changed_during_write_discards(self, tmp_path):
+        from evm._completion import write_inject_cache
+
+        cache = tmp_path / 'env.json.inject-bash--'
+        source = ((1, 2, 3), None)
+        assert write_inject_cache(cache, 'x', source, lambda: source)
+        assert cache.exists()
+        assert not write_inject_cache(
+            cache, 'y', source, lambda: ((1, 2, 4), None)
+        )
+        assert not cache.exists()
+
+    def test_cache_header(self):
+        from evm._completion import inject_cache_header
+
+        assert inject_cache_header(((7, 10, 1_500_000_000_000_000_123), None)) == (
+            '# evm inject cache 7:10:1500000000.000000123;'
+        )
+        assert inject_cache_header(((1, 2, 3), (4, 5, 6 * 10**9))) == (
+            '# evm inject cache 1:2:0.000000003;4:5:6.000000000;'
+        )
+
+    def test_fast_path_parses_cached(self):
+        from evm.cli import _parse_fast
+
+        args = _parse_fast(['inject', '--shell', 'bash', '--cached'])
+        assert args is not None and args.cached
+
+    @pytest.mark.skipif(not _shell_available('bash'), reason='bash 不在 PATH')
+    def test_bash_evm_load_sources_fresh_cache(self, tmp_path, capsys):
+        env_file = self._store(tmp_path, capsys)
+        main([
+            '--env-file', str(env_file), 'inject', '--shell', 'bash', '--cached',
+        ])
+        capsys.readouterr()
+        comp_file = tmp_path / 'comp.bash'
+        comp_file.write_text(generate_bash_completion(ALL_COMMANDS))
+        script = (
+            # 替身 evm（需在 source 前定义）：被调用即说明没走缓存
+            'evm() { echo "export FROM_EVM=1"; }; '
+            f'source {comp_file} 2>/dev/null; '
+            f'evm-load --env-file {env_file}; '
+            'echo "key=$CACHED_KEY evm=$FROM_EVM"'
+        )
+
+        result = subprocess.run(['bash', '-c', script], capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == 'key=v 1 evm='
+
+        # 存储更新后缓存失效，回到调用 evm；mtime 被还原（cp -p、备份恢复）也一样
+        st = env_file.stat()
+        main(['--env-file', str(env_file), 'set', 'CACHED_KEY', 'v 2'])
+        capsys.readouterr()
+        os.utime(env_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        result = subprocess.run(['bash', '-c', script], capture_output=True, text=True)
+        assert result.stdout.strip() == 'key= evm=1'
+
+        # 其他参数（如 --expand）不走缓存
+        main([
+            '--env-file', str(env_file), 'inject', '--shell', 'bash', '--cached',
+        ])
+        capsys.readouterr()
+        result = subprocess.run(
+            ['bash', '-c', script.replace('evm-load ', 'evm-load --expand ')],
+            capture_output=True, text=True,
+        )
+        assert result.stdout.strip() == 'key= evm=1'
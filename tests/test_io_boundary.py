@@ -2,8 +2,9 @@
 """
 _io.py 边界测试
 
-覆盖 _detect_format、_load_json_file、_load_env_file、_load_nested、
-_apply_group_prefix、export、load、backup、restore、diff 的各种边界条件。
+覆盖 _detect_format、_load_json_file、_load_env_file、iter_env_file、
+_load_nested、_apply_group_prefix、export、load、backup、restore、diff
+的各种边界条件。
 """
 
 import json
@@ -21,6 +22,7 @@ from evm import (
     ExportError,
     ImportFailedError,
 )
+from evm._io import iter_env_file
 from evm.exceptions import GroupNotFoundError
 
 
@@ -203,6 +205,113 @@ class TestLoadEnvFile:
         assert loaded == {'GOOD': 'val'}
 
 
+class TestIterEnvFile:
+    """iter_env_file: 流式 .env 解析"""
+
+    def test_yields_line_numbers(self):
+        lines = ['# c\n', 'A=1\n', '\n', 'B = two \n']
+        assert list(iter_env_file(lines)) == [(2, 'A', '1'), (4, 'B', 'two')]
+
+    def test_export_prefix(self):
+        lines = ['export A=1\n', 'export\tB="x y"\n', 'exported=3\n']
+        assert list(iter_env_file(lines)) == [
+            (1, 'A', '1'), (2, 'B', 'x y'), (3, 'exported', '3'),
+        ]
+
+    def test_multiline_double_quoted(self):
+        lines = ['KEY="line1\n', '  line2\n', 'line3"\n', 'NEXT=1\n']
+        assert list(iter_env_file(lines)) == [
+            (1, 'KEY', 'line1\n  line2\nline3'), (4, 'NEXT', '1'),
+        ]
+
+    def test_multiline_single_quoted(self):
+        lines = ["PEM='-----BEGIN-----\n", 'abc\n', "-----END-----'\n"]
+        assert list(iter_env_file(lines)) == [
+            (1, 'PEM', '-----BEGIN-----\nabc\n-----END-----'),
+        ]
+
+    def test_escaped_quote_does_not_close(self):
+        lines = ['A="say \\"hi\n', 'there\\""\n']
+        assert list(iter_env_file(lines)) == [(1, 'A', 'say "hi\nthere"')]
+
+    def test_crlf_continuation(self):
+        lines = ['A="x\r\n', 'y"\r\n']
+        assert list(iter_env_file(lines)) == [(1, 'A', 'x\ny')]
+
+    def test_unclosed_quote_falls_back_to_literal(self):
+        lines = ['A="open\n', 'B=2\n', 'C=3\n']
+        assert list(iter_env_file(lines)) == [
+            (1, 'A', '"open'), (2, 'B', '2'), (3, 'C', '3'),
+        ]
+
+    def test_balanced_quotes_single_line(self):
+        lines = ['A="x"\n', "B='y'\n", 'C="a" "b"\n']
+        assert list(iter_env_file(lines)) == [
+            (1, 'A', 'x'), (2, 'B', 'y'), (3, 'C', 'a" "b'),
+        ]
+
+
+class TestLoadStreaming:
+    """load(): .env 流式写入存储"""
+
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.env_file = os.path.join(self.temp_dir, 'env.json')
+        self.mgr = EnvironmentManager(self.env_file)
+
+    def teardown_method(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, text):
+        path = Path(self.temp_dir) / name
+        path.write_text(text)
+        return str(path)
+
+    def test_load_multiline_and_export(self):
+        src = self._write('a.env', 'export A=1\nCERT="x\ny"\n')
+        self.mgr.load(src, group='dev')
+        assert self.mgr.get('dev:A') == '1'
+        assert self.mgr.get('dev:CERT') == 'x\ny'
+        stored = json.loads(Path(self.env_file).read_text())
+        assert stored == {'dev:A': '1', 'dev:CERT': 'x\ny'}
+
+    def test_duplicate_keys_counted_once(self):
+        src = self._write('dup.env', 'A=1\nA=2\nB=3\n')
+        assert '2 variables' in self.mgr.load(src, dry_run=True)
+        assert 'Loaded 2 environment variables' in self.mgr.load(src)
+        assert self.mgr.get('A') == '2'
+
+    def test_replace(self):
+        self.mgr.set('OLD', 'x')
+        src = self._write('r.env', 'NEW=1\n')
+        assert '(1 total)' in self.mgr.load(src, replace=True)
+        assert self.mgr.list_vars() == {'NEW': '1'}
+
+    def test_decode_error_rolls_back(self):
+        self.mgr.set('KEEP', 'x')
+        path = Path(self.temp_dir) / 'bad.env'
+        path.write_bytes(b'A=1\n' * 5000 + b'B=\xff\xfe\n')
+        with pytest.raises(ImportFailedError):
+            self.mgr.load(str(path))
+        assert self.mgr.list_vars() == {'KEEP': 'x'}
+        assert json.loads(Path(self.env_file).read_text()) == {'KEEP': 'x'}
+
+    def test_sniffed_file_opened_once(self, monkeypatch):
+        src = self._write('noext', 'A=1\n')
+        opened = []
+        real_open = open
+
+        def counting_open(file, *args, **kwargs):
+            if str(file) == src:
+                opened.append(file)
+            return real_open(file, *args, **kwargs)
+
+        monkeypatch.setattr('builtins.open', counting_open)
+        self.mgr.load(src)
+        assert len(opened) == 1
+        assert self.mgr.get('A') == '1'
+
+
 class TestLoadNested:
     """_load_nested: 嵌套 JSON 加载边界条件"""
 
@@ -1568,10 +1568,11 @@ class TestExitCodes(unittest.TestCase):
         # 手动持锁然后尝试写入
         import fcntl
         lock_path = str(self.env_file) + '.lock'
+        # 读取也要取共享锁，先构造再持锁
+        mgr2 = EnvironmentManager(self.env_file, lock_timeout=0.1)
         lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
         try:
             fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-            mgr2 = EnvironmentManager(self.env_file, lock_timeout=0.1)
             mgr2._env_vars = {'X': '1'}
             from evm.exceptions import LockTimeoutError
             with self.assertRaises(LockTimeoutError):
@@ -0,0 +1,178 @@
+"""
+编译 schema 缓存与流式校验测试
+
+CompiledSchema 按 schema 文件签名缓存；文件未变化时 validate / validate_all
+不再读取 schema.json，自定义正则只编译一次。
+iter_validate 逐条产出结果，validate --stream/--fail-fast 输出 NDJSON。
+"""
+
+import json
+import os
+
+import pytest
+
+from evm import _schema
+from evm._schema import CompiledSchema
+from evm.cli import main
+from evm.manager import EnvironmentManager
+
+
+@pytest.fixture
+def mgr(tmp_path):
+    _schema._SCHEMA_CACHE.clear()
+    m = EnvironmentManager(str(tmp_path / 'env.json'))
+    m.set('URL', 'https://example.com')
+    m.set('PORT', 'abc')
+    m.set_schema('URL', format='url', required=True)
+    m.set_schema('PORT', format='port', pattern=r'^\d+$')
+    m.set_schema('TOKEN', required=True)
+    return m
+
+
+def _count_loads(monkeypatch, mgr):
+    calls = []
+    original = mgr._load_schema
+
+    def spy():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(mgr, '_load_schema', spy)
+    return calls
+
+
+class TestCompiledSchemaCache:
+    """schema 文件只在变化时重新读取"""
+
+    def test_validate_loads_once(self, mgr, monkeypatch):
+        calls = _count_loads(monkeypatch, mgr)
+        for _ in range(3):
+            mgr.validate('URL')
+            mgr.validate_all()
+        assert len(calls) == 1
+
+    def test_set_schema_invalidates(self, mgr):
+        assert mgr.validate('PORT', '80')['valid']
+        mgr.set_schema('PORT', pattern=r'^9\d+$')
+        assert not mgr.validate('PORT', '80')['valid']
+
+    def test_external_edit_invalidates(self, mgr):
+        assert 'EXTRA' not in mgr.validate_all()
+        schema_file = mgr._get_schema_file()
+        schema = json.loads(schema_file.read_text())
+        schema['EXTRA'] = {'format': 'integer'}
+        schema_file.write_text(json.dumps(schema))
+        st = os.stat(schema_file)
+        os.utime(schema_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert 'EXTRA' in mgr.validate_all()
+
+    def test_missing_schema_file(self, tmp_path):
+        m = EnvironmentManager(str(tmp_path / 'env.json'))
+        assert m.validate_all() == {}
+
+
+class TestCompiledSchemaResults:
+    """编译后的结果与逐条校验一致"""
+
+    def test_validate_all_results(self, mgr):
+        results = mgr.validate_all()
+        assert results['URL'] == {'valid': True, 'errors': [], 'warnings': []}
+        assert results['PORT']['errors'] == [
+            "Value 'abc' does not match format 'port'",
+            "Value 'abc' does not match pattern '^\\d+$'",
+        ]
+        assert results['TOKEN'] == {
+            'valid': False,
+            'errors': ["Required variable 'TOKEN' is not set"],
+            'warnings': [],
+        }
+
+    def test_matches_validate_value(self, mgr):
+        schema = mgr.get_schema()
+        for key, result in mgr.validate_all().items():
+            if key in mgr._env_vars:
+                assert result == mgr._validate_value(
+                    key, mgr._env_vars[key], schema[key]
+                )
+
+    def test_invalid_regex_in_file(self):
+        compiled = CompiledSchema({'A': {'pattern': '[unclosed'}})
+        assert compiled.check('A', 'x')['errors'] == [
+            "Invalid schema regex: '[unclosed'"
+        ]
+
+    def test_ipv6_and_unknown_format(self):
+        compiled = CompiledSchema({
+            'A': {'format': 'ipv6'}, 'B': {'format': 'nope'},
+        })
+        assert compiled.check('A', '::1')['valid']
+        assert not compiled.check('A', '1.2.3.4')['valid']
+        assert compiled.check('B', 'anything')['valid']
+        assert len(compiled) == 2
+        assert 'A' in compiled
+
+
+class TestIterValidate:
+    """流式 / 分块并行校验"""
+
+    def test_matches_validate_all(self, mgr):
+        assert dict(mgr.iter_validate()) == mgr.validate_all()
+        assert [k for k, _ in mgr.iter_validate()] == ['URL', 'PORT', 'TOKEN']
+
+    def test_process_pool_chunks(self, tmp_path):
+        m = EnvironmentManager(str(tmp_path / 'env.json'))
+        with m.transaction():
+            for i in range(20):
+                m.set(f'K{i}', str(i) if i % 3 else 'x')
+        schema = {f'K{i}': {'format': 'integer', 'pattern': r'^\d+$'}
+                  for i in range(25)}
+        m._save_schema(schema)
+        serial = list(m.iter_validate())
+        parallel = list(m.iter_validate(workers=2, chunk_size=4))
+        assert parallel == serial
+        assert len(parallel) == 25
+
+    def test_early_close(self, tmp_path):
+        m = EnvironmentManager(str(tmp_path / 'env.json'))
+        m._save_schema({f'K{i}': {'required': True} for i in range(10)})
+        it = m.iter_validate(workers=2, chunk_size=2)
+        key, result = next(it)
+        assert key == 'K0'
+        assert not result['valid']
+        it.close()
+
+
+class TestValidateStreamCli:
+    """evm validate --stream / --fail-fast"""
+
+    def _run(self, capsys, mgr, *args):
+        code = main(['--env-file', str(mgr.env_file), *args])
+        return code, *capsys.readouterr()
+
+    def test_ndjson_stream(self, capsys, mgr):
+        code, out, _ = self._run(capsys, mgr, '--json', 'validate', '--stream')
+        assert code == 0
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [r.get('key') for r in lines[:-1]] == ['URL', 'PORT', 'TOKEN']
+        assert lines[-1] == {'summary': {'total': 3, 'valid': 1, 'invalid': 2}}
+
+    def test_fail_fast_stops_at_first_error(self, capsys, mgr):
+        code, out, err = self._run(capsys, mgr, 'validate', '--json', '--fail-fast')
+        assert code == 6
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [r['key'] for r in lines] == ['URL', 'PORT']
+        assert json.loads(err)['error_code'] == 6
+
+    def test_human_stream(self, capsys, mgr):
+        code, out, _ = self._run(capsys, mgr, 'schema', 'validate', '--stream')
+        assert code == 0
+        assert '✗ PORT: INVALID' in out
+        assert '2 variable(s) failed validation.' in out
+
+    def test_fail_fast_all_valid(self, capsys, tmp_path):
+        m = EnvironmentManager(str(tmp_path / 'env.json'))
+        m.set('A', '1')
+        m.set_schema('A', format='integer')
+        code, out, _ = self._run(capsys, m, 'validate', '--fail-fast')
+        assert code == 0
+        assert 'All variables passed validation.' in out
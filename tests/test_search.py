@@ -0,0 +1,113 @@
+"""
+搜索测试
+
+search 支持子串 / glob / regex 三种模式，均不区分大小写；
+子串与 glob 在 ChangeTrackingDict 的 casefold 索引上匹配。
+"""
+
+import json
+
+import pytest
+
+from evm._storage import ChangeTrackingDict
+from evm.cli import main
+from evm.exceptions import EVMError
+from evm.manager import EnvironmentManager
+
+
+@pytest.fixture
+def mgr(tmp_path):
+    m = EnvironmentManager(str(tmp_path / 'env.json'))
+    with m.transaction():
+        m.set('DB_HOST', 'Localhost')
+        m.set('DB_PORT', '5432')
+        m.set('REDIS_URL', 'redis://db-cache')
+        m.set('dev:DB_HOST', 'dev.example.com')
+    return m
+
+
+class TestSearchModes:
+
+    def test_substring_case_insensitive(self, mgr):
+        assert set(mgr.search('db_')) == {'DB_HOST', 'DB_PORT', 'dev:DB_HOST'}
+        assert set(mgr.search('LOCAL', search_value=True)) == {'DB_HOST'}
+
+    def test_glob_matches_whole_key(self, mgr):
+        assert set(mgr.search('db_*', mode='glob')) == {'DB_HOST', 'DB_PORT'}
+        assert set(mgr.search('*:db_host', mode='glob')) == {'dev:DB_HOST'}
+        assert mgr.search('DB', mode='glob') == {}
+
+    def test_glob_on_values(self, mgr):
+        result = mgr.search('redis://*', search_value=True, mode='glob')
+        assert set(result) == {'REDIS_URL'}
+
+    def test_regex(self, mgr):
+        assert set(mgr.search(r'^(db|redis)_', mode='regex')) == {
+            'DB_HOST', 'DB_PORT', 'REDIS_URL',
+        }
+        assert set(mgr.search(r'\d{4}$', search_value=True, mode='regex')) == {
+            'DB_PORT',
+        }
+
+    def test_invalid_regex(self, mgr):
+        with pytest.raises(EVMError, match='Invalid regex'):
+            mgr.search('(', mode='regex')
+
+    def test_unknown_mode(self, mgr):
+        with pytest.raises(EVMError, match='Unknown search mode'):
+            mgr.search('x', mode='fuzzy')
+
+    def test_casefold(self, mgr):
+        mgr.set('STRASSE', 'Straße')
+        assert set(mgr.search('STRASSE', search_value=True)) == {'STRASSE'}
+        assert 'STRASSE' in mgr.search('ss', search_value=True)
+
+
+class TestFoldedIndex:
+
+    def test_tracks_mutations(self, mgr):
+        assert 'DB_PORT' in mgr.search('port')
+        mgr.set('NEW_PORT', '1')
+        mgr.delete('DB_PORT')
+        mgr.rename('REDIS_URL', 'CACHE_URL')
+        assert set(mgr.search('port')) == {'NEW_PORT'}
+        assert set(mgr.search('url')) == {'CACHE_URL'}
+        mgr.set('NEW_PORT', 'Changed')
+        assert mgr.search('changed', search_value=True) == {'NEW_PORT': 'Changed'}
+
+    def test_built_once(self):
+        d = ChangeTrackingDict({'A': 'x', 'B': 'y'})
+        d.folded_items()
+        index = d._folded
+        d['C'] = 'Z'
+        assert dict(d.folded_items())['C'] == ('c', 'z')
+        assert d._folded is index
+        d.clear()
+        assert list(d.folded_items()) == []
+
+    def test_list_pattern_uses_index(self, mgr):
+        assert set(mgr.list_vars(pattern='host')) == {'DB_HOST', 'dev:DB_HOST'}
+
+
+class TestSearchCli:
+
+    def _run(self, capsys, mgr, *args):
+        code = main(['--env-file', str(mgr.env_file), '--json', 'search', *args])
+        out, _ = capsys.readouterr()
+        return code, json.loads(out)['data'] if code == 0 else None
+
+    def test_glob(self, capsys, mgr):
+        code, data = self._run(capsys, mgr, 'DB_*', '--glob')
+        assert code == 0
+        assert set(data) == {'DB_HOST', 'DB_PORT'}
+
+    def test_regex(self, capsys, mgr):
+        code, data = self._run(capsys, mgr, '--regex', 'url$')
+        assert code == 0
+        assert set(data) == {'REDIS_URL'}
+
+    def test_modes_are_exclusive(self, capsys, mgr):
+        with pytest.raises(SystemExit):
+            main(['--env-file', str(mgr.env_file), 'search', 'x',
+                  '--glob', '--regex'])
+        capsys.readouterr()
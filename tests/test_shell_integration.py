@@ -5,18 +5,33 @@ evm shell 集成测试
 - _completion.py 的 install/uninstall/is_installed 辅助函数
 - cli.py 的 evm init 命令（--install/--uninstall/--reinstall/--check）
 - main() 启动时的 _ensure_shell_integration 自动检查（含 opt-out、幂等）
+- ~/.evm/init.<shell> 启动缓存与 env.keys / env.groups 补全索引
 """
 
+import json
+import shutil
+import subprocess
 
+import pytest
 
 from evm._completion import (
+    INIT_CACHE_HEADER,
     INTEGRATION_MARKER_END,
     INTEGRATION_MARKER_START,
+    completion_index_path,
+    generate_bash_completion,
+    get_init_cache_path,
+    get_integration_stamp_path,
+    init_cache_outdated,
     install_integration,
+    integration_block,
     is_integration_installed,
+    is_integration_installed_cached,
     uninstall_integration,
+    upgrade_integration,
 )
-from evm.cli import main
+from evm.cli import ALL_COMMANDS, main
+from evm.manager import EnvironmentManager
 
 # ══════════════════════════════════════════════════════════════
 # 辅助函数单元测试
@@ -325,3 +340,295 @@ class TestAutoInstall:
         main(['--env-file', env_file, 'list'])
         _, err = capsys.readouterr()
         assert 'Installed' not in err
+
+
+# ══════════════════════════════════════════════════════════════
+# stamp 缓存（热路径不读 rc 全文）
+# ══════════════════════════════════════════════════════════════
+
+
+class TestIntegrationStamp:
+    """is_integration_installed_cached 的 stamp 行为"""
+
+    def _count_rc_reads(self, monkeypatch):
+        """统计 is_integration_installed（读 rc 全文）的调用次数"""
+        import evm._completion as completion
+
+        calls = []
+        original = completion.is_integration_installed
+
+        def spy(shell):
+            calls.append(shell)
+            return original(shell)
+
+        monkeypatch.setattr(completion, 'is_integration_installed', spy)
+        return calls
+
+    def test_install_writes_stamp(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        stamp = get_integration_stamp_path()
+        assert stamp == tmp_path / '.evm' / 'shell-integration.stamp'
+        assert str(tmp_path / '.zshrc') in stamp.read_text()
+
+    def test_unchanged_rc_is_not_reread(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        calls = self._count_rc_reads(monkeypatch)
+        assert is_integration_installed_cached('zsh')
+        assert is_integration_installed_cached('zsh')
+        assert calls == []
+
+    def test_changed_rc_is_reread(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        with open(tmp_path / '.zshrc', 'a') as f:
+            f.write('alias ll="ls -l"\n')
+        calls = self._count_rc_reads(monkeypatch)
+        assert is_integration_installed_cached('zsh')
+        assert calls == ['zsh']
+        # 刷新 stamp 后再次命中
+        assert is_integration_installed_cached('zsh')
+        assert calls == ['zsh']
+
+    def test_uninstall_invalidates_stamp(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        assert is_integration_installed_cached('zsh')
+        uninstall_integration('zsh')
+        assert not is_integration_installed_cached('zsh')
+
+    def test_stamp_tracks_multiple_shells(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        install_integration('bash')
+        calls = self._count_rc_reads(monkeypatch)
+        assert is_integration_installed_cached('zsh')
+        assert is_integration_installed_cached('bash')
+        assert calls == []
+
+    def test_manual_install_without_stamp(self, monkeypatch, tmp_path):
+        """rc 里已有标记块但没有 stamp（旧版本安装）—— 读一次并补写 stamp"""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        get_integration_stamp_path().unlink()
+        assert is_integration_installed_cached('zsh')
+        assert get_integration_stamp_path().exists()
+
+    def test_missing_rc(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        assert not is_integration_installed_cached('zsh')
+        assert not is_integration_installed_cached('nushell')
+
+    def test_main_skips_rc_read_when_stamped(
+        self, capsys, monkeypatch, tmp_path
+    ):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        monkeypatch.setenv('SHELL', '/bin/zsh')
+        env_file = str(tmp_path / 'env.json')
+        main(['--env-file', env_file, 'set', 'K', 'v'])
+        capsys.readouterr()
+        calls = self._count_rc_reads(monkeypatch)
+        main(['--env-file', env_file, 'get', 'K'])
+        out, err = capsys.readouterr()
+        assert out.strip() == 'v'
+        assert 'Installed' not in err
+        assert calls == []
+
+
+class TestInitCache:
+    """~/.evm/init.<shell>：rc 标记块 source 的集成脚本缓存"""
+
+    def test_init_writes_cache(self, capsys, monkeypatch, tmp_path):
+        from evm import __version__
+
+        monkeypatch.setenv('HOME', str(tmp_path))
+        main(['init', 'bash'])
+        out, _ = capsys.readouterr()
+        cache = get_init_cache_path('bash')
+        assert cache == tmp_path / '.evm' / 'init.bash'
+        assert cache.read_text() == f'{INIT_CACHE_HEADER}{__version__}\n{out}'
+        assert not init_cache_outdated('bash')
+
+    def test_block_sources_cache(self):
+        for shell in ('bash', 'zsh', 'fish'):
+            block = integration_block(shell)
+            assert f'$HOME/.evm/init.{shell}' in block
+            assert f'eval "$(evm init {shell})"' in block
+
+    def test_install_writes_cache(self, capsys, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        main(['init', 'zsh', '--install'])
+        assert 'evm-load()' in get_init_cache_path('zsh').read_text()
+
+    def test_outdated_cache_refreshed(self, capsys, monkeypatch, tmp_path):
+        from evm import __version__
+
+        monkeypatch.setenv('HOME', str(tmp_path))
+        monkeypatch.setenv('SHELL', '/bin/zsh')
+        install_integration('zsh')
+        assert not init_cache_outdated('zsh')  # 缓存不存在不算过期
+        cache = get_init_cache_path('zsh')
+        cache.write_text(f'{INIT_CACHE_HEADER}0.0.1\nold\n')
+        assert init_cache_outdated('zsh')
+        # 模拟升级：stamp 由旧版本写入
+        stamp = get_integration_stamp_path()
+        stamp.write_text(stamp.read_text().replace(f'\t{__version__}', '\t0.0.1'))
+        main(['--env-file', str(tmp_path / 'env.json'), 'list'])
+        assert not init_cache_outdated('zsh')
+        assert 'evm-load()' in cache.read_text()
+
+    def test_stamped_start_does_not_read_cache(
+        self, capsys, monkeypatch, tmp_path
+    ):
+        import evm._completion as completion
+
+        monkeypatch.setenv('HOME', str(tmp_path))
+        monkeypatch.setenv('SHELL', '/bin/zsh')
+        env_file = str(tmp_path / 'env.json')
+        main(['--env-file', env_file, 'list'])
+        calls = []
+        monkeypatch.setattr(
+            completion, 'write_init_cache', lambda *args: calls.append(args)
+        )
+        main(['--env-file', env_file, 'list'])
+        assert calls == []
+
+
+class TestUpgradeIntegration:
+    """旧版本写入的 eval "$(evm init ...)" 标记块改写为当前块"""
+
+    _LEGACY = (
+        f'alias ll="ls -l"\n\n{INTEGRATION_MARKER_START}\n'
+        '# Auto-added by evm. Remove with: evm init zsh --uninstall\n'
+        'eval "$(evm init zsh)"\n'
+        f'{INTEGRATION_MARKER_END}\n'
+        'export EDITOR=vim\n'
+    )
+
+    def test_legacy_block_rewritten_on_start(
+        self, capsys, monkeypatch, tmp_path
+    ):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        monkeypatch.setenv('SHELL', '/bin/zsh')
+        rc = tmp_path / '.zshrc'
+        rc.write_text(self._LEGACY)
+        main(['--env-file', str(tmp_path / 'env.json'), 'list'])
+        _, err = capsys.readouterr()
+        content = rc.read_text()
+        assert integration_block('zsh').strip('\n') in content
+        assert content.count(INTEGRATION_MARKER_START) == 1
+        assert content.startswith('alias ll="ls -l"\n')
+        assert content.endswith('export EDITOR=vim\n')
+        assert 'Installed' not in err
+        assert get_init_cache_path('zsh').exists()
+        assert is_integration_installed_cached('zsh')
+
+    def test_current_block_untouched(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        install_integration('zsh')
+        rc = tmp_path / '.zshrc'
+        before = rc.stat().st_mtime_ns, rc.read_text()
+        assert not upgrade_integration('zsh')
+        assert (rc.stat().st_mtime_ns, rc.read_text()) == before
+
+    def test_install_upgrades_legacy_block(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        rc = tmp_path / '.zshrc'
+        rc.write_text(self._LEGACY)
+        ok, msg = install_integration('zsh')
+        assert ok and 'Updated' in msg
+        assert integration_block('zsh').strip('\n') in rc.read_text()
+
+    def test_unterminated_block_untouched(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('HOME', str(tmp_path))
+        rc = tmp_path / '.zshrc'
+        rc.write_text(f'{INTEGRATION_MARKER_START}\neval "$(evm init zsh)"\nalias x=y\n')
+        assert not upgrade_integration('zsh')
+
+
+class TestCompletionIndex:
+    """env.keys / env.groups：补全脚本直接读取的纯文本索引"""
+
+    def _spy(self, monkeypatch):
+        import evm._completion as completion
+
+        calls = []
+        original = completion.write_completion_index
+
+        def spy(env_file, keys, groups):
+            calls.append(env_file)
+            original(env_file, keys, groups)
+
+        monkeypatch.setattr(completion, 'write_completion_index', spy)
+        return calls
+
+    @pytest.mark.parametrize('storage', ['json', 'wal'])
+    def test_written_on_commit(self, tmp_path, storage):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage=storage)
+        mgr.set('API_KEY', 'v')
+        mgr.set_grouped('dev', 'DB', 'v')
+        mgr.set_grouped('prod', 'DB', 'v')
+        keys = completion_index_path(env_file, 'keys')
+        groups = completion_index_path(env_file, 'groups')
+        assert keys == tmp_path / 'env.keys'
+        assert keys.read_text() == 'API_KEY\ndev:DB\nprod:DB\n'
+        assert groups.read_text() == 'dev\nprod\n'
+        assert keys.stat().st_mode & 0o777 == 0o600
+
+        mgr.delete_group('prod')
+        assert keys.read_text() == 'API_KEY\ndev:DB\n'
+        assert groups.read_text() == 'dev\n'
+        mgr.clear(force=True)
+        assert keys.read_text() == groups.read_text() == ''
+
+    def test_value_change_does_not_rewrite(self, tmp_path, monkeypatch):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        mgr.set('A', '1')
+        calls = self._spy(monkeypatch)
+        mgr.set('A', '2')
+        assert calls == []
+        mgr.set('B', '1')
+        assert len(calls) == 1
+
+    def test_missing_index_rewritten(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        env_file.write_text(json.dumps({'OLD': '1'}))
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('OLD', '2')
+        assert completion_index_path(env_file, 'keys').read_text() == 'OLD\n'
+
+    def test_newline_key_skipped(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        EnvironmentManager(str(env_file)).set('BAD\nKEY', 'v')
+        assert completion_index_path(env_file, 'keys').read_text() == ''
+
+    @pytest.mark.skipif(shutil.which('bash') is None, reason='bash 不在 PATH')
+    def test_bash_completes_from_index(self, tmp_path):
+        env_file = tmp_path / 'project.env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('API_KEY', 'v')
+        mgr.set('APP_NAME', 'v')
+        mgr.set('OTHER', 'v')
+        mgr.set_grouped('dev', 'DB', 'v')
+        comp = tmp_path / 'comp.bash'
+        comp.write_text(generate_bash_completion(ALL_COMMANDS))
+
+        def complete(*words):
+            # 替身 evm 只用于通过脚本开头的 command -v 检查；被调用即报错
+            script = (
+                'evm() { echo CALLED >&2; }; '
+                f'source {comp}; '
+                f'COMP_WORDS=(evm --env-file {env_file} {" ".join(words)}); '
+                'COMP_CWORD=$((${#COMP_WORDS[@]} - 1)); '
+                '_evm_completions; echo "${COMPREPLY[*]}"'
+            )
+            result = subprocess.run(
+                ['bash', '-c', script], capture_output=True, text=True
+            )
+            assert result.stderr == ''
+            return result.stdout.split()
+
+        assert complete('get', 'AP') == ['API_KEY', 'APP_NAME']
+        assert complete('getg', "''") == ['dev', '--help']
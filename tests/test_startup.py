@@ -0,0 +1,138 @@
+"""
+CLI 启动开销回归测试
+
+`evm get` 在 shell 提示符、脚本循环里被高频调用，启动时间主要花在 import 上。
+这里用 `python -X importtime` 运行一次 `evm get`，断言重模块没有被加载、
+总导入时间不超过预算（可用 EVM_STARTUP_BUDGET_MS 调整）。
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from evm.cli import _parse_fast
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 只读命令不应触发的模块：argparse 解析器、子进程、加密实现、
+# 以及只在特定输出路径用到的 shell 集成 / JSON 信封 / 表格格式化
+HEAVY_MODULES = (
+    'argparse',
+    'subprocess',
+    'tempfile',
+    'shutil',
+    'hashlib',
+    'hmac',
+    'evm._crypto',
+    'evm._daemon',
+    'evm._client',
+    'evm._upgrade',
+    'evm._completion',
+    'evm._json',
+    'evm.formatters',
+)
+
+STARTUP_BUDGET_MS = float(os.environ.get('EVM_STARTUP_BUDGET_MS', '250'))
+
+
+def _import_times(tmp_path, *args):
+    """运行 evm 命令，返回 {模块名: 累计导入耗时(us)} 与顶层导入总耗时"""
+    env_file = tmp_path / 'env.json'
+    env_file.write_text('{"A": "1"}')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = str(REPO_ROOT)
+    env['EVM_NO_AUTO_INSTALL'] = '1'
+    env.pop('EVM_DAEMON', None)
+    code = (
+        'import sys; from evm.cli import main; '
+        'sys.exit(main(sys.argv[1:]))'
+    )
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code,
+         '--env-file', str(env_file), *args],
+        capture_output=True, text=True, env=env, cwd=str(tmp_path),
+    )
+    assert proc.returncode == 0, proc.stderr
+
+    modules: dict[str, int] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue
+        depth = len(name) - len(name.lstrip())
+        modules[name.strip()] = int(cumulative)
+        if depth == 1:
+            total += int(cumulative)
+    return proc.stdout, modules, total
+
+
+class TestStartupImports:
+    """只读命令的导入开销"""
+
+    @pytest.mark.parametrize('args, needed', [
+        (('get', 'A'), ()),
+        (('get', 'A', '--json'), ('evm._json',)),
+        # 表格输出需要格式化模块及终端宽度
+        (('list',), ('evm.formatters', 'shutil')),
+        (('inject', '--shell', 'bash'), ()),
+    ])
+    def test_read_commands_skip_heavy_modules(self, tmp_path, args, needed):
+        _, modules, _ = _import_times(tmp_path, *args)
+        loaded = [m for m in HEAVY_MODULES if m in modules and m not in needed]
+        assert loaded == []
+
+    def test_get_within_budget(self, tmp_path):
+        stdout, _, total = _import_times(tmp_path, 'get', 'A')
+        assert stdout.strip() == '1'
+        assert total / 1000 < STARTUP_BUDGET_MS
+
+    def test_other_commands_still_use_argparse(self, tmp_path):
+        _, modules, _ = _import_times(tmp_path, 'search', 'A')
+        assert 'argparse' in modules
+
+
+class TestParseFast:
+    """argparse 快速路径"""
+
+    def test_get(self):
+        ns = _parse_fast(['--env-file', 'x.json', 'get', 'A', '--secret'])
+        assert ns.command == 'get'
+        assert ns.env_file == 'x.json'
+        assert ns.key == 'A'
+        assert ns.secret is True
+
+    def test_list_optional_pattern(self):
+        assert _parse_fast(['list']).pattern is None
+        ns = _parse_fast(['--json', 'list', 'APP_*', '-g', 'dev'])
+        assert ns.pattern == 'APP_*'
+        assert ns.group == 'dev'
+        assert ns.json_mode is True
+
+    def test_inject(self):
+        ns = _parse_fast(['inject', '--shell', 'fish', '--include-secrets'])
+        assert ns.shell == 'fish'
+        assert ns.include_secrets is True
+        assert ns.prefix is None
+
+    @pytest.mark.parametrize('argv', [
+        [],
+        ['set', 'A', '1'],
+        ['get'],
+        ['get', 'A', 'B'],
+        ['get', '--help'],
+        ['-h'],
+        ['list', '--group=dev'],
+        ['list', '--unknown'],
+        ['inject', '--shell', 'powershell'],
+        ['inject', '--prefix'],
+        ['inject', '--prefix', '-x'],
+        ['--env-file'],
+    ])
+    def test_falls_back_to_argparse(self, argv):
+        assert _parse_fast(argv) is None
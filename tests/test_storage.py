@@ -0,0 +1,796 @@
+"""
+存储层测试
+
+覆盖：
+- transaction() 批量事务（单次写入、回滚、嵌套、历史缓冲）
+- batch() / evm batch 命令
+- ChangeTrackingDict 增量记录
+- wal 存储引擎（追加、重放、残缺末行、压缩）
+- refresh() / auto_refresh 与进程级解析缓存
+- 合并提交：并发写入者（多进程压力测试）不丢更新
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from evm import _storage
+from evm._storage import DELETED, ChangeTrackingDict, wal_path
+from evm.cli import main
+from evm.exceptions import (
+    CorruptedStorageError,
+    EVMError,
+    KeyNotFoundError,
+    StorageError,
+)
+from evm.manager import EnvironmentManager
+
+# ══════════════════════════════════════════════════════════════
+# transaction()
+# ══════════════════════════════════════════════════════════════
+
+
+class TestTransaction:
+    """transaction() 批量事务"""
+
+    def test_single_write_for_many_mutations(self, tmp_path, monkeypatch):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        writes = []
+        original = mgr._save_env_vars.__func__
+
+        def counting_save(self, dry_run=False):
+            if not self._txn_depth and not dry_run:
+                writes.append(1)
+            return original(self, dry_run)
+
+        monkeypatch.setattr(EnvironmentManager, '_save_env_vars', counting_save)
+        with mgr.transaction():
+            for i in range(50):
+                mgr.set(f'K{i}', str(i))
+            mgr.rename('K0', 'RENAMED')
+            mgr.set_grouped('dev', 'DB', 'x')
+        assert len(writes) == 1
+        on_disk = json.loads((tmp_path / 'env.json').read_text())
+        assert len(on_disk) == 51
+        assert on_disk['RENAMED'] == '0'
+        assert on_disk['dev:DB'] == 'x'
+
+    def test_nothing_written_until_commit(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        with mgr.transaction():
+            mgr.set('A', '1')
+            assert not env_file.exists()
+        assert json.loads(env_file.read_text()) == {'A': '1'}
+
+    def test_rollback_on_exception(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('KEEP', 'v')
+        with pytest.raises(KeyNotFoundError):
+            with mgr.transaction():
+                mgr.set('NEW', '1')
+                mgr.delete('KEEP')
+                mgr.delete('MISSING')
+        assert mgr.list_vars() == {'KEEP': 'v'}
+        assert json.loads(env_file.read_text()) == {'KEEP': 'v'}
+
+    def test_nested_transaction_joins_outer(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        with mgr.transaction():
+            mgr.set('A', '1')
+            with mgr.transaction():
+                mgr.set('B', '2')
+            assert not env_file.exists()
+        assert json.loads(env_file.read_text()) == {'A': '1', 'B': '2'}
+
+    def test_history_flushed_once_on_commit(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with mgr.transaction():
+            mgr.set('A', '1')
+            mgr.set('B', '2')
+            assert not mgr._get_history_file().exists()
+        ops = [e['key'] for e in mgr.get_history()]
+        assert ops == ['B', 'A']
+
+    def test_history_discarded_on_rollback(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with pytest.raises(RuntimeError):
+            with mgr.transaction():
+                mgr.set('A', '1')
+                raise RuntimeError('boom')
+        assert mgr.get_history() == []
+
+    def test_empty_transaction_does_not_write(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        with mgr.transaction():
+            pass
+        assert not env_file.exists()
+
+
+# ══════════════════════════════════════════════════════════════
+# batch() / evm batch
+# ══════════════════════════════════════════════════════════════
+
+
+class TestBatch:
+    """batch() 与 evm batch 命令"""
+
+    def test_batch_applies_operations(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        result = mgr.batch([
+            ['set', 'A', '1'],
+            [],
+            ['copy', 'A', 'B'],
+            ['setg', 'dev', 'C', '3'],
+            ['delete', 'A'],
+        ])
+        assert result['applied'] == 4
+        assert mgr.list_vars() == {'B': '1', 'dev:C': '3'}
+
+    def test_batch_unknown_operation_reports_line(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with pytest.raises(EVMError, match='operation 2'):
+            mgr.batch([['set', 'A', '1'], ['frobnicate', 'X']])
+        assert mgr.list_vars() == {}
+
+    def test_batch_wrong_arity(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with pytest.raises(EVMError, match='expects 2 argument'):
+            mgr.batch([['set', 'A']])
+
+    def test_batch_dry_run_writes_nothing(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        result = mgr.batch([['set', 'A', '1']], dry_run=True)
+        assert result['messages'] == ['[DRY-RUN] Would set: A=1']
+        assert not env_file.exists()
+
+    def test_batch_dry_run_sees_earlier_operations(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('X', 'old')
+        before = env_file.read_text()
+        history = mgr.get_history(limit=100)
+        result = mgr.batch([
+            ['set', 'A', '1'],
+            ['rename', 'A', 'B'],
+            ['delete', 'X'],
+            ['set', 'X', 'new'],
+            ['delete', 'X'],
+        ], dry_run=True)
+        assert result['applied'] == 5
+        assert all(m.startswith('[DRY-RUN]') for m in result['messages'])
+        assert mgr.list_vars() == {'X': 'old'}
+        assert env_file.read_text() == before
+        assert mgr.get_history(limit=100) == history
+
+    def test_batch_dry_run_reports_real_failure(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        with pytest.raises(KeyNotFoundError):
+            mgr.batch([['set', 'A', '1'], ['delete', 'A'], ['delete', 'A']], dry_run=True)
+        assert mgr.list_vars() == {}
+
+    def test_cli_batch_from_stdin(self, tmp_path, monkeypatch, capsys):
+        env_file = tmp_path / 'env.json'
+        monkeypatch.setenv('EVM_NO_AUTO_INSTALL', '1')
+        monkeypatch.setattr(
+            'sys.stdin',
+            io.StringIO('set A 1\n# comment\nset B "two words"\nrename A C\n'),
+        )
+        code = main(['--env-file', str(env_file), '--json', 'batch'])
+        assert code == 0
+        out = json.loads(capsys.readouterr().out)
+        assert out['data']['applied'] == 3
+        assert json.loads(env_file.read_text()) == {'B': 'two words', 'C': '1'}
+
+    def test_cli_batch_failure_rolls_back(self, tmp_path, monkeypatch):
+        env_file = tmp_path / 'env.json'
+        monkeypatch.setenv('EVM_NO_AUTO_INSTALL', '1')
+        monkeypatch.setattr('sys.stdin', io.StringIO('set A 1\ndelete NOPE\n'))
+        code = main(['--env-file', str(env_file), '--quiet', 'batch'])
+        assert code == 2
+        assert not env_file.exists()
+
+    def test_cli_batch_from_file(self, tmp_path, monkeypatch):
+        env_file = tmp_path / 'env.json'
+        ops = tmp_path / 'ops.txt'
+        ops.write_text("set X 'a b'\n")
+        monkeypatch.setenv('EVM_NO_AUTO_INSTALL', '1')
+        code = main(['--env-file', str(env_file), '--quiet', 'batch', '-f', str(ops)])
+        assert code == 0
+        assert json.loads(env_file.read_text()) == {'X': 'a b'}
+
+
+# ══════════════════════════════════════════════════════════════
+# ChangeTrackingDict
+# ══════════════════════════════════════════════════════════════
+
+
+class TestChangeTrackingDict:
+
+    def test_records_sets_and_deletes(self):
+        d = ChangeTrackingDict({'A': '1', 'B': '2'})
+        assert d.changes == {}
+        d['C'] = '3'
+        del d['A']
+        d.pop('B')
+        d.pop('MISSING', None)
+        d.update({'D': '4'})
+        assert d.changes == {'C': '3', 'A': DELETED, 'B': DELETED, 'D': '4'}
+        assert not d.reset
+
+    def test_clear_marks_reset(self):
+        d = ChangeTrackingDict({'A': '1'})
+        d['B'] = '2'
+        d.clear()
+        assert d.reset
+        assert d.changes == {}
+        d.mark_committed()
+        assert not d.reset
+
+    def test_keys_changed_only_on_add_or_remove(self):
+        d = ChangeTrackingDict({'A': '1', 'B': '2'})
+        d['A'] = 'new value'
+        assert not d.keys_changed
+        d['C'] = '3'
+        assert d.keys_changed
+        d.mark_committed()
+        assert not d.keys_changed
+        d.pop('MISSING', None)
+        assert not d.keys_changed
+        del d['B']
+        assert d.keys_changed
+
+    def test_assigning_plain_dict_marks_reset(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        mgr._env_vars = {'X': '1'}
+        assert isinstance(mgr._env_vars, ChangeTrackingDict)
+        assert mgr._env_vars.reset
+
+
+class TestGroupIndex:
+    """ChangeTrackingDict 分组索引：按需构建、增量维护"""
+
+    def test_built_lazily(self):
+        d = ChangeTrackingDict({'dev:A': '1', 'B': '2'})
+        d['dev:C'] = '3'
+        assert d._groups is None
+        assert d.group_keys('dev') == ['dev:A', 'dev:C']
+        assert d._groups is not None
+
+    def test_maintained_on_mutation(self):
+        d = ChangeTrackingDict({'dev:A': '1', 'prod:A': '1', 'X': '0'})
+        assert d.group_counts() == {'dev': 1, 'prod': 1}
+        d['dev:B'] = '2'
+        d['dev:B'] = '3'  # 覆盖不重复计数
+        del d['prod:A']
+        d.pop('X')
+        d.setdefault('qa:Z', '9')
+        assert d.group_counts() == {'dev': 2, 'qa': 1}
+        assert d.group_keys('prod') == []
+        d.clear()
+        assert d.group_counts() == {}
+        d['dev:A'] = '1'
+        assert d.group_keys('dev') == ['dev:A']
+
+    def test_nested_group(self):
+        d = ChangeTrackingDict({'a:b:K': '1', 'a:c:K': '2', 'a:K': '3'})
+        assert d.group_keys('a:b') == ['a:b:K']
+        assert d.group_keys('a') == ['a:b:K', 'a:c:K', 'a:K']
+        assert d.group_counts() == {'a': 3}
+
+    def test_matches_linear_scan(self):
+        d = ChangeTrackingDict(
+            {f'g{i % 7}:K{i}': str(i) for i in range(200)}
+        )
+        for i in range(0, 200, 3):
+            del d[f'g{i % 7}:K{i}']
+        for group in ('g0', 'g3', 'g6', 'missing'):
+            assert d.group_keys(group) == [
+                k for k in d if k.startswith(f'{group}:')
+            ]
+
+    def test_manager_group_operations(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'))
+        mgr.set_grouped('dev', 'A', '1')
+        mgr.set_grouped('dev', 'B', '2')
+        mgr.set('C', '3')
+        assert mgr.list_groups() == {'dev': 2}
+        mgr.move_to_group('C', 'dev')
+        assert mgr.list_vars(group='dev', no_prefix=True) == {
+            'A': '1', 'B': '2', 'C': '3',
+        }
+        mgr.delete_group('dev')
+        assert mgr.list_groups() == {}
+        assert mgr.list_vars() == {}
+
+
+# ══════════════════════════════════════════════════════════════
+# wal 存储引擎
+# ══════════════════════════════════════════════════════════════
+
+
+class TestWalStorage:
+
+    def _wal_lines(self, env_file):
+        return wal_path(env_file).read_text().splitlines()
+
+    def test_engine_selection(self, tmp_path, monkeypatch):
+        env_file = str(tmp_path / 'env.json')
+        assert EnvironmentManager(env_file).storage == 'json'
+        assert EnvironmentManager(env_file, storage='wal').storage == 'wal'
+        monkeypatch.setenv('EVM_STORAGE', 'wal')
+        assert EnvironmentManager(env_file).storage == 'wal'
+        with pytest.raises(StorageError, match='Unknown storage engine'):
+            EnvironmentManager(env_file, storage='sqlite')
+
+    def test_set_appends_single_record(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.set('A', '1')
+        mgr.set('B', '2')
+        mgr.delete('A')
+        assert not env_file.exists()
+        records = [json.loads(line) for line in self._wal_lines(env_file)]
+        assert records == [
+            {'op': 'set', 'key': 'A', 'value': '1'},
+            {'op': 'set', 'key': 'B', 'value': '2'},
+            {'op': 'delete', 'key': 'A'},
+        ]
+
+    def test_reload_replays_log_over_snapshot(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        env_file.write_text(json.dumps({'A': 'old', 'KEEP': 'k'}))
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.set('A', 'new')
+        mgr.rename('KEEP', 'MOVED')
+        for storage in ('wal', 'json'):
+            again = EnvironmentManager(str(env_file), storage=storage)
+            assert again.list_vars() == {'A': 'new', 'MOVED': 'k'}
+
+    def test_transaction_appends_once(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        with mgr.transaction():
+            mgr.set('A', '1')
+            mgr.set('A', '2')
+            mgr.set('B', '3')
+        assert len(self._wal_lines(env_file)) == 2
+
+    def test_torn_tail_is_ignored_and_repaired(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.set('A', '1')
+        with open(wal_path(env_file), 'a') as f:
+            f.write('{"op": "set", "key": "HALF')
+        mgr2 = EnvironmentManager(str(env_file), storage='wal')
+        assert mgr2.list_vars() == {'A': '1'}
+        mgr2.set('B', '2')
+        assert EnvironmentManager(str(env_file)).list_vars() == {'A': '1', 'B': '2'}
+
+    def test_corrupted_middle_line_raises(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        wal_path(env_file).write_text('garbage\n{"op": "delete", "key": "A"}\n')
+        with pytest.raises(CorruptedStorageError, match='WAL'):
+            EnvironmentManager(str(env_file), storage='wal')
+
+    @pytest.mark.parametrize('record', [
+        '{"op": "set", "value": "1"}',
+        '{"op": "delete", "key": null}',
+        '{"op": "set", "key": 1, "value": "1"}',
+        '{"op": "set", "key": "A", "value": 1}',
+        '["set", "A", "1"]',
+    ])
+    def test_invalid_record_raises(self, tmp_path, record):
+        env_file = tmp_path / 'env.json'
+        wal_path(env_file).write_text(record + '\n')
+        with pytest.raises(CorruptedStorageError, match='WAL'):
+            EnvironmentManager(str(env_file), storage='wal')
+
+    def test_compaction_writes_snapshot_and_removes_log(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(_storage, 'WAL_COMPACT_MIN_BYTES', 200)
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        for i in range(20):
+            mgr.set(f'KEY_{i}', 'x' * 10)
+        assert env_file.exists()
+        assert json.loads(env_file.read_text())['KEY_0'] == 'x' * 10
+        assert EnvironmentManager(str(env_file)).list_vars() == mgr.list_vars()
+
+    def test_clear_writes_snapshot(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.set('A', '1')
+        mgr.clear()
+        assert not wal_path(env_file).exists()
+        assert json.loads(env_file.read_text()) == {}
+
+    def test_json_engine_save_folds_existing_log(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        EnvironmentManager(str(env_file), storage='wal').set('A', '1')
+        mgr = EnvironmentManager(str(env_file), storage='json')
+        mgr.set('B', '2')
+        assert not wal_path(env_file).exists()
+        assert json.loads(env_file.read_text()) == {'A': '1', 'B': '2'}
+
+    def test_info_reports_engine(self, tmp_path):
+        mgr = EnvironmentManager(str(tmp_path / 'env.json'), storage='wal')
+        assert mgr.info()['storage_engine'] == 'wal'
+
+
+# ══════════════════════════════════════════════════════════════
+# refresh() / 进程级解析缓存
+# ══════════════════════════════════════════════════════════════
+
+
+def _external_write(env_file, data):
+    """模拟其他进程整体改写存储（mtime 回拨到足够早，允许缓存）"""
+    env_file.write_text(json.dumps(data))
+    stat = env_file.stat()
+    os.utime(env_file, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    calls = []
+    original = json.loads
+
+    def spy(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(json, 'loads', spy)
+    return calls
+
+
+class TestRefresh:
+
+    def test_unchanged_store_not_reparsed(self, tmp_path, count_parses):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('A', '1')
+        count_parses.clear()
+        assert not mgr.refresh()
+        assert count_parses == []
+
+    def test_external_write_reloaded(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('A', '1')
+        _external_write(env_file, {'A': '2', 'B': '3'})
+        assert mgr.refresh()
+        assert mgr.list_vars() == {'A': '2', 'B': '3'}
+        assert not mgr.refresh()
+
+    def test_own_write_recorded_without_trigram_log(
+        self, tmp_path, monkeypatch, count_parses
+    ):
+        import evm._trigram as trigram
+
+        def fail(*args, **kwargs):
+            raise OSError('disk full')
+
+        monkeypatch.setattr(trigram, 'append_trigram_log', fail)
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('A', '1')
+        mgr.set('B', '2')
+        count_parses.clear()
+        assert not mgr.refresh()
+        assert count_parses == []
+
+    def test_wal_append_reloaded(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.set('A', '1')
+        EnvironmentManager(str(env_file), storage='wal').set('B', '2')
+        assert mgr.refresh()
+        assert mgr.get('B') == '2'
+
+    def test_not_refreshed_with_pending_changes(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file))
+        mgr.set('A', '1')
+        with mgr.transaction():
+            mgr.set('PENDING', 'x')
+            _external_write(env_file, {'OTHER': '1'})
+            assert not mgr.refresh()
+            assert mgr.get('PENDING') == 'x'
+
+    def test_auto_refresh(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        EnvironmentManager(str(env_file)).set('A', '1')
+        eager = EnvironmentManager(str(env_file), auto_refresh=0)
+        lazy = EnvironmentManager(str(env_file), auto_refresh=3600)
+        _external_write(env_file, {'A': '2'})
+        assert eager.get('A') == '2'
+        assert lazy.get('A') == '1'
+        lazy._refresh_at = 0  # 间隔已过
+        assert lazy.get('A') == '2'
+
+
+class TestStoreCache:
+
+    def test_repeated_construction_skips_parse(self, tmp_path, count_parses):
+        env_file = tmp_path / 'env.json'
+        _external_write(env_file, {'A': '1'})
+        first = EnvironmentManager(str(env_file))
+        count_parses.clear()
+        second = EnvironmentManager(str(env_file))
+        assert count_parses == []
+        assert second.list_vars() == first.list_vars() == {'A': '1'}
+
+    def test_managers_do_not_share_mutations(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        _external_write(env_file, {'A': '1'})
+        first = EnvironmentManager(str(env_file))
+        first._env_vars['A'] = 'in memory only'
+        assert EnvironmentManager(str(env_file)).get('A') == '1'
+
+    def test_commit_invalidates(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        _external_write(env_file, {'A': '1'})
+        EnvironmentManager(str(env_file)).set('A', '2')
+        assert EnvironmentManager(str(env_file)).get('A') == '2'
+
+    def test_external_change_reparsed(self, tmp_path, count_parses):
+        env_file = tmp_path / 'env.json'
+        _external_write(env_file, {'A': '1'})
+        EnvironmentManager(str(env_file))
+        _external_write(env_file, {'A': '22'})
+        count_parses.clear()
+        assert EnvironmentManager(str(env_file)).get('A') == '22'
+        assert count_parses == [1]
+
+    def test_recently_modified_not_cached(self, tmp_path, count_parses):
+        env_file = tmp_path / 'env.json'
+        env_file.write_text('{"A": "1"}')
+        EnvironmentManager(str(env_file))
+        count_parses.clear()
+        EnvironmentManager(str(env_file))
+        assert count_parses == [1]
+
+    def test_size_bound(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(_storage, 'STORE_CACHE_SIZE', 2)
+        monkeypatch.setattr(_storage, '_store_cache', {})
+        for name in ('a', 'b', 'c'):
+            env_file = tmp_path / f'{name}.json'
+            _external_write(env_file, {'K': name})
+            EnvironmentManager(str(env_file))
+        assert [Path(p).name for p in _storage._store_cache] == ['b.json', 'c.json']
+
+
+# ══════════════════════════════════════════════════════════════
+# 合并提交（并发写入不丢更新）
+# ══════════════════════════════════════════════════════════════
+
+_WRITER = '''
+import sys
+from evm.manager import EnvironmentManager
+path, storage, worker, count = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+mgr = EnvironmentManager(path, storage=storage, lock_timeout=60)
+for i in range(count):
+    mgr.set(f'W{worker}_{i}', f'{worker}-{i}')
+    if i % 5 == 4:
+        mgr.delete(f'W{worker}_{i - 1}')
+mgr.set('SHARED', worker)
+'''
+
+
+class TestMergeOnCommit:
+
+    @pytest.mark.parametrize('storage', ['json', 'wal'])
+    def test_interleaved_managers(self, tmp_path, storage):
+        env_file = str(tmp_path / 'env.json')
+        a = EnvironmentManager(env_file, storage=storage)
+        b = EnvironmentManager(env_file, storage=storage)
+        a.set('A', '1')
+        b.set('B', '2')
+        a.set('C', '3')
+        assert EnvironmentManager(env_file).list_vars() == {
+            'A': '1', 'B': '2', 'C': '3',
+        }
+        # 提交时并入了他人的修改
+        assert a.list_vars() == {'A': '1', 'B': '2', 'C': '3'}
+
+    def test_delete_and_overwrite(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        seed = EnvironmentManager(env_file)
+        seed.set('X', 'old')
+        seed.set('Y', 'old')
+        a = EnvironmentManager(env_file)
+        b = EnvironmentManager(env_file)
+        a.delete('X')
+        b.set('Y', 'from b')
+        assert EnvironmentManager(env_file).list_vars() == {'Y': 'from b'}
+        # 同一 key 以后提交者为准
+        a.set('Y', 'from a')
+        b.set('X', 'back')
+        assert EnvironmentManager(env_file).list_vars() == {
+            'X': 'back', 'Y': 'from a',
+        }
+
+    def test_transaction_merges_once(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        a = EnvironmentManager(env_file)
+        with a.transaction():
+            a.set('A', '1')
+            EnvironmentManager(env_file).set('OTHER', 'x')
+            a.set('B', '2')
+        assert EnvironmentManager(env_file).list_vars() == {
+            'OTHER': 'x', 'A': '1', 'B': '2',
+        }
+
+    def test_clear_is_not_merged(self, tmp_path):
+        env_file = str(tmp_path / 'env.json')
+        a = EnvironmentManager(env_file)
+        a.set('A', '1')
+        EnvironmentManager(env_file).set('B', '2')
+        a.clear()
+        assert EnvironmentManager(env_file).list_vars() == {}
+
+    def test_wal_compaction_keeps_others(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(_storage, 'WAL_COMPACT_MIN_BYTES', 200)
+        env_file = str(tmp_path / 'env.json')
+        a = EnvironmentManager(env_file, storage='wal')
+        b = EnvironmentManager(env_file, storage='wal')
+        for i in range(20):
+            a.set(f'A{i}', 'x' * 10)
+            b.set(f'B{i}', 'x' * 10)
+        assert len(EnvironmentManager(env_file).list_vars()) == 40
+
+    def test_rebase_maintains_indexes(self):
+        d = ChangeTrackingDict({'g:A': '1', 'KEEP': 'mine', 'GONE': 'x'})
+        d.group_counts()
+        list(d.folded_items())
+        seen = []
+        d.on_change = seen.append
+        d['KEEP'] = 'local'
+        d.mark_committed()
+        d['LOCAL'] = 'new'
+        touched = d.rebase({'g:A': '2', 'g:B': '3', 'KEEP': 'theirs'})
+        assert sorted(touched) == ['GONE', 'KEEP', 'g:A', 'g:B']
+        assert dict(d) == {'g:A': '2', 'KEEP': 'theirs', 'LOCAL': 'new', 'g:B': '3'}
+        assert d.changes == {'LOCAL': 'new'}
+        assert d.group_keys('g') == ['g:A', 'g:B']
+        assert dict(d.folded_items())['g:A'] == ('g:a', '2')
+        assert 'GONE' not in dict(d.folded_items())
+        assert sorted(seen[2:]) == ['GONE', 'KEEP', 'g:A', 'g:B']
+
+    @pytest.mark.parametrize('storage', ['json', 'wal'])
+    def test_parallel_writers_lose_nothing(self, tmp_path, storage):
+        workers, count = 6, 20
+        env_file = str(tmp_path / 'env.json')
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parents[1]))
+        procs = [
+            subprocess.Popen(
+                [sys.executable, '-c', _WRITER, env_file, storage, str(w), str(count)],
+                env=env,
+            )
+            for w in range(workers)
+        ]
+        assert [p.wait(timeout=120) for p in procs] == [0] * workers
+
+        result = EnvironmentManager(env_file).list_vars()
+        expected = {
+            f'W{w}_{i}': f'{w}-{i}'
+            for w in range(workers)
+            for i in range(count)
+            if i % 5 != 3
+        }
+        assert result.pop('SHARED') in {str(w) for w in range(workers)}
+        assert result == expected
+
+
+# ══════════════════════════════════════════════════════════════
+# 读写锁（LOCK_SH 读 / LOCK_EX 提交，指数退避）
+# ══════════════════════════════════════════════════════════════
+
+def _hold_lock(env_file, operation, seconds=None):
+    """以独立 fd 持有 .lock；seconds 后在后台线程释放"""
+    import fcntl
+    import threading
+
+    fd = os.open(str(env_file) + '.lock', os.O_CREAT | os.O_RDWR, 0o600)
+    fcntl.flock(fd, operation | fcntl.LOCK_NB)
+
+    def release():
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    if seconds is None:
+        return release
+    timer = threading.Timer(seconds, release)
+    timer.start()
+    return timer.join
+
+
+class TestStoreLock:
+
+    def _stale_store(self, tmp_path):
+        """写入存储并清空解析缓存，确保下次加载真正读文件"""
+        env_file = tmp_path / 'env.json'
+        EnvironmentManager(str(env_file)).set('A', '1')
+        _storage._store_cache.clear()
+        return env_file
+
+    def test_readers_share_lock(self, tmp_path):
+        import fcntl
+
+        env_file = self._stale_store(tmp_path)
+        release = _hold_lock(env_file, fcntl.LOCK_SH)
+        try:
+            mgr = EnvironmentManager(str(env_file), lock_timeout=0.2)
+        finally:
+            release()
+        assert mgr.get('A') == '1'
+        assert mgr.lock_stats['contended'] == 0
+
+    def test_reader_waits_for_writer(self, tmp_path):
+        import fcntl
+
+        env_file = self._stale_store(tmp_path)
+        join = _hold_lock(env_file, fcntl.LOCK_EX, seconds=0.05)
+        mgr = EnvironmentManager(str(env_file), lock_timeout=5)
+        join()
+        stats = mgr.info()['lock']
+        assert mgr.get('A') == '1'
+        assert stats['contended'] == 1
+        assert stats['retries'] >= 1
+        assert stats['timeouts'] == 0
+        assert 0.03 < stats['max_wait_seconds'] < 1
+
+    def test_writer_waits_for_reader(self, tmp_path):
+        import fcntl
+
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), lock_timeout=5)
+        join = _hold_lock(env_file, fcntl.LOCK_SH, seconds=0.05)
+        mgr.set('A', '1')
+        join()
+        assert mgr.lock_stats['contended'] == 1
+        assert EnvironmentManager(str(env_file)).get('A') == '1'
+
+    def test_zero_timeout_fails_fast(self, tmp_path, monkeypatch):
+        import fcntl
+
+        sleeps = []
+        monkeypatch.setattr('evm.manager.time.sleep', sleeps.append)
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), lock_timeout=0)
+        release = _hold_lock(env_file, fcntl.LOCK_EX)
+        try:
+            with pytest.raises(EVMError):
+                mgr.set('A', '1')
+        finally:
+            release()
+        assert sleeps == []
+        assert mgr.lock_stats['timeouts'] == 1
+        assert mgr.lock_stats['acquired'] == 0
+
+    def test_timeout_counts(self, tmp_path):
+        import fcntl
+
+        from evm.exceptions import LockTimeoutError
+
+        env_file = tmp_path / 'env.json'
+        mgr = EnvironmentManager(str(env_file), lock_timeout=0.05)
+        release = _hold_lock(env_file, fcntl.LOCK_EX)
+        try:
+            with pytest.raises(LockTimeoutError):
+                mgr.set('A', '1')
+        finally:
+            release()
+        stats = mgr.info()['lock']
+        assert stats['timeouts'] == 1
+        # 1ms 起翻倍：0.05s 内约 6 次重试，而非固定 50ms 轮询的 1 次
+        assert stats['retries'] >= 4
+        assert stats['wait_seconds'] >= 0.05
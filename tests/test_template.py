@@ -0,0 +1,242 @@
+"""
+模板展开测试
+
+TemplateResolver 按引用图拓扑序展开并缓存结果；
+修改变量只让它及引用它的变量失效；循环引用给出完整环路。
+inject/exec/export/loadmemory 的 expand 选项一次性展开整个存储。
+"""
+
+import json
+import os
+import subprocess
+
+import pytest
+
+from evm._template import TemplateResolver
+from evm.cli import main
+from evm.exceptions import KeyNotFoundError, TemplateCycleError
+from evm.manager import EnvironmentManager
+
+
+@pytest.fixture
+def mgr(tmp_path):
+    return EnvironmentManager(str(tmp_path / 'env.json'))
+
+
+def _diamond_chain(levels):
+    """L0 → (La1, Lb1) → L1 → ... 每层两条路径汇合，朴素递归为 2^levels"""
+    env = {f'L{levels}': 'base'}
+    for i in range(levels - 1, -1, -1):
+        env[f'La{i}'] = f'{{{{L{i + 1}}}}}'
+        env[f'Lb{i}'] = f'{{{{L{i + 1}}}}}'
+        env[f'L{i}'] = f'{{{{La{i}}}}}{{{{Lb{i}}}}}'
+    return env
+
+
+class TestTemplateResolver:
+    """解析器本身"""
+
+    def test_diamond_expanded_once_per_key(self, monkeypatch):
+        env = _diamond_chain(16)
+        resolver = TemplateResolver(env)
+        calls = []
+        original = resolver._substitute
+
+        def spy(key):
+            calls.append(key)
+            return original(key)
+
+        monkeypatch.setattr(resolver, '_substitute', spy)
+        assert len(resolver.resolve('L0')) == len('base') * 2 ** 16
+        assert sorted(calls) == sorted(env)
+
+    def test_deep_chain_no_recursion_limit(self):
+        env = {f'K{i}': f'{{{{K{i + 1}}}}}' for i in range(5000)}
+        env['K5000'] = 'end'
+        assert TemplateResolver(env).resolve('K0') == 'end'
+
+    def test_self_reference(self):
+        with pytest.raises(TemplateCycleError) as exc_info:
+            TemplateResolver({'A': 'x{{A}}'}).resolve('A')
+        assert exc_info.value.cycle == ['A', 'A']
+
+    def test_cycle_reports_only_the_loop(self):
+        env = {'A': '{{B}}', 'B': '{{C}}', 'C': '{{D}}', 'D': '{{B}}'}
+        with pytest.raises(TemplateCycleError) as exc_info:
+            TemplateResolver(env).resolve('A')
+        assert exc_info.value.cycle == ['B', 'C', 'D', 'B']
+
+    def test_missing_key(self):
+        with pytest.raises(KeyNotFoundError):
+            TemplateResolver({}).resolve('NOPE')
+
+    def test_resolve_all(self):
+        env = {'HOST': 'db', 'URL': 'pg://{{HOST}}/{{NAME}}', 'X': '{{URL}}'}
+        assert TemplateResolver(env).resolve_all() == {
+            'HOST': 'db', 'URL': 'pg://db/{{NAME}}', 'X': 'pg://db/{{NAME}}',
+        }
+
+
+class TestIncrementalInvalidation:
+    """EnvironmentManager 上的缓存失效"""
+
+    def test_changed_dependency_is_reflected(self, mgr):
+        mgr.set('HOST', 'a')
+        mgr.set('URL', 'http://{{HOST}}')
+        mgr.set('API', '{{URL}}/api')
+        assert mgr.expand('API') == 'http://a/api'
+        mgr.set('HOST', 'b')
+        assert mgr.expand('API') == 'http://b/api'
+
+    def test_unrelated_cache_kept(self, mgr):
+        mgr.set('HOST', 'a')
+        mgr.set('URL', 'http://{{HOST}}')
+        mgr.set('OTHER', 'x')
+        mgr.expand_all()
+        resolver = mgr._template_resolver()
+        mgr.set('HOST', 'b')
+        assert 'OTHER' in resolver._expanded
+        assert 'URL' not in resolver._expanded
+        assert mgr._template_resolver() is resolver
+
+    def test_reference_defined_later(self, mgr):
+        mgr.set('URL', 'http://{{HOST}}')
+        assert mgr.expand('URL') == 'http://{{HOST}}'
+        mgr.set('HOST', 'h')
+        assert mgr.expand('URL') == 'http://h'
+        mgr.delete('HOST')
+        assert mgr.expand('URL') == 'http://{{HOST}}'
+
+    def test_edge_removed(self, mgr):
+        mgr.set('A', '{{B}}')
+        mgr.set('B', '1')
+        assert mgr.expand('A') == '1'
+        mgr.set('A', 'plain')
+        mgr.set('B', '2')
+        assert mgr.expand('A') == 'plain'
+
+    def test_rollback_rebuilds_resolver(self, mgr):
+        mgr.set('A', '{{B}}')
+        mgr.set('B', '1')
+        assert mgr.expand('A') == '1'
+        with pytest.raises(RuntimeError):
+            with mgr.transaction():
+                mgr.set('B', '2')
+                assert mgr.expand('A') == '2'
+                raise RuntimeError('abort')
+        assert mgr.expand('A') == '1'
+
+    def test_clear(self, mgr):
+        mgr.set('A', '1')
+        assert mgr.expand('A') == '1'
+        mgr._env_vars.clear()
+        with pytest.raises(KeyNotFoundError):
+            mgr.expand('A')
+
+
+class TestExpandCli:
+    """evm expand --all"""
+
+    def test_expand_all_json(self, capsys, mgr):
+        mgr.set('HOST', 'db')
+        mgr.set('URL', 'pg://{{HOST}}')
+        code = main(['--env-file', str(mgr.env_file), '--json', 'expand', '--all'])
+        out, _ = capsys.readouterr()
+        assert code == 0
+        assert json.loads(out)['data'] == {'HOST': 'db', 'URL': 'pg://db'}
+
+    def test_expand_all_text(self, capsys, mgr):
+        mgr.set('B', '{{A}}!')
+        mgr.set('A', 'hi')
+        assert main(['--env-file', str(mgr.env_file), 'expand', '--all']) == 0
+        assert capsys.readouterr().out.splitlines() == ['A=hi', 'B=hi!']
+
+    def test_cycle_exit_code(self, capsys, mgr):
+        mgr.set('A', '{{B}}')
+        mgr.set('B', '{{A}}')
+        assert main(['--env-file', str(mgr.env_file), 'expand', 'A']) == 6
+        assert 'Circular reference detected: A -> B -> A' in capsys.readouterr().err
+
+    def test_missing_key_argument(self, capsys, mgr):
+        assert main(['--env-file', str(mgr.env_file), 'expand']) == 1
+
+
+class TestExpandOption:
+    """inject / exec / export / loadmemory 的 expand 选项"""
+
+    @pytest.fixture
+    def store(self, mgr):
+        mgr.set('HOST', 'db')
+        mgr.set('URL', 'pg://{{HOST}}/{{NAME}}')
+        mgr.set('dev:URL', '{{URL}}?dev')
+        return mgr
+
+    def test_inject(self, store, monkeypatch):
+        calls = []
+        original = TemplateResolver.resolve_all
+
+        def spy(self):
+            calls.append(1)
+            return original(self)
+
+        monkeypatch.setattr(TemplateResolver, 'resolve_all', spy)
+        result = store.inject(shell='bash', expand=True)
+        assert result['variables']['URL'] == 'pg://db/{{NAME}}'
+        assert len(calls) == 1
+        raw = store.inject(shell='bash')
+        assert raw['variables']['URL'] == 'pg://{{HOST}}/{{NAME}}'
+
+    def test_inject_group(self, store):
+        result = store.inject(shell='bash', group='dev', expand=True)
+        assert result['variables'] == {'URL': 'pg://db/{{NAME}}?dev'}
+
+    def test_inject_secret_reference(self, store):
+        store.set_secret('PASS', 's3cret')
+        store.set('DSN', 'pg://u:{{PASS}}@{{HOST}}')
+        result = store.inject(shell='bash', include_secrets=True, expand=True)
+        assert result['variables']['DSN'] == 'pg://u:s3cret@db'
+        # 明文不进入解析器缓存
+        assert 's3cret' not in store.expand('DSN')
+
+    def test_export(self, store, tmp_path):
+        out = tmp_path / 'out.json'
+        store.export('json', str(out), expand=True)
+        data = json.loads(out.read_text())
+        assert data['URL'] == 'pg://db/{{NAME}}'
+        assert data['dev:URL'] == 'pg://db/{{NAME}}?dev'
+
+    def test_export_group(self, store, tmp_path):
+        out = tmp_path / 'out.json'
+        store.export('json', str(out), group='dev', expand=True)
+        assert json.loads(out.read_text()) == {'dev:URL': 'pg://db/{{NAME}}?dev'}
+
+    def test_execute(self, store, monkeypatch):
+        captured = {}
+
+        def fake_run(command, env):
+            captured.update(env)
+            return subprocess.CompletedProcess(command, 0)
+
+        monkeypatch.setattr(subprocess, 'run', fake_run)
+        assert store.execute(['true'], expand=True) == 0
+        assert captured['URL'] == 'pg://db/{{NAME}}'
+
+    def test_load_to_memory(self, store, monkeypatch):
+        # 先登记，测试结束时由 monkeypatch 还原
+        for key in ('HOST', 'URL', 'dev:URL'):
+            monkeypatch.delenv(key, raising=False)
+        store.load_to_memory(add_evm_prefix=False, expand=True)
+        assert os.environ['URL'] == 'pg://db/{{NAME}}'
+
+    def test_cli_inject_expand(self, capsys, store):
+        code = main(['--env-file', str(store.env_file), 'inject',
+                     '--shell', 'bash', '--expand'])
+        out, _ = capsys.readouterr()
+        assert code == 0
+        assert "export URL='pg://db/{{NAME}}'" in out
+
+    def test_cycle_aborts_inject(self, capsys, store):
+        store.set('A', '{{B}}')
+        store.set('B', '{{A}}')
+        code = main(['--env-file', str(store.env_file), 'inject', '--expand'])
+        assert code == 6
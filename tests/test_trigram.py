@@ -0,0 +1,185 @@
+"""
+三元组索引测试
+
+search --value 在大存储上经 env.trgm 筛选候选；结果必须与全量扫描一致，
+修改经 env.trgm.log 增量记录，存储签名不符时重建。
+"""
+
+import json
+import random
+import string
+
+import pytest
+
+from evm._trigram import (
+    TrigramIndex,
+    trigram_index_path,
+    trigram_log_path,
+)
+from evm.manager import EnvironmentManager
+
+
+def _scan(env: dict, needle: str) -> dict:
+    needle = needle.casefold()
+    return {
+        k: v for k, v in env.items()
+        if needle in k.casefold() or needle in str(v).casefold()
+    }
+
+
+@pytest.fixture
+def always_index(monkeypatch):
+    monkeypatch.setenv('EVM_TRIGRAM_MIN_BYTES', '0')
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    path = tmp_path / 'env.json'
+    path.write_text(json.dumps({
+        'CERT': '-----BEGIN CERTIFICATE-----\nMIIBszCCAVmgAwIBAgIU\n-----END',
+        'CONFIG': '{"region": "eu-west", "timeout_ms": 3000}',
+        'DB_URL': 'postgres://Admin@db.internal/app',
+        'SHORT': 'x',
+    }))
+    return path
+
+
+class TestTrigramIndex:
+
+    def test_candidates_never_miss(self):
+        rng = random.Random(7)
+        alphabet = string.ascii_letters + string.digits + '-_:/ß'
+        env = {
+            f'K{i}': ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+            for i in range(300)
+        }
+        index = TrigramIndex.build(env, ((1, 2, 3), None))
+        for _ in range(200):
+            value = env[f'K{rng.randrange(300)}']
+            start = rng.randrange(max(len(value) - 3, 1))
+            needle = value[start:start + rng.randint(3, 8)].casefold()
+            if len(needle.encode()) < 3:
+                continue
+            expected = {k for k, v in env.items() if needle in v.casefold()}
+            assert expected <= index.candidates(needle)
+
+    def test_filters(self):
+        env = {f'K{i}': f'value-{i:05d}' for i in range(1000)}
+        index = TrigramIndex.build(env, ((1, 2, 3), None))
+        assert len(index.candidates('value-00042')) < 50
+        assert len(index.candidates('no such value here')) < 50
+
+    def test_short_needle_not_indexed(self):
+        index = TrigramIndex.build({'A': 'abc'}, ((1, 2, 3), None))
+        assert index.candidates('ab') is None
+
+    def test_save_load_roundtrip(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        index = TrigramIndex.build({'A': 'hello', 'B': 'world'}, ((1, 2, 3), None))
+        index.save(env_file)
+        loaded = TrigramIndex.load(env_file)
+        assert loaded.keys == ['A', 'B']
+        assert loaded.source == ((1, 2, 3), None)
+        assert loaded.candidates('orl') == {'B'}
+
+    def test_load_rejects_corrupt(self, tmp_path):
+        env_file = tmp_path / 'env.json'
+        trigram_index_path(env_file).write_bytes(b'not json\n')
+        assert TrigramIndex.load(env_file) is None
+        TrigramIndex.build({'A': 'hello'}, ((1, 2, 3), None)).save(env_file)
+        with open(trigram_index_path(env_file), 'ab') as f:
+            f.write(b'\x00')
+        assert TrigramIndex.load(env_file) is None
+
+
+class TestManagerSearch:
+
+    def test_index_created_and_matches_scan(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file))
+        for needle in ('eu-west', 'admin@', 'BEGIN CERT', 'nothing-here', 'x'):
+            assert mgr.search(needle, search_value=True) == _scan(
+                mgr.list_vars(), needle
+            )
+        assert trigram_index_path(env_file).exists()
+
+    def test_below_threshold_scans(self, env_file, monkeypatch):
+        monkeypatch.setenv('EVM_TRIGRAM_MIN_BYTES', str(1 << 30))
+        mgr = EnvironmentManager(str(env_file))
+        assert set(mgr.search('eu-west', search_value=True)) == {'CONFIG'}
+        assert not trigram_index_path(env_file).exists()
+
+    def test_mutations_logged(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file))
+        mgr.search('eu-west', search_value=True)
+        mgr.set('NEW', 'region eu-west too')
+        mgr.set('CONFIG', '{}')
+        log = trigram_log_path(env_file).read_text().splitlines()
+        assert [json.loads(line)['keys'] for line in log] == [['NEW'], ['CONFIG']]
+
+        assert set(mgr.search('eu-west', search_value=True)) == {'NEW'}
+        fresh = EnvironmentManager(str(env_file))
+        assert set(fresh.search('eu-west', search_value=True)) == {'NEW'}
+        mgr.delete('NEW')
+        assert fresh.search('eu-west', search_value=True) != {}
+        assert EnvironmentManager(str(env_file)).search(
+            'eu-west', search_value=True
+        ) == {}
+
+    def test_external_edit_rebuilds(self, env_file, always_index):
+        EnvironmentManager(str(env_file)).search('eu-west', search_value=True)
+        data = json.loads(env_file.read_text())
+        data['EDITED'] = 'needle-from-editor'
+        env_file.write_text(json.dumps(data))
+        mgr = EnvironmentManager(str(env_file))
+        assert set(mgr.search('from-editor', search_value=True)) == {'EDITED'}
+        assert TrigramIndex.load(env_file).keys[-1] == 'EDITED'
+
+    def test_torn_log_rebuilds(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file))
+        mgr.search('eu-west', search_value=True)
+        mgr.set('NEW', 'eu-west')
+        with open(trigram_log_path(env_file), 'ab') as f:
+            f.write(b'{"keys": ["X"')
+        fresh = EnvironmentManager(str(env_file))
+        assert set(fresh.search('eu-west', search_value=True)) == {'CONFIG', 'NEW'}
+        # 下一条记录接在残缺末行后，日志无法解析 → 重建
+        fresh.set('OTHER', 'eu-west')
+        again = EnvironmentManager(str(env_file))
+        assert set(again.search('eu-west', search_value=True)) == {
+            'CONFIG', 'NEW', 'OTHER',
+        }
+        assert not trigram_log_path(env_file).exists()
+
+    def test_clear_drops_index(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file))
+        mgr.search('eu-west', search_value=True)
+        mgr.clear(force=True)
+        assert not trigram_index_path(env_file).exists()
+        assert mgr.search('eu-west', search_value=True) == {}
+
+    def test_wal_storage(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file), storage='wal')
+        mgr.search('eu-west', search_value=True)
+        mgr.set('NEW', 'eu-west')
+        fresh = EnvironmentManager(str(env_file), storage='wal')
+        assert set(fresh.search('eu-west', search_value=True)) == {'CONFIG', 'NEW'}
+
+    def test_uncommitted_changes_visible(self, env_file, always_index):
+        mgr = EnvironmentManager(str(env_file))
+        mgr.search('eu-west', search_value=True)
+        with mgr.transaction():
+            mgr.set('PENDING', 'eu-west')
+            assert set(mgr.search('eu-west', search_value=True)) == {
+                'CONFIG', 'PENDING',
+            }
+
+    def test_rebuild_after_many_changes(self, env_file, always_index, monkeypatch):
+        monkeypatch.setattr('evm._trigram.TRIGRAM_REBUILD_MIN_DIRTY', 2)
+        mgr = EnvironmentManager(str(env_file))
+        mgr.search('eu-west', search_value=True)
+        for i in range(4):
+            mgr.set(f'N{i}', 'eu-west')
+        fresh = EnvironmentManager(str(env_file))
+        assert len(fresh.search('eu-west', search_value=True)) == 5
+        assert not trigram_log_path(env_file).exists()
+        assert len(TrigramIndex.load(env_file).keys) == 8
@@ -432,7 +432,9 @@ class TestShellCompletionDynamic:
         from evm._completion import generate_bash_completion
         script = generate_bash_completion(['set', 'get', 'delete'])
         assert '_evm_keys' in script
-        assert 'evm list --json --quiet' in script
+        # 读取补全索引文件，不再每次 TAB 启动 evm + python3
+        assert 'mapfile -t words' in script
+        assert 'python3' not in script
 
     def test_bash_completion_has_key_cmds(self):
         """bash 补全应为 get/delete 等命令提供变量名补全"""
@@ -446,14 +448,16 @@ class TestShellCompletionDynamic:
         from evm._completion import generate_zsh_completion
         script = generate_zsh_completion(['set', 'get', 'delete'])
         assert '_evm_keys' in script
-        assert 'evm list --json --quiet' in script
+        assert 'opt_args[--env-file]' in script
+        assert 'python3' not in script
 
     def test_fish_completion_has_key_function(self):
         """fish 补全应包含 __evm_keys 函数"""
         from evm._completion import generate_fish_completion
         script = generate_fish_completion(['set', 'get', 'delete'])
         assert '__evm_keys' in script
-        assert 'evm list --json --quiet' in script
+        assert '__evm_index keys' in script
+        assert 'python3' not in script
 
     def test_fish_completion_has_key_commands(self):
         """fish 补全应为 get/delete 等命令提供变量名补全"""